@@ -1,5 +1,6 @@
 import os
 import sys
+import tempfile
 import sentry_sdk
 from sentry_sdk.integrations.django import DjangoIntegration
 
@@ -25,7 +26,9 @@ NO_INTEGATION_TEST = True
 # Application definition
 PARTIAL_IMPORT = dict(
     numerator=0,
-    denominator=1
+    denominator=1,
+    # worker processes building the index (part)
+    workers=1,
 )
 
 STATIC_ROOT = 'static/'
@@ -102,6 +105,49 @@ BATCH_SETTINGS = dict(
     batch_size=5000
 )
 
+# index settings while an index is (re)built, ELASTIC_INDEX_SETTINGS are
+# put back after loading
+ELASTIC_BULK_SETTINGS = {
+    'refresh_interval': '-1',
+    'number_of_replicas': 0,
+}
+
+# index settings in production, for the keys of ELASTIC_BULK_SETTINGS
+ELASTIC_INDEX_SETTINGS = {
+    'refresh_interval': os.getenv('ELASTIC_REFRESH_INTERVAL', '1s'),
+    'number_of_replicas': int(os.getenv('ELASTIC_REPLICAS', 1)),
+}
+
+# merge the segments of an index after it is built
+ELASTIC_FORCEMERGE = os.getenv('ELASTIC_FORCEMERGE', 'false').lower() == 'true'
+
+# a new index is swapped in when it has at least this part of the
+# documents of the live index
+ELASTIC_SWAP_MIN_RATIO = float(os.getenv('ELASTIC_SWAP_MIN_RATIO', 0.9))
+
+# previous generations of an index kept after a swap, to roll back to
+ELASTIC_KEEP_GENERATIONS = int(os.getenv('ELASTIC_KEEP_GENERATIONS', 1))
+
+if TESTING:
+    # put all docs in one segment to make sure we have correct
+    # scores/doc counts, relevancy scores make more sense
+    ELASTIC_FORCEMERGE = True
+    # test cases index their own fixtures
+    ELASTIC_SWAP_MIN_RATIO = 0
+    ELASTIC_KEEP_GENERATIONS = 0
+
+# load import tasks with COPY FROM STDIN instead of bulk_create
+IMPORT_USE_COPY = os.getenv('IMPORT_USE_COPY', 'false').lower() == 'true'
+
+# processes parsing the large UVA2 files, 1 parses in the import process
+IMPORT_PARSE_WORKERS = int(os.getenv('IMPORT_PARSE_WORKERS', 1))
+
+# directory for the JSON task statistics written after every batch job
+BATCH_REPORT_DIR = os.getenv('BATCH_REPORT_DIR', tempfile.gettempdir())
+
+# vector tiles kept in memory per process by the tile endpoint
+TILE_CACHE_SIZE = int(os.getenv('TILE_CACHE_SIZE', 4096))
+
 
 ALLOWED_HOSTS = [
     '127.0.0.1',
@@ -30,6 +30,7 @@ import datasets.brk.views
 grouped_url_patterns = {
     'base_patterns': [
         url(r'^status/', include('health.urls')),
+        url(r'^bag/tiles/', include('geo_views.urls')),
     ],
 
     'bag_patterns': [
@@ -1,48 +1,31 @@
-from django.core.management import BaseCommand
-from django.db import ProgrammingError
-from django.db import connection
+from django.core.management import BaseCommand, CommandError
+
+from geo_views import tables
 
 
 class Command(BaseCommand):
+    help = (
+        'Build the geo_*_mat tables from the geo_ views without downtime. '
+        'Builds all tables, or only those of the views given.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'views', nargs='*', metavar='VIEW',
+            help='geo_ views to build the table of')
+
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Tables built at the same time')
+
     def handle(self, *args, **options):
-        with connection.cursor() as cursor:
-            self.create_geo(cursor)
-
-    def create_geo(self, cursor):
-        tables = connection.introspection.get_table_list(cursor)
-
-        for table_info in tables:
-            if table_info.type == 'v' and table_info.name[0:4] == 'geo_':
-                try:
-                    cursor.execute(
-                        'DROP TABLE IF EXISTS {}'.format(
-                            connection.ops.quote_name(f"{table_info.name}_mat")
-                        )
-                    )
-                except ProgrammingError:
-                    pass
-
-                cursor.execute(
-                    'CREATE TABLE {} AS SELECT * FROM {}'.format(
-                        connection.ops.quote_name(f"{table_info.name}_mat"),
-                        connection.ops.quote_name(table_info.name)
-                    )
-                )
-                cursor.execute(
-                    'CREATE INDEX {} ON {} USING GIST(geometrie)'.format(
-                        connection.ops.quote_name(f"{table_info.name}_idx"),
-                        connection.ops.quote_name(f"{table_info.name}_mat")
-                    )
-                )
-                cursor.execute(
-                    'CLUSTER {} ON {}'.format(
-                        connection.ops.quote_name(f"{table_info.name}_idx"),
-                        connection.ops.quote_name(f"{table_info.name}_mat")
-                    )
-                )
-                cursor.execute(
-                    'VACUUM ANALYZE {}'.format(
-                        connection.ops.quote_name(f"{table_info.name}_mat"),
-                    )
-                )
-                self.stdout.write(f'Created geotable {table_info.name}_mat\n')
+        available = tables.geo_views()
+        views = options['views'] or available
+
+        unknown = sorted(set(views) - set(available))
+        if unknown:
+            raise CommandError('Unknown geo views: {}'.format(', '.join(unknown)))
+
+        tables.refresh(views, workers=options['workers'])
+
+        for view in views:
+            self.stdout.write(f'Created geotable {tables.table_name(view)}\n')
@@ -17,7 +17,7 @@ class Command(BaseCommand):
         'brk': [datasets.brk.batch.BuildIndexKadasterJob],
         'wkpb': [],
         'gebieden': [datasets.bag.batch.IndexGebiedenJob],
-        'pand': [datasets.bag.batch.IndexPandJob],
+        'pand': [datasets.bag.batch.BuildIndexPandJob],
     }
 
     delete_indexes = {
@@ -28,6 +28,14 @@ class Command(BaseCommand):
         'pand': [datasets.bag.batch.DeleteIndexPandJob],
     }
 
+    swap_indexes = {
+        'bag': [datasets.bag.batch.SwapIndexBagJob],
+        'brk': [datasets.brk.batch.SwapIndexKadasterJob],
+        'wkpb': [],  # has no elastic index
+        'gebieden': [datasets.bag.batch.SwapIndexGebiedJob],
+        'pand': [datasets.bag.batch.SwapIndexPandJob],
+    }
+
     def add_arguments(self, parser):
         parser.add_argument(
             'dataset',
@@ -48,7 +56,15 @@ class Command(BaseCommand):
             action='store_true',
             dest='delete_indexes',
             default=False,
-            help='Delete elastic indexes from elastic')
+            help='Create new empty elastic indexes to build, '
+                 'the live indexes stay in use')
+
+        parser.add_argument(
+            '--swap',
+            action='store_true',
+            dest='swap_indexes',
+            default=False,
+            help='Swap in the built elastic indexes')
 
         parser.add_argument(
             '--partial',
@@ -57,6 +73,14 @@ class Command(BaseCommand):
             default=0,
             help='Build X/Y parts 1/3, 2/3, 3/3')
 
+        parser.add_argument(
+            '--workers',
+            action='store',
+            dest='workers',
+            type=int,
+            default=1,
+            help='Build the index (part) with N worker processes')
+
     def set_partial_config(self, options):
         """
         Do partial configuration
@@ -72,6 +96,9 @@ class Command(BaseCommand):
             settings.PARTIAL_IMPORT['numerator'] = numerator
             settings.PARTIAL_IMPORT['denominator'] = denominator
 
+        assert options['workers'] > 0
+        settings.PARTIAL_IMPORT['workers'] = options['workers']
+
     def handle(self, *args, **options):
 
         dataset = options['dataset']
@@ -98,6 +125,11 @@ class Command(BaseCommand):
                 # we do not run the other tasks
                 continue  # to next dataset please..
 
+            if options['swap_indexes']:
+                for job_class in self.swap_indexes[ds]:
+                    batch.execute(job_class())
+                continue
+
             if options['build_index']:
                 for job_class in self.indexes[ds]:
                     batch.execute(job_class(), )
@@ -26,6 +26,10 @@ class Command(BaseCommand):
         gebieden=[],
     )
 
+    delta_imports = dict(
+        bag=[datasets.bag.batch.ImportBagDeltaJob],
+    )
+
     def add_arguments(self, parser):
 
         parser.add_argument(
@@ -42,6 +46,29 @@ class Command(BaseCommand):
             default=False,
             help='Skip database importing')
 
+        parser.add_argument(
+            '--delta',
+            action='store_true',
+            dest='delta',
+            default=False,
+            help='Only import changed rows, for datasets that support it')
+
+        parser.add_argument(
+            '--workers',
+            action='store',
+            dest='workers',
+            type=int,
+            default=1,
+            help='Run independent import tasks in X parallel processes')
+
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            dest='resume',
+            default=False,
+            help='Skip tasks that finished in an earlier run'
+                 ' and have unchanged input files')
+
     def handle(self, *args, **options):
         dataset = options['dataset']
 
@@ -58,7 +85,15 @@ class Command(BaseCommand):
             validate_tables.check_table_targets()
             return
 
+        imports = self.imports
+
+        if options['delta']:
+            imports = self.delta_imports
+            sets = [ds for ds in sets if ds in imports]
+
         for one_ds in sets:
-            for job_class in self.imports[one_ds]:
-                batch.execute(job_class())
+            for job_class in imports[one_ds]:
+                batch.execute(
+                    job_class(), workers=options['workers'],
+                    checkpoint=True, resume=options['resume'])
 
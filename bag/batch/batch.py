@@ -1,32 +1,281 @@
 from abc import ABCMeta, abstractmethod
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import json
 import logging
+import multiprocessing
+import time
 
 import gc
 
+from django import db
+from django.db import connection, transaction
+
+from batch import stats
+from batch.models import TaskState
+
 log = logging.getLogger(__name__)
 
 
-def execute(job):
+def execute(job, workers=1, checkpoint=False, resume=False):
+    """
+    Execute all tasks of ``job``.
+
+    With ``workers`` > 1 tasks that declare ``depends_on`` are scheduled
+    on a process pool as soon as their dependencies are done.
+
+    With ``checkpoint`` every finished task is recorded in ``TaskState``.
+    With ``resume`` tasks that finished in an earlier checkpointed run of
+    the job are skipped, as long as their input files and the tasks they
+    depend on are unchanged. The tasks that do run first remove what an
+    earlier run wrote, see ``clear_task``.
+
+    The resource usage of every task is written to a JSON report.
+    """
     log.info("Starting job: %s", job.name)
 
-    for task in job.tasks():
-        _execute_task(task)
+    start = time.perf_counter()
+    tasks = list(job.tasks())
+
+    # fail on dependencies that are not part of the job before anything runs
+    resolve_dependencies(tasks)
+
+    completed = set()
+    job_name = None
+
+    if resume:
+        completed = completed_tasks(job.name, tasks)
+        for i in sorted(completed):
+            log.info("Skipping completed task: %s", _task_name(tasks[i]))
+
+    if checkpoint or resume:
+        job_name = job.name
+        if not resume:
+            TaskState.objects.filter(job=job_name).delete()
+
+    if workers > 1:
+        report = _execute_parallel(
+            job_name, tasks, workers, completed, clear=resume)
+    else:
+        report = [
+            _execute_task(job_name, task, clear=resume)
+            for i, task in enumerate(tasks) if i not in completed
+        ]
+
+    stats.write_report(job.name, time.perf_counter() - start, report)
 
     log.info("Finished job: %s", job.name)
 
 
-def _execute_task(task):
+def _task_name(task):
+    if callable(task):
+        return task.__name__
+
+    return getattr(task, "name", "no name specified")
+
 
+def _task_key(task):
+    """
+    Identifies a task within a job in ``TaskState``
+    """
+    if callable(task):
+        return '{}.{}'.format(task.__module__, task.__qualname__)
+
+    cls = type(task)
+    return '{}.{}'.format(cls.__module__, cls.__qualname__)
+
+
+def clear_task(task):
+    """
+    Delete the rows of the models in ``clears`` of ``task``, which an
+    earlier run of the task wrote.
+
+    Foreign keys are checked at the end of the transaction, after the
+    task has written the rows again.
+    """
+    qn = connection.ops.quote_name
+
+    with connection.cursor() as c:
+        for model in getattr(task, 'clears', ()):
+            log.info("Clearing %s", model._meta.db_table)
+            c.execute('DELETE FROM {}'.format(qn(model._meta.db_table)))
+
+
+def _execute_task(job_name, task, clear=False):
+    """
+    Execute ``task``.
+
+    When ``job_name`` is given the task runs in a transaction, together
+    with recording it as finished. A failed task leaves nothing behind,
+    so the job can be resumed. With ``clear`` the task first removes
+    the rows of an earlier run, in the same transaction.
+    """
     if callable(task):
-        task_name = task.__name__
         execute_func = task
     else:
-        task_name = getattr(task, "name", "no name specified")
         execute_func = task.execute
 
-    log.debug("Starting task: %s", task_name)
+    log.debug("Starting task: %s", _task_name(task))
+
+    if job_name is None:
+        with stats.measure(_task_name(task)) as result:
+            execute_func()
+
+        return result
+
+    with transaction.atomic():
+        if clear:
+            clear_task(task)
+
+        with stats.measure(_task_name(task)) as result:
+            execute_func()
+
+        TaskState.objects.update_or_create(
+            job=job_name, task=_task_key(task), defaults=dict(
+                files=json.dumps(result['files']),
+                fingerprint=stats.fingerprint(result['files'])))
+
+    return result
+
+
+def completed_tasks(job_name, tasks):
+    """
+    Returns the indexes of ``tasks`` that finished in an earlier run of
+    the job and do not have to run again.
+
+    A task has to run again when it did not finish, when one of its input
+    files has changed, when it is not ``resumable`` or when a task it
+    depends on has to run again.
+    """
+    states = {
+        state.task: state
+        for state in TaskState.objects.filter(job=job_name)
+    }
+    dependencies = resolve_dependencies(tasks)
+    completed = set()
+
+    for i, task in enumerate(tasks):
+        state = states.get(_task_key(task))
+
+        if state is None or not getattr(task, 'resumable', True):
+            continue
+
+        if state.fingerprint != stats.fingerprint(json.loads(state.files)):
+            log.info("Input of task %s has changed", _task_name(task))
+            continue
+
+        if dependencies[i] <= completed:
+            completed.add(i)
+
+    return completed
+
+
+def _provides(task):
+    """
+    Names a task can be depended on by: its class and base class names.
+    """
+    return {cls.__name__ for cls in type(task).__mro__}
+
+
+def resolve_dependencies(tasks):
+    """
+    Returns a list with for every task the set of task
+    indexes it has to wait for.
+
+    Tasks without ``depends_on`` wait for all tasks listed before them,
+    just like the serial execution order. Every name in ``depends_on``
+    has to match a task listed before the task, otherwise a ValueError
+    is raised.
+    """
+    dependencies = []
+
+    for i, task in enumerate(tasks):
+        depends_on = getattr(task, 'depends_on', None)
+
+        if depends_on is None:
+            dependencies.append(set(range(i)))
+            continue
+
+        provided = [_provides(other) for other in tasks[:i]]
+
+        missing = [
+            name for name in depends_on
+            if not any(name in names for names in provided)
+        ]
+        if missing:
+            raise ValueError("Task {} depends on {}, not listed before it".format(
+                _task_name(task), ', '.join(missing)))
+
+        dependencies.append({
+            j for j, names in enumerate(provided)
+            if names & set(depends_on)
+        })
 
-    execute_func()
+    return dependencies
+
+
+def _init_worker():
+    # every worker process opens its own database connection
+    db.connections.close_all()
+
+
+def _execute_parallel(job_name, tasks, workers, completed=(), clear=False):
+    """
+    Run independent tasks at the same time.
+
+    Tasks that declare ``depends_on`` are executed in a worker process.
+    Tasks that do not are executed in this process, so they can still
+    share state in memory with each other.
+
+    Tasks in ``completed`` are considered done already, ``clear`` is
+    passed on to ``_execute_task``.
+
+    Returns the statistics of the tasks in order of completion.
+    """
+    dependencies = resolve_dependencies(tasks)
+    done = set(completed)
+    pending = [i for i in range(len(tasks)) if i not in done]
+    running = {}
+    report = []
+
+    context = multiprocessing.get_context('fork')
+
+    with ProcessPoolExecutor(
+            max_workers=workers, mp_context=context,
+            initializer=_init_worker) as pool:
+
+        while pending or running:
+            ready = [i for i in pending if dependencies[i] <= done]
+
+            for i in ready:
+                pending.remove(i)
+                task = tasks[i]
+
+                if getattr(task, 'depends_on', None) is None:
+                    report.append(_execute_task(job_name, task, clear))
+                    done.add(i)
+                    break
+
+                # never hand an open connection to a forked worker
+                db.connections.close_all()
+                log.debug("Scheduling task: %s", _task_name(task))
+                running[pool.submit(_execute_task, job_name, task, clear)] = i
+            else:
+                if not running:
+                    if pending:
+                        raise ValueError("Unresolvable task dependencies: {}".format(
+                            ', '.join(_task_name(tasks[i]) for i in pending)))
+                    continue
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+
+                for future in finished:
+                    i = running.pop(future)
+                    # re-raises the exception of a failed task
+                    report.append(future.result())
+                    log.debug("Finished task: %s", _task_name(tasks[i]))
+                    done.add(i)
+
+    return report
 
 
 class BasicTask(object):
@@ -37,8 +286,20 @@ class BasicTask(object):
     * ``process``
     * ``after``
 
+    ``depends_on`` lists the (base) class names of tasks that have to
+    be finished before this task can run. ``None`` means the task
+    depends on every task before it in the job.
+
+    Tasks that keep their result in memory instead of the database set
+    ``resumable`` to ``False``, so a resumed job runs them again.
+
+    ``clears`` lists the models the task fills. A resumed job empties
+    them before it runs the task again.
     """
     name = "Basic Task"
+    depends_on = None
+    resumable = True
+    clears = ()
 
     class Meta:
         __class__ = ABCMeta
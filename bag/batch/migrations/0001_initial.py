@@ -0,0 +1,29 @@
+# Generated by Django 2.1.7 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job', models.CharField(max_length=100)),
+                ('task', models.CharField(max_length=200)),
+                ('files', models.TextField(default='[]')),
+                ('fingerprint', models.CharField(max_length=32)),
+                ('finished', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='taskstate',
+            unique_together={('job', 'task')},
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 2.1.7 on 2026-10-18 10:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('batch', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table', models.CharField(max_length=100)),
+                ('key', models.CharField(max_length=100)),
+                ('action', models.CharField(choices=[('I', 'Inserted'), ('U', 'Updated'), ('D', 'Deleted')], max_length=1)),
+                ('created', models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RowHash',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table', models.CharField(max_length=100)),
+                ('key', models.CharField(max_length=100)),
+                ('hash', models.CharField(max_length=32)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='rowhash',
+            unique_together={('table', 'key')},
+        ),
+    ]
@@ -0,0 +1,61 @@
+from django.db import models
+
+
+class TaskState(models.Model):
+    """
+    Completed task of a batch job.
+
+    `files` lists the input files the task has read, `fingerprint` is
+    the fingerprint of those files when the task finished. Used to
+    resume a failed job.
+    """
+    job = models.CharField(max_length=100)
+    task = models.CharField(max_length=200)
+    files = models.TextField(default='[]')
+    fingerprint = models.CharField(max_length=32)
+    finished = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('job', 'task')
+
+    def __str__(self):
+        return '{}: {}'.format(self.job, self.task)
+
+
+class RowHash(models.Model):
+    """
+    Hash of a row loaded by a delta import, used to find the rows that
+    changed since the previous load.
+    """
+    table = models.CharField(max_length=100)
+    key = models.CharField(max_length=100)
+    hash = models.CharField(max_length=32)
+
+    class Meta:
+        unique_together = ('table', 'key')
+
+
+class ImportChange(models.Model):
+    """
+    Row inserted, updated or deleted by a delta import.
+
+    Steps after the import (denormalisation, indexing) can limit their
+    work to the rows changed since a given moment.
+    """
+    INSERTED = 'I'
+    UPDATED = 'U'
+    DELETED = 'D'
+
+    ACTION_CHOICES = (
+        (INSERTED, 'Inserted'),
+        (UPDATED, 'Updated'),
+        (DELETED, 'Deleted'),
+    )
+
+    table = models.CharField(max_length=100)
+    key = models.CharField(max_length=100)
+    action = models.CharField(max_length=1, choices=ACTION_CHOICES)
+    created = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return '{} {}: {}'.format(self.action, self.table, self.key)
@@ -0,0 +1,151 @@
+"""
+Resource usage of batch tasks
+
+Tasks and the import helpers report what they do with ``count``, the
+batch runner wraps each task in ``measure`` and writes a JSON report
+per job.
+"""
+from collections import Counter
+from contextlib import contextmanager
+import hashlib
+import json
+import logging
+import os
+import resource
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.utils.text import slugify
+
+log = logging.getLogger(__name__)
+
+_counters = None
+_files = None
+
+
+def count(key, amount=1):
+    """
+    Add `amount` to counter `key` of the task that is running
+    """
+    if _counters is not None:
+        _counters[key] += amount
+
+
+def count_file(path):
+    """
+    Count the size of a source file that is read by the running task
+    and remember its path for the task fingerprint
+    """
+    if _counters is not None:
+        _counters['bytes_read'] += os.path.getsize(path)
+        _files.add(os.path.abspath(path))
+
+
+def fingerprint(paths):
+    """
+    Fingerprint of the size and modification time of `paths`
+    """
+    h = hashlib.md5()
+
+    for path in sorted(paths):
+        try:
+            st = os.stat(path)
+            h.update('{}:{}:{}\n'.format(path, st.st_size, st.st_mtime_ns).encode())
+        except OSError:
+            h.update('{}:missing\n'.format(path).encode())
+
+    return h.hexdigest()
+
+
+def _reset_peak_rss():
+    # since linux 4.0 writing 5 to clear_refs resets VmHWM
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def _peak_rss():
+    """
+    Peak resident set size in kB
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+@contextmanager
+def measure(name):
+    """
+    Measure the task run inside this context.
+
+    Yields the statistics dict, which is filled in when the task is done.
+    """
+    global _counters, _files
+
+    _counters = Counter()
+    _files = set()
+    result = dict(task=name)
+
+    def count_sql(execute, sql, params, many, context):
+        _counters['sql_statements'] += 1
+        return execute(sql, params, many, context)
+
+    _reset_peak_rss()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+
+    try:
+        with connection.execute_wrapper(count_sql):
+            yield result
+    finally:
+        duration = time.perf_counter() - wall
+        rows = _counters['rows']
+
+        result.update(
+            wall_time=round(duration, 3),
+            cpu_time=round(time.process_time() - cpu, 3),
+            rows=rows,
+            rows_per_second=round(rows / duration, 1) if duration else 0,
+            sql_statements=_counters['sql_statements'],
+            bytes_read=_counters['bytes_read'],
+            files=sorted(_files),
+            peak_rss_kb=_peak_rss(),
+            pid=os.getpid(),
+        )
+        _counters = None
+        _files = None
+
+        log.info(
+            "Task %s: %.1fs, %d rows, %d queries",
+            name, duration, rows, result['sql_statements'])
+
+
+def write_report(job_name, duration, tasks):
+    """
+    Write the statistics of all tasks of a job as JSON to BATCH_REPORT_DIR
+    """
+    path = os.path.join(
+        settings.BATCH_REPORT_DIR, '{}.json'.format(slugify(job_name)))
+
+    report = dict(
+        job=job_name,
+        finished=time.strftime('%Y-%m-%dT%H:%M:%S'),
+        wall_time=round(duration, 3),
+        tasks=tasks,
+    )
+
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    log.info("Job report written to %s", path)
+
+    return path
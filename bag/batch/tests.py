@@ -1,7 +1,12 @@
-from django.test import TransactionTestCase, SimpleTestCase
+import json
+import os
+import tempfile
+
+from django.test import TransactionTestCase, SimpleTestCase, override_settings
 from django.utils import timezone
 
 import batch.batch
+import batch.stats
 
 
 class EmptyJob(object):
@@ -56,3 +61,110 @@ class JobTest(TransactionTestCase):
 
         batch.batch.execute(SimpleJob("simple", t))
         self.assertEqual(t.executed, True)
+
+    def test_job_writes_report(self):
+        class Task(object):
+            name = "counting"
+
+            def execute(self):
+                batch.stats.count('rows', 10)
+
+        with tempfile.TemporaryDirectory() as report_dir:
+            with override_settings(BATCH_REPORT_DIR=report_dir):
+                batch.batch.execute(SimpleJob("Report job", Task()))
+
+            with open(os.path.join(report_dir, 'report-job.json')) as f:
+                report = json.load(f)
+
+        self.assertEqual(report['job'], "Report job")
+        self.assertEqual(len(report['tasks']), 1)
+
+        task = report['tasks'][0]
+        self.assertEqual(task['task'], "counting")
+        self.assertEqual(task['rows'], 10)
+        self.assertIn('cpu_time', task)
+        self.assertIn('peak_rss_kb', task)
+
+
+class DependencyTest(SimpleTestCase):
+
+    class Independent(batch.batch.BasicTask):
+        depends_on = ()
+
+    class Dependent(batch.batch.BasicTask):
+        depends_on = ('Independent',)
+
+    class Undeclared(batch.batch.BasicTask):
+        pass
+
+    def test_declared_dependencies(self):
+        tasks = [self.Independent(), self.Independent(), self.Dependent()]
+
+        deps = batch.batch.resolve_dependencies(tasks)
+        self.assertEqual(deps, [set(), set(), {0, 1}])
+
+    def test_undeclared_waits_for_previous(self):
+        tasks = [self.Independent(), self.Dependent(), self.Undeclared()]
+
+        deps = batch.batch.resolve_dependencies(tasks)
+        self.assertEqual(deps[2], {0, 1})
+
+    def test_missing_dependency_raises(self):
+        with self.assertRaises(ValueError):
+            batch.batch.resolve_dependencies([self.Dependent()])
+
+    def test_later_dependency_raises(self):
+        with self.assertRaises(ValueError):
+            batch.batch.resolve_dependencies([self.Dependent(), self.Independent()])
+
+
+class ResumeTest(TransactionTestCase):
+
+    class ReadingTask(object):
+        name = "reading"
+
+        def __init__(self, path):
+            self.path = path
+            self.runs = 0
+
+        def execute(self):
+            batch.stats.count_file(self.path)
+            self.runs += 1
+
+    class FlakyTask(object):
+        name = "flaky"
+
+        def __init__(self):
+            self.fail = True
+            self.runs = 0
+
+        def execute(self):
+            if self.fail:
+                raise Exception()
+            self.runs += 1
+
+    def test_resume_skips_completed_tasks(self):
+        with tempfile.NamedTemporaryFile('w') as source:
+            source.write('1;2;3')
+            source.flush()
+
+            reading = self.ReadingTask(source.name)
+            flaky = self.FlakyTask()
+            job = SimpleJob("resumable", reading, flaky)
+
+            with self.assertRaises(Exception):
+                batch.batch.execute(job, checkpoint=True)
+
+            flaky.fail = False
+            batch.batch.execute(job, resume=True)
+
+            self.assertEqual(reading.runs, 1)
+            self.assertEqual(flaky.runs, 1)
+
+            # changed input runs the task and everything after it again
+            source.write(';4')
+            source.flush()
+            batch.batch.execute(job, resume=True)
+
+            self.assertEqual(reading.runs, 2)
+            self.assertEqual(flaky.runs, 2)
@@ -4,7 +4,7 @@ import os
 # Packages
 from django.conf import settings
 from django.contrib.gis.geos import Point
-from django.db import connection
+from django.db import connection, transaction
 from django.db.models import Value, CharField
 from django.utils.text import slugify
 # Project
@@ -19,10 +19,15 @@ log = logging.getLogger(__name__)
 class CodeOmschrijvingUvaTask(batch.BasicTask):
     model = None
     code = None
+    depends_on = ()
 
     def __init__(self, path):
         self.path = path
 
+    @property
+    def clears(self):
+        return (self.model,)
+
     def before(self):
         pass
 
@@ -31,16 +36,18 @@ class CodeOmschrijvingUvaTask(batch.BasicTask):
 
     def process(self):
         avrs = uva2.process_uva2(self.path, self.code, self.process_row)
-        self.model.objects.bulk_create(avrs, batch_size=database.BATCH_SIZE)
+        database.bulk_create_chunked(self.model, avrs)
 
     def process_row(self, r):
         # noinspection PyCallingNonCallable
         return self.model(pk=r['Code'], omschrijving=r['Omschrijving'])
 
 
-class ImportIndicatieAOTTask(batch.BasicTask):
+class ImportIndicatieAOTTask(batch.BasicTask, database.CopyLoadMixin):
 
     name = "import Indicatie Onderzoek Adresseerbaar Objecten AOT"
+    depends_on = ()
+    clears = (models.IndicatieAdresseerbaarObject,)
 
     def __init__(self, path):
         self.path = path
@@ -65,8 +72,7 @@ class ImportIndicatieAOTTask(batch.BasicTask):
                 with_header=False
             )
 
-        models.IndicatieAdresseerbaarObject.objects.bulk_create(
-            self.indicaties, batch_size=database.BATCH_SIZE)
+        self.bulk_insert(models.IndicatieAdresseerbaarObject, self.indicaties)
 
     def process_row(self, indicatie):
 
@@ -81,7 +87,8 @@ class ImportIndicatieAOTTask(batch.BasicTask):
         if indicatie[2] == 'J':
             indicatie_in_onderzoek = True
 
-        return models.IndicatieAdresseerbaarObject(
+        return self.new_row(
+            models.IndicatieAdresseerbaarObject,
             landelijk_id=landelijk_id,
             indicatie_geconstateerd=indicatie_geconstateerd,
             indicatie_in_onderzoek=indicatie_in_onderzoek
@@ -90,6 +97,7 @@ class ImportIndicatieAOTTask(batch.BasicTask):
 
 class ImportPandNaamTask(batch.BasicTask):
     name = "Some Panden have nice names. Import those"
+    depends_on = ('ImportPandTask',)
 
     def __init__(self, path):
         self.path = path
@@ -184,8 +192,10 @@ class ImportTggTask(CodeOmschrijvingUvaTask):
     model = models.Toegang
 
 
-class ImportGebruiksdoelenTask(batch.BasicTask):
+class ImportGebruiksdoelenTask(batch.BasicTask, database.CopyLoadMixin):
     name = "Import Gebruiksdoel CSV"
+    depends_on = ('ImportVboTask',)
+    clears = (models.Gebruiksdoel,)
 
     def __init__(self, path):
         self.path = path
@@ -205,8 +215,7 @@ class ImportGebruiksdoelenTask(batch.BasicTask):
             with_header=False
         )
 
-        models.Gebruiksdoel.objects.bulk_create(
-            self.gebruiksdoelen, batch_size=database.BATCH_SIZE)
+        self.bulk_insert(models.Gebruiksdoel, self.gebruiksdoelen)
 
     def process_row(self, doel):
 
@@ -225,7 +234,8 @@ class ImportGebruiksdoelenTask(batch.BasicTask):
         if not (doel[1] == '1000' or doel[1] == '1300') and (doel[3] != '' or doel[4] != ''):
             doel[3] = doel[4] = ''
 
-        return models.Gebruiksdoel(
+        return self.new_row(
+            models.Gebruiksdoel,
             verblijfsobject_id=target_pk,
             code=doel[1],
             omschrijving=doel[2],
@@ -236,6 +246,8 @@ class ImportGebruiksdoelenTask(batch.BasicTask):
 
 class ImportGmeTask(batch.BasicTask):
     name = "Import GME Gemeente code / naam"
+    depends_on = ()
+    clears = (models.Gemeente,)
 
     def __init__(self, path):
         self.path = path
@@ -248,8 +260,7 @@ class ImportGmeTask(batch.BasicTask):
 
     def process(self):
         gemeentes = uva2.process_uva2(self.path, "GME", self.process_row)
-        models.Gemeente.objects.bulk_create(
-            gemeentes, batch_size=database.BATCH_SIZE)
+        database.bulk_create_chunked(models.Gemeente, gemeentes)
 
     def process_row(self, r):
         if not uva2.geldig_tijdvak(r):
@@ -271,6 +282,8 @@ class ImportGmeTask(batch.BasicTask):
 
 class ImportSdlTask(batch.BasicTask, metadata.UpdateDatasetMixin):
     name = "Import SDL"
+    depends_on = ('ImportGmeTask',)
+    clears = (models.Stadsdeel,)
     dataset_id = 'gebieden-stadsdeel'
 
     def __init__(self, bag_path, shp_path):
@@ -290,17 +303,18 @@ class ImportSdlTask(batch.BasicTask, metadata.UpdateDatasetMixin):
         self.stadsdelen.clear()
         self.update_metadata_uva2(self.bag_path, 'SDL')
 
-        validate_geometry(models.Stadsdeel)
+        geo.validate_geometry(models.Stadsdeel)
 
     def process(self):
         self.stadsdelen = dict(
             uva2.process_uva2(self.bag_path, "SDL", self.process_row))
-        geo.process_shp(
-            self.shp_path, "GBD_Stadsdeel.shp", self.process_feature)
 
         models.Stadsdeel.objects.bulk_create(
             self.stadsdelen.values(), batch_size=database.BATCH_SIZE)
 
+        with geo.staged_shp(self.shp_path, "GBD_Stadsdeel.shp") as shp:
+            geo.update_from_shp(shp, models.Stadsdeel, 'code', 'code')
+
     def process_row(self, r):
         if not uva2.uva_geldig(
                 r['TijdvakGeldigheid/begindatumTijdvakGeldigheid'],
@@ -338,19 +352,11 @@ class ImportSdlTask(batch.BasicTask, metadata.UpdateDatasetMixin):
                 r['TijdvakGeldigheid/einddatumTijdvakGeldigheid']),
         )
 
-    def process_feature(self, feat):
-        code = feat.get('CODE')
-        if code not in self.stadsdelen:
-            log.warning(
-                """Stadsdeel/SHP {} references non-existing stadsdeel;
-                skipping""".format(code))
-            return
-
-        self.stadsdelen[code].geometrie = geo.get_multipoly(feat.geom.wkt)
-
 
 class ImportBuurtTask(batch.BasicTask, metadata.UpdateDatasetMixin):
     name = "Import BRT - BUURT"
+    depends_on = ('ImportSdlTask', 'ImportBuurtcombinatieTask')
+    clears = (models.Buurt,)
     dataset_id = 'gebieden-buurt'
 
     def __init__(self, uva_path, shp_path):
@@ -372,7 +378,7 @@ class ImportBuurtTask(batch.BasicTask, metadata.UpdateDatasetMixin):
         self.buurten.clear()
         self.buurtcombinaties.clear()
         self.update_metadata_uva2(self.uva_path, 'BRT')
-        validate_geometry(models.Buurt)
+        geo.validate_geometry(models.Buurt)
 
         log.info("%d Buurten imported", models.Buurt.objects.count())
 
@@ -380,12 +386,14 @@ class ImportBuurtTask(batch.BasicTask, metadata.UpdateDatasetMixin):
         self.buurten = dict(
             uva2.process_uva2(self.uva_path, "BRT", self.process_row))
 
-        geo.process_shp(
-            self.shp_path, "GBD_Buurt.shp", self.process_feature)
-
         models.Buurt.objects.bulk_create(
             self.buurten.values(), batch_size=database.BATCH_SIZE)
 
+        with geo.staged_shp(self.shp_path, "GBD_Buurt.shp") as shp:
+            geo.update_from_shp(
+                shp, models.Buurt, 'code', 'substr(vollcode, 2)',
+                vollcode='vollcode')
+
     def process_row(self, r):
         if not uva2.uva_geldig(
                 r['TijdvakGeldigheid/begindatumTijdvakGeldigheid'],
@@ -430,21 +438,11 @@ class ImportBuurtTask(batch.BasicTask, metadata.UpdateDatasetMixin):
             buurtcombinatie_id=bc_id,
         )
 
-    def process_feature(self, feat):
-        vollcode = feat.get('VOLLCODE')
-        code = vollcode[1:]
-        if code not in self.buurten:
-            log.warning("""
-            Buurt/SHP {} references non-existing buurt; skipping
-            """.format(code))
-            return
-
-        self.buurten[code].geometrie = geo.get_multipoly(feat.geom.wkt)
-        self.buurten[code].vollcode = vollcode
-
 
 class ImportBouwblokTask(batch.BasicTask, metadata.UpdateDatasetMixin):
     name = "Import BBK  - Bouwblok"
+    depends_on = ('ImportBuurtTask',)
+    clears = (models.Bouwblok,)
     dataset_id = 'gebieden-bouwblok'
 
     def __init__(self, uva_path, shp_path):
@@ -460,15 +458,18 @@ class ImportBouwblokTask(batch.BasicTask, metadata.UpdateDatasetMixin):
     def after(self):
         self.buurten.clear()
         self.update_metadata_uva2(self.uva_path, 'BBK')
-        validate_geometry(models.Bouwblok)
+        geo.validate_geometry(models.Bouwblok)
         log.info('%s Bouwblokken imported', models.Bouwblok.objects.count())
 
     def process(self):
-        # loads the csv
-        for bb in uva2.process_uva2(self.uva_path, "BBK", self.process_row):
-            bb.save()
+        database.bulk_create_chunked(
+            models.Bouwblok,
+            uva2.process_uva2(self.uva_path, "BBK", self.process_row))
+
+        with geo.staged_shp(self.shp_path, "GBD_Bouwblok.shp") as shp:
+            geo.update_from_shp(shp, models.Bouwblok, 'code', 'code')
 
-        geo.process_shp(self.shp_path, "GBD_Bouwblok.shp", self.process_feature)
+        self.connect_buurten()
 
     def process_row(self, r):
         if not uva2.uva_geldig(
@@ -504,38 +505,34 @@ class ImportBouwblokTask(batch.BasicTask, metadata.UpdateDatasetMixin):
                 r['TijdvakGeldigheid/einddatumTijdvakGeldigheid']),
         )
 
-    def process_feature(self, feat):
-        code = feat.get('CODE')
-        try:
-            bouwblok = models.Bouwblok.objects.get(code=code)
-        except models.Bouwblok.DoesNotExist:
-            log.warning("""
-            Bouwblok/SHP {} code of non-existing bouwblok; skipping
-            """.format(code))
-            return
-
-        bouwblok.geometrie = geo.get_multipoly(feat.geom.wkt)
-
-        # add buurt to bouwblok if missing.
-        # now dependent  objects like panden have
-        # 'gebiedsinformation'
-        if bouwblok.buurt is None:
-
-            buurt = models.Buurt.objects.filter(
-                geometrie__dwithin=(bouwblok.geometrie, 0))
-
-            if buurt.count():
-                buurt = buurt.first()
-                bouwblok.buurt = buurt
-                log.warning(
-                    "Bouwblok %s connected to buurt %s;.",
-                    bouwblok.id, buurt.naam)
-
-        bouwblok.save()
+    def connect_buurten(self):
+        """
+        Add the buurt to bouwblokken missing one, so dependent objects
+        like panden have 'gebiedsinformatie'
+        """
+        with connection.cursor() as c:
+            c.execute("""
+UPDATE bag_bouwblok bb
+SET buurt_id = (
+  SELECT b.id FROM bag_buurt b
+  WHERE ST_DWithin(b.geometrie, bb.geometrie, 0)
+  ORDER BY b.vollcode
+  LIMIT 1)
+WHERE bb.buurt_id IS NULL AND bb.geometrie IS NOT NULL
+RETURNING bb.id, bb.buurt_id
+            """)
+
+            for bouwblok_id, buurt_id in c.fetchall():
+                if buurt_id:
+                    log.warning(
+                        "Bouwblok %s connected to buurt %s;.",
+                        bouwblok_id, buurt_id)
 
 
 class ImportWplTask(batch.BasicTask):
     name = "Import WPL"
+    depends_on = ('ImportGmeTask',)
+    clears = (models.Woonplaats,)
 
     def __init__(self, path):
         self.path = path
@@ -550,8 +547,7 @@ class ImportWplTask(batch.BasicTask):
 
     def process(self):
         woonplaatsen = uva2.process_uva2(self.path, "WPL", self.process_row)
-        models.Woonplaats.objects.bulk_create(
-            woonplaatsen, batch_size=database.BATCH_SIZE)
+        database.bulk_create_chunked(models.Woonplaats, woonplaatsen)
 
     def process_row(self, r):
         if not uva2.geldig_tijdvak(r):
@@ -588,6 +584,8 @@ class ImportWplTask(batch.BasicTask):
 
 class ImportOpenbareRuimteTask(batch.BasicTask):
     name = "Import OPR - Openbare Ruimtes"
+    depends_on = ('ImportBronTask', 'ImportStatusTask', 'ImportWplTask')
+    clears = (models.OpenbareRuimte,)
 
     def __init__(self, path, wkt_path, opr_beschrijving_path):
         self.path = path
@@ -597,7 +595,6 @@ class ImportOpenbareRuimteTask(batch.BasicTask):
         self.statussen = set()
         self.woonplaatsen = set()
         self.landelijke_ids = dict()
-        self.openbare_ruimtes = dict()
         self.omschijvingen = set()
 
     def store_opr_omschijving(self, row):
@@ -624,23 +621,20 @@ class ImportOpenbareRuimteTask(batch.BasicTask):
         self.statussen.clear()
         self.woonplaatsen.clear()
         self.landelijke_ids.clear()
-        self.openbare_ruimtes.clear()
 
     def process(self):
 
         self.landelijke_ids = uva2.read_landelijk_id_mapping(self.path, "OPR")
 
-        self.openbare_ruimtes = dict(
-            uva2.process_uva2(self.path, "OPR", self.process_row))
+        openbare_ruimtes = uva2.process_uva2(self.path, "OPR", self.process_row)
 
-        geo.process_wkt(
-            self.wkt_path, "BAG_OPENBARERUIMTE_GEOMETRIE.dat",
-            self.process_wkt_row)
+        database.bulk_create_last_wins(models.OpenbareRuimte, openbare_ruimtes)
 
-        models.OpenbareRuimte.objects.bulk_create(
-            self.openbare_ruimtes.values(), batch_size=database.BATCH_SIZE)
+        geo.copy_wkt(
+            self.wkt_path, "BAG_OPENBARERUIMTE_GEOMETRIE.dat",
+            models.OpenbareRuimte)
 
-        validate_geometry(models.OpenbareRuimte)
+        geo.validate_geometry(models.OpenbareRuimte)
 
     def process_row(self, r):
         if not uva2.geldig_tijdvak(r):
@@ -683,7 +677,7 @@ class ImportOpenbareRuimteTask(batch.BasicTask):
         if landelijk_id:
             omschrijving = self.omschrijvingen.get(landelijk_id, None)
 
-        return pk, models.OpenbareRuimte(
+        return models.OpenbareRuimte(
             pk=pk,
             landelijk_id=landelijk_id,
             type=r['TypeOpenbareRuimteDomein'],
@@ -707,19 +701,10 @@ class ImportOpenbareRuimteTask(batch.BasicTask):
             mutatie_gebruiker=r['Mutatie-gebruiker'],
         )
 
-    def process_wkt_row(self, wkt_id, geometrie):
-        key = '0' + wkt_id
-        if key not in self.openbare_ruimtes:
-            log.warning("""
-            OpenbareRuimte/WKT {} references non-existing openbare ruimte {};
-            skipping """.format(wkt_id, key))
-            return
-
-        self.openbare_ruimtes[key].geometrie = geo.get_multipoly(geometrie)
-
 
 class SetHoofdAdres(batch.BasicTask):
     name = "set hoofdadressen"
+    depends_on = ('ImportLigTask', 'ImportStandplaatsenTask', 'ImportVboTask', 'ImportNumTask')
     dataset_id = 'BAG'
 
     def __init__(self, path):
@@ -750,11 +735,46 @@ class SetHoofdAdres(batch.BasicTask):
         del self.nummeraanduidingen
 
     def process(self):
+        self.update_adressen("NUMLIGHFD", self.process_numlig_row, 'ligplaats_id')
+        self.update_adressen("NUMSTAHFD", self.process_numsta_row, 'standplaats_id')
+        self.update_adressen("NUMVBOHFD", self.process_numvbo_row, 'verblijfsobject_id')
+        self.update_adressen("NUMVBONVN", self.process_numvbonvn_row, 'verblijfsobject_id')
 
-        list(uva2.process_uva2(self.path, "NUMLIGHFD", self.process_numlig_row))
-        list(uva2.process_uva2(self.path, "NUMSTAHFD", self.process_numsta_row))
-        list(uva2.process_uva2(self.path, "NUMVBOHFD", self.process_numvbo_row))
-        list(uva2.process_uva2(self.path, "NUMVBONVN", self.process_numvbonvn_row))
+    def update_adressen(self, code, process_row, column):
+        """
+        Load the (nummeraanduiding_id, object_id, hoofdadres) rows of one
+        file into a temporary table and apply them with a single UPDATE
+        """
+        # last row for a nummeraanduiding wins, like the per row updates did
+        relaties = {
+            r[0]: r for r in uva2.process_uva2(self.path, code, process_row)}
+
+        with transaction.atomic(), connection.cursor() as c:
+            c.execute("""
+CREATE TEMPORARY TABLE bag_hoofdadres_update (
+    nummeraanduiding_id varchar(14) PRIMARY KEY,
+    object_id varchar(14) NOT NULL,
+    hoofdadres boolean NOT NULL
+)
+            """)
+
+            database.copy_to_table(
+                'bag_hoofdadres_update',
+                ['nummeraanduiding_id', 'object_id', 'hoofdadres'],
+                relaties.values())
+
+            c.execute("""
+UPDATE bag_nummeraanduiding num
+SET {column} = t.object_id,
+    hoofdadres = t.hoofdadres,
+    date_modified = now()
+FROM bag_hoofdadres_update t
+WHERE num.id = t.nummeraanduiding_id
+            """.format(column=connection.ops.quote_name(column)))
+
+            log.info('%s: %d nummeraanduidingen updated', code, c.rowcount)
+
+            c.execute("DROP TABLE bag_hoofdadres_update")
 
     def process_numlig_row(self, r):
         if not uva2.geldig_tijdvak(r):
@@ -775,10 +795,7 @@ class SetHoofdAdres(batch.BasicTask):
                 'Num-Lig-Hfd {} references non-existing nummeraanduiding {}; skipping'.format(pk, nummeraanduiding_id))
             return None
 
-        nummeraanduiding = models.Nummeraanduiding.objects.get(pk=nummeraanduiding_id)
-        nummeraanduiding.ligplaats_id = ligplaats_id
-        nummeraanduiding.hoofdadres = True
-        nummeraanduiding.save()
+        return nummeraanduiding_id, ligplaats_id, True
 
     def process_numsta_row(self, r):
         if not uva2.geldig_tijdvak(r):
@@ -799,10 +816,7 @@ class SetHoofdAdres(batch.BasicTask):
                 'Num-Sta-Hfd {} references non-existing nummeraanduiding {}; skipping'.format(pk, nummeraanduiding_id))
             return None
 
-        nummeraanduiding = models.Nummeraanduiding.objects.get(id=nummeraanduiding_id)
-        nummeraanduiding.standplaats_id = standplaats_id
-        nummeraanduiding.hoofdadres = True
-        nummeraanduiding.save()
+        return nummeraanduiding_id, standplaats_id, True
 
     def process_numvbo_row(self, r):
         if not uva2.geldig_tijdvak(r):
@@ -823,10 +837,7 @@ class SetHoofdAdres(batch.BasicTask):
                 'Num-Vbo-Hfd {} references non-existing nummeraanduiding {}; skipping'.format(pk, nummeraanduiding_id))
             return None
 
-        nummeraanduiding = models.Nummeraanduiding.objects.get(id=nummeraanduiding_id)
-        nummeraanduiding.verblijfsobject_id = vbo_id
-        nummeraanduiding.hoofdadres = True
-        nummeraanduiding.save()
+        return nummeraanduiding_id, vbo_id, True
 
     def process_numvbonvn_row(self, r):
         if not uva2.geldig_tijdvak(r):
@@ -847,14 +858,13 @@ class SetHoofdAdres(batch.BasicTask):
                 'Num-Vbo-Nvn {} references non-existing nummeraanduiding {}; skipping'.format(pk, nummeraanduiding_id))
             return None
 
-        nummeraanduiding = models.Nummeraanduiding.objects.get(id=nummeraanduiding_id)
-        nummeraanduiding.verblijfsobject_id = vbo_id
-        nummeraanduiding.hoofdadres = False
-        nummeraanduiding.save()
+        return nummeraanduiding_id, vbo_id, False
 
 
-class ImportNumTask(batch.BasicTask, metadata.UpdateDatasetMixin):
+class ImportNumTask(batch.BasicTask, metadata.UpdateDatasetMixin, database.CopyLoadMixin):
     name = "Import NUM"
+    depends_on = ('ImportBronTask', 'ImportStatusTask', 'ImportOpenbareRuimteTask')
+    clears = (models.Nummeraanduiding,)
     dataset_id = 'BAG'
 
     def __init__(self, path):
@@ -885,10 +895,10 @@ class ImportNumTask(batch.BasicTask, metadata.UpdateDatasetMixin):
 
         self.landelijke_ids = uva2.read_landelijk_id_mapping(self.path, "NUM")
         # NOTE generator!
-        nummeraanduidingen = uva2.process_uva2(self.path, "NUM", self.process_num_row)
+        nummeraanduidingen = uva2.process_uva2(
+            self.path, "NUM", self.process_num_row, workers=self.parse_workers)
 
-        models.Nummeraanduiding.objects.bulk_create(
-            nummeraanduidingen, batch_size=database.BATCH_SIZE)
+        self.bulk_insert(models.Nummeraanduiding, nummeraanduidingen)
 
     def process_num_row(self, r):
         if not uva2.geldig_tijdvak(r):
@@ -921,7 +931,8 @@ class ImportNumTask(batch.BasicTask, metadata.UpdateDatasetMixin):
                         .format(pk, openbare_ruimte_id))
             return None
 
-        return models.Nummeraanduiding(
+        return self.new_row(
+            models.Nummeraanduiding,
             pk=pk,
             landelijk_id=landelijk_id,
             huisnummer=r['Huisnummer'],
@@ -944,6 +955,8 @@ class ImportNumTask(batch.BasicTask, metadata.UpdateDatasetMixin):
 
 class ImportLigTask(batch.BasicTask):
     name = "Import LIG"
+    depends_on = ('ImportBronTask', 'ImportStatusTask', 'ImportBuurtTask')
+    clears = (models.Ligplaats,)
 
     def __init__(self, bag_path, wkt_path):
         self.bag_path = bag_path
@@ -953,8 +966,6 @@ class ImportLigTask(batch.BasicTask):
         self.buurten = set()
         self.landelijke_ids = dict()
 
-        self.ligplaatsen = dict()
-
     def before(self):
         self.bronnen = set(models.Bron.objects.values_list("pk", flat=True))
         self.statussen = set(models.Status.objects.values_list("pk", flat=True))
@@ -965,15 +976,13 @@ class ImportLigTask(batch.BasicTask):
         self.statussen.clear()
         self.buurten.clear()
 
-        self.ligplaatsen.clear()
-
     def process(self):
         self.landelijke_ids = uva2.read_landelijk_id_mapping(self.bag_path, "LIG")
 
-        self.ligplaatsen = dict(uva2.process_uva2(self.bag_path, "LIG", self.process_row))
-        geo.process_wkt(self.wkt_path, 'BAG_LIGPLAATS_GEOMETRIE.dat', self.process_wkt_row)
+        ligplaatsen = uva2.process_uva2(self.bag_path, "LIG", self.process_row)
+        database.bulk_create_last_wins(models.Ligplaats, ligplaatsen)
 
-        models.Ligplaats.objects.bulk_create(self.ligplaatsen.values(), batch_size=database.BATCH_SIZE)
+        geo.copy_wkt(self.wkt_path, 'BAG_LIGPLAATS_GEOMETRIE.dat', models.Ligplaats)
 
     def process_row(self, r):
         if not uva2.geldig_tijdvak(r):
@@ -1004,7 +1013,7 @@ class ImportLigTask(batch.BasicTask):
             log.warning('Ligplaats {} references non-existing buurt {}; ignoring'.format(pk, status_id))
             buurt_id = None
 
-        return pk, models.Ligplaats(
+        return models.Ligplaats(
             pk=pk,
             landelijk_id=landelijk_id,
             vervallen=uva2.uva_indicatie(r['Indicatie-vervallen']),
@@ -1018,17 +1027,11 @@ class ImportLigTask(batch.BasicTask):
             mutatie_gebruiker=r['Mutatie-gebruiker'],
         )
 
-    def process_wkt_row(self, wkt_id, geometrie):
-        key = '0' + wkt_id
-        if key not in self.ligplaatsen:
-            log.warning('Ligplaats/WKT {} references non-existing ligplaats {}; skipping'.format(wkt_id, key))
-            return
-
-        self.ligplaatsen[key].geometrie = geometrie
-
 
 class ImportStandplaatsenTask(batch.BasicTask):
     name = "Import STA - Standplaatsen"
+    depends_on = ('ImportBronTask', 'ImportStatusTask', 'ImportBuurtTask')
+    clears = (models.Standplaats,)
 
     def __init__(self, bag_path, wkt_path):
         self.bag_path = bag_path
@@ -1049,7 +1052,7 @@ class ImportStandplaatsenTask(batch.BasicTask):
         self.statussen.clear()
         self.buurten.clear()
 
-        validate_geometry(models.Standplaats)
+        geo.validate_geometry(models.Standplaats)
 
         assert models.Standplaats.objects.filter(
             geometrie__isnull=True).count() == 0, "Standplaats zonder geometrie!"
@@ -1063,9 +1066,9 @@ class ImportStandplaatsenTask(batch.BasicTask):
         self.landelijke_ids = uva2.read_landelijk_id_mapping(self.bag_path, "STA")
         standplaatsen = uva2.process_uva2(self.bag_path, "STA", self.process_row)
 
-        models.Standplaats.objects.bulk_create(standplaatsen, batch_size=database.BATCH_SIZE)
+        database.bulk_create_chunked(models.Standplaats, standplaatsen)
 
-        geo.process_wkt(self.wkt_path, "BAG_STANDPLAATS_GEOMETRIE.dat", self.process_wkt_row)
+        geo.copy_wkt(self.wkt_path, "BAG_STANDPLAATS_GEOMETRIE.dat", models.Standplaats)
 
     def process_row(self, r):
         if not uva2.geldig_tijdvak(r):
@@ -1110,20 +1113,13 @@ class ImportStandplaatsenTask(batch.BasicTask):
             mutatie_gebruiker=r['Mutatie-gebruiker'],
         )
 
-    def process_wkt_row(self, wkt_id, geometrie):
-        key = '0' + wkt_id
-        try:
-            standplaats = models.Standplaats.objects.get(id=key)
-        except models.Standplaats.DoesNotExist:
-            log.warning('Standplaats/WKT {} references non-existing standplaats {}; skipping'.format(wkt_id, key))
-            return
-
-        standplaats.geometrie = geometrie
-        return standplaats.save()
-
 
-class ImportVboTask(batch.BasicTask):
+class ImportVboTask(batch.BasicTask, database.CopyLoadMixin):
     name = "Import VBO - Verblijfsobjecten"
+    clears = (models.Verblijfsobject,)
+    # keep at most 10.000 verblijfsobjecten (with geometry) in memory
+    chunk_size = 10000
+    depends_on = ('CodeOmschrijvingUvaTask', 'ImportBuurtTask')
 
     def __init__(self, path):
         self.path = path
@@ -1171,11 +1167,12 @@ class ImportVboTask(batch.BasicTask):
     def process(self):
         self.landelijke_ids = uva2.read_landelijk_id_mapping(self.path, "VBO")
 
-        verblijfsobjecten = uva2.process_uva2(self.path, "VBO", self.process_row)
+        verblijfsobjecten = uva2.process_uva2(
+            self.path, "VBO", self.process_row, workers=self.parse_workers)
 
-        models.Verblijfsobject.objects.bulk_create(verblijfsobjecten, batch_size=database.BATCH_SIZE)
+        self.bulk_insert(models.Verblijfsobject, verblijfsobjecten)
 
-        validate_geometry(models.Verblijfsobject)
+        geo.validate_geometry(models.Verblijfsobject)
 
     def process_row(self, r):
         if not uva2.geldig_tijdvak(r):
@@ -1265,7 +1262,8 @@ class ImportVboTask(batch.BasicTask):
             log.warning('Verblijfsobject {} references non-existing bron {}; ignoring'.format(pk, buurt_id))
             buurt_id = None
 
-        return models.Verblijfsobject(
+        return self.new_row(
+            models.Verblijfsobject,
             pk=pk,
             landelijk_id=landelijk_id,
             geometrie=geo,
@@ -1307,13 +1305,14 @@ class ImportVboTask(batch.BasicTask):
 
 class ImportPandTask(batch.BasicTask):
     name = "Import PND"
+    depends_on = ('ImportStatusTask', 'ImportBouwblokTask')
+    clears = (models.Pand,)
 
     def __init__(self, bag_path, wkt_path):
         self.wkt_path = wkt_path
         self.bag_path = bag_path
         self.statussen = set()
         self.bouwblokken = set()
-        self.panden = dict()
         self.landelijke_ids = dict()
 
     def before(self):
@@ -1322,17 +1321,44 @@ class ImportPandTask(batch.BasicTask):
 
     def after(self):
         self.statussen.clear()
-        self.panden.clear()
         self.bouwblokken.clear()
         self.landelijke_ids.clear()
 
     def process(self):
         self.landelijke_ids = uva2.read_landelijk_id_mapping(self.bag_path, "PND")
-        self.panden = dict(uva2.process_uva2(self.bag_path, "PND", self.process_row))
+        panden = uva2.process_uva2(
+            self.bag_path, "PND", self.process_row,
+            workers=settings.IMPORT_PARSE_WORKERS)
 
-        geo.process_wkt(self.wkt_path, "BAG_PAND_GEOMETRIE.dat", self.process_wkt_row)
+        database.bulk_create_last_wins(models.Pand, panden)
 
-        models.Pand.objects.bulk_create(self.panden.values(), batch_size=database.BATCH_SIZE)
+        # PostGIS parses the polygons, no geometry is held in memory
+        geo.copy_wkt(self.wkt_path, "BAG_PAND_GEOMETRIE.dat", models.Pand)
+
+        self.set_buurten()
+
+    def set_buurten(self):
+        """
+        Store the buurt of every pand: the buurt of its bouwblok,
+        or else the first buurt at its geometrie.
+        """
+        with connection.cursor() as c:
+            c.execute("""
+UPDATE bag_pand p
+SET _buurt_id = bb.buurt_id
+FROM bag_bouwblok bb
+WHERE p.bouwblok_id = bb.id AND bb.buurt_id IS NOT NULL
+            """)
+
+            c.execute("""
+UPDATE bag_pand p
+SET _buurt_id = (
+  SELECT b.id FROM bag_buurt b
+  WHERE ST_DWithin(p.geometrie, b.geometrie, 0)
+  ORDER BY b.id
+  LIMIT 1)
+WHERE p._buurt_id IS NULL AND p.geometrie IS NOT NULL
+            """)
 
     def process_row(self, r):
         if not uva2.geldig_tijdvak(r):
@@ -1358,7 +1384,7 @@ class ImportPandTask(batch.BasicTask):
             log.warning('Pand {} references non-existing bouwblok {}; ignoring'.format(pk, bbk_id))
             bbk_id = None
 
-        return pk, models.Pand(
+        return models.Pand(
             pk=pk,
             landelijk_id=landelijk_id,
             document_mutatie=uva2.uva_datum(r['DocumentdatumMutatiePand']),
@@ -1375,17 +1401,11 @@ class ImportPandTask(batch.BasicTask):
             bouwblok_id=bbk_id,
         )
 
-    def process_wkt_row(self, wkt_id, geometrie):
-        key = '0' + wkt_id
-        if key not in self.panden:
-            log.warning('Pand/WKT {} references non-existing pand {}; skipping'.format(wkt_id, key))
-            return
-
-        self.panden[key].geometrie = geometrie
-
 
 class ImportPandVboTask(batch.BasicTask):
     name = "Import PNDVBO - Pand-Verblijfsobject relatie"
+    depends_on = ('ImportPandTask', 'ImportVboTask')
+    clears = (models.VerblijfsobjectPandRelatie,)
 
     def __init__(self, path):
         self.path = path
@@ -1442,26 +1462,42 @@ BAG_DOC_TYPES = [
 ]
 
 
-class DeleteGebiedIndexTask(index.DeleteIndexTask):
+class CreateGebiedIndexTask(index.CreateIndexTask):
     index = settings.ELASTIC_INDICES['BAG_GEBIED']
     doc_types = [documents.Gebied]
 
 
-class DeleteBouwblokIndexTask(index.DeleteIndexTask):
+class CreateBouwblokIndexTask(index.CreateIndexTask):
     index = settings.ELASTIC_INDICES['BAG_BOUWBLOK']
     doc_types = [documents.Bouwblok]
 
 
-class DeleteNummerAanduidingIndexTask(index.DeleteIndexTask):
+class CreateNummerAanduidingIndexTask(index.CreateIndexTask):
     index = settings.ELASTIC_INDICES['NUMMERAANDUIDING']
     doc_types = [documents.Nummeraanduiding]
 
 
-class DeletePandTask(index.DeleteIndexTask):
+class CreatePandIndexTask(index.CreateIndexTask):
     index = settings.ELASTIC_INDICES['BAG_PAND']
     doc_types = [documents.Pand]
 
 
+class SwapGebiedIndexTask(index.SwapIndexTask):
+    index = settings.ELASTIC_INDICES['BAG_GEBIED']
+
+
+class SwapBouwblokIndexTask(index.SwapIndexTask):
+    index = settings.ELASTIC_INDICES['BAG_BOUWBLOK']
+
+
+class SwapNummerAanduidingIndexTask(index.SwapIndexTask):
+    index = settings.ELASTIC_INDICES['NUMMERAANDUIDING']
+
+
+class SwapPandIndexTask(index.SwapIndexTask):
+    index = settings.ELASTIC_INDICES['BAG_PAND']
+
+
 class IndexLigplaatsTask(index.ImportIndexTask):
     name = "index ligplaatsen"
     queryset = models.Ligplaats.objects.\
@@ -1493,12 +1529,13 @@ class IndexVerblijfsobjectTask(index.ImportIndexTask):
         return documents.from_verblijfsobject(obj)
 
 
-class IndexOpenbareRuimteTask(index.ImportIndexTask):
+class IndexOpenbareRuimteTask(index.ImportRowIndexTask):
     name = "index openbare ruimtes"
-    queryset = models.OpenbareRuimte.objects.prefetch_related('adressen')
+    index = settings.ELASTIC_INDICES['BAG_GEBIED']
+    queryset = documents.openbare_ruimte_rows()
 
-    def convert(self, obj):
-        return documents.from_openbare_ruimte(obj)
+    def convert(self, row):
+        return documents.from_openbare_ruimte(row)
 
 
 #########################################################
@@ -1506,92 +1543,94 @@ class IndexOpenbareRuimteTask(index.ImportIndexTask):
 #########################################################
 
 
-class IndexUnescoTask(index.ImportIndexTask):
+class IndexUnescoTask(index.ImportRowIndexTask):
     name = "index unesco"
-    queryset = models.Unesco.objects.all()
+    index = settings.ELASTIC_INDICES['BAG_GEBIED']
+    queryset = documents.gebied_rows(models.Unesco, 'naam')
 
-    def convert(self, obj):
-        return documents.from_unesco(obj)
+    def convert(self, row):
+        return documents.from_unesco(row)
 
 
-class IndexBuurtTask(index.ImportIndexTask):
+class IndexBuurtTask(index.ImportRowIndexTask):
     name = "index buurten"
-    queryset = models.Buurt.objects.all()
+    index = settings.ELASTIC_INDICES['BAG_GEBIED']
+    queryset = documents.gebied_rows(models.Buurt, 'naam', 'code')
 
-    def convert(self, obj):
-        return documents.from_buurt(obj)
+    def convert(self, row):
+        return documents.from_buurt(row)
 
 
-class IndexBuurtcombinatieTask(index.ImportIndexTask):
+class IndexBuurtcombinatieTask(index.ImportRowIndexTask):
     name = "index buurtcombinaties"
-    queryset = models.Buurtcombinatie.objects.all()
+    index = settings.ELASTIC_INDICES['BAG_GEBIED']
+    queryset = documents.gebied_rows(models.Buurtcombinatie, 'naam', 'code')
 
-    def convert(self, obj):
-        return documents.from_buurtcombinatie(obj)
+    def convert(self, row):
+        return documents.from_buurtcombinatie(row)
 
 
-class IndexGebiedsgerichtWerkenTask(index.ImportIndexTask):
+class IndexGebiedsgerichtWerkenTask(index.ImportRowIndexTask):
     name = "index gebiedsgerichtwerken"
-    queryset = models.Gebiedsgerichtwerken.objects.all()
+    index = settings.ELASTIC_INDICES['BAG_GEBIED']
+    queryset = documents.gebied_rows(models.Gebiedsgerichtwerken, 'naam', 'code')
 
-    def convert(self, obj):
-        return documents.from_gebiedsgerichtwerken(obj)
+    def convert(self, row):
+        return documents.from_gebiedsgerichtwerken(row)
 
 
-class IndexStadsdeelTask(index.ImportIndexTask):
+class IndexStadsdeelTask(index.ImportRowIndexTask):
     name = "index stadsdeel"
-    queryset = models.Stadsdeel.objects.all()
+    index = settings.ELASTIC_INDICES['BAG_GEBIED']
+    queryset = documents.gebied_rows(models.Stadsdeel, 'naam', 'code')
 
-    def convert(self, obj):
-        return documents.from_stadsdeel(obj)
+    def convert(self, row):
+        return documents.from_stadsdeel(row)
 
 
-class IndexGrootstedelijkgebiedTask(index.ImportIndexTask):
+class IndexGrootstedelijkgebiedTask(index.ImportRowIndexTask):
     name = "Index grootstedelijk"
-    queryset = models.Grootstedelijkgebied.objects.all()
+    index = settings.ELASTIC_INDICES['BAG_GEBIED']
+    queryset = documents.gebied_rows(models.Grootstedelijkgebied, 'naam', 'gsg_type')
 
-    def convert(self, obj):
-        return documents.from_grootstedelijk(obj)
+    def convert(self, row):
+        return documents.from_grootstedelijk(row)
 
 
-class IndexGemeenteTask(index.ImportIndexTask):
+class IndexGemeenteTask(index.ImportRowIndexTask):
     name = "index gemeenten"
-    queryset = models.Gemeente.objects.all()
+    index = settings.ELASTIC_INDICES['BAG_GEBIED']
+    queryset = models.Gemeente.objects.values('id', 'naam', 'code')
 
-    def convert(self, obj):
-        return documents.from_gemeente(obj)
+    def convert(self, row):
+        return documents.from_gemeente(row)
 
 
-class IndexWoonplaatsTask(index.ImportIndexTask):
+class IndexWoonplaatsTask(index.ImportRowIndexTask):
     name = "index woonplatsen"
-    queryset = models.Woonplaats.objects.all()
+    index = settings.ELASTIC_INDICES['BAG_GEBIED']
+    queryset = models.Woonplaats.objects.values('id', 'naam', 'landelijk_id')
 
-    def convert(self, obj):
-        return documents.from_woonplaats(obj)
+    def convert(self, row):
+        return documents.from_woonplaats(row)
 
 
 ##########################################################
 ##########################################################
 
 
-class IndexNummerAanduidingTask(index.ImportIndexTask):
+class IndexNummerAanduidingTask(index.ImportRowIndexTask):
     name = "index nummer aanduidingen"
-    queryset = models.Nummeraanduiding.objects.\
-        prefetch_related('verblijfsobject').\
-        prefetch_related('verblijfsobject__status').\
-        prefetch_related('standplaats').\
-        prefetch_related('standplaats__status').\
-        prefetch_related('ligplaats').\
-        prefetch_related('ligplaats__status').\
-        prefetch_related('status').\
-        prefetch_related('openbare_ruimte')
+    index = settings.ELASTIC_INDICES['NUMMERAANDUIDING']
+    queryset = documents.nummeraanduiding_rows()
 
-    def convert(self, obj):
-        return documents.from_nummeraanduiding_ruimte(obj)
+    def convert(self, row):
+        return documents.from_nummeraanduiding_ruimte(row)
 
 
 class IndexPandTask(index.ImportIndexTask):
     name = "index pand"
+    index = settings.ELASTIC_INDICES['BAG_PAND']
 
     queryset = models.Pand.objects.only('landelijk_id', 'pandnaam')
 
@@ -1601,6 +1640,7 @@ class IndexPandTask(index.ImportIndexTask):
 
 class IndexBouwblokTask(index.ImportIndexTask):
     name = "index bouwblokken"
+    index = settings.ELASTIC_INDICES['BAG_BOUWBLOK']
     queryset = models.Bouwblok.objects.all()
 
     def convert(self, obj):
@@ -1617,86 +1657,38 @@ class ImportBuurtcombinatieTask(batch.BasicTask):
     """
 
     name = "Import GBD Buurtcombinatie"
+    depends_on = ('ImportSdlTask',)
+    clears = (models.Buurtcombinatie,)
 
     def __init__(self, shp_path):
         self.shp_path = shp_path
-        self.stadsdelen = dict()
 
     def before(self):
-        self.stadsdelen = dict(
-            models.Stadsdeel.objects.values_list("code", "id"))
+        pass
 
     def after(self):
-        self.stadsdelen.clear()
-        validate_geometry(models.Buurtcombinatie)
+        geo.validate_geometry(models.Buurtcombinatie)
 
     def process(self):
-        geo.process_shp(
-            self.shp_path, "GBD_Buurtcombinatie.shp", self.process_feature)
-
-    def process_feature(self, feat):
-        vollcode = feat.get('VOLLCODE')
-
-        models.Buurtcombinatie(
-            id=str(int(feat.get('ID'))),
-            naam=feat.get('NAAM'),
-            code=feat.get('CODE'),
-            vollcode=vollcode,
-            brondocument_naam=feat.get('DOCNR'),
-            brondocument_datum=feat.get('DOCDATUM'),
-            ingang_cyclus=feat.get('INGSDATUM'),
-            geometrie=geo.get_multipoly(feat.geom.wkt),
-            stadsdeel_id=self.stadsdelen.get(vollcode[0]),
-            begin_geldigheid=feat.get('INGSDATUM'),
-            einde_geldigheid=feat.get('EINDDATUM'),
-        ).save()
-
-
-def log_details_wrong_geometry(model):
-    """
-    log details of wrong geometry.
-    postgres has function for that.
-    easy debugging..
-    """
-
-    table = model._meta.db_table
-
-    explain_error_sql = """
-    SELECT id, reason(ST_IsValidDetail(geometrie)),
-               ST_AsText(location(ST_IsValidDetail(geometrie))) as location
-    FROM {}
-    WHERE ST_IsValid(geometrie) = false;
-    """.format(connection.ops.quote_name(table))
-
-    with connection.cursor() as c:
-        c.execute(explain_error_sql)
-
-        row = c.fetchone()
-
-        log.error(f'\n\n!!! WRONG GEOMETRY in {table} !!!\n\n')
-        while row is not None:
-            log.error(f'id: {row[0]} : {row[1]} : {row[2]}')
-            row = c.fetchone()
-
-
-def validate_geometry(model):
-    """
-    given model validdate geometry so we can properly log it.
-    and crash.
-    """
-    invalid = model.objects.filter(
-        geometrie__isvalid=False)
-
-    count = invalid.count()
-
-    if count:
-        log.error(model)
-        log.error([o.id for o in invalid])
-        # print out details of wrong geometry. postgres has function for that.
-        log_details_wrong_geometry(model)
-
-    # crash if any errors.
-    assert count == 0
+        with geo.staged_shp(self.shp_path, "GBD_Buurtcombinatie.shp") as shp:
+            geo.insert_from_shp(
+                models.Buurtcombinatie,
+                """{} s
+                LEFT JOIN bag_stadsdeel sd ON sd.code = left(s.vollcode, 1)
+                """.format(shp),
+                dict(
+                    id='trunc(s.id)::bigint::text',
+                    naam='s.naam',
+                    code='s.code',
+                    vollcode='s.vollcode',
+                    brondocument_naam='s.docnr',
+                    brondocument_datum='s.docdatum',
+                    ingang_cyclus='s.ingsdatum',
+                    geometrie=geo.multipoly_sql('s.geom'),
+                    stadsdeel='sd.id',
+                    begin_geldigheid='s.ingsdatum',
+                    einde_geldigheid='s.einddatum',
+                ))
 
 
 class ImportGebiedsgerichtwerkenTask(batch.BasicTask):
@@ -1708,47 +1700,49 @@ class ImportGebiedsgerichtwerkenTask(batch.BasicTask):
     """
 
     name = "Import GBD Gebiedsgerichtwerken"
+    depends_on = ('ImportSdlTask',)
+    clears = (models.Gebiedsgerichtwerken,)
 
     def __init__(self, shp_path):
         self.shp_path = shp_path
-        self.stadsdelen = dict()
 
     def before(self):
-        self.stadsdelen = dict(
-            models.Stadsdeel.objects.values_list("code", "pk"))
-
-        assert self.stadsdelen, "No stadsdelen found!"
+        assert models.Stadsdeel.objects.exists(), "No stadsdelen found!"
 
     def after(self):
         """
         Validate geometry
         """
-        self.stadsdelen.clear()
-        validate_geometry(models.Gebiedsgerichtwerken)
+        geo.validate_geometry(models.Gebiedsgerichtwerken)
         log.debug(
             '%d Gebiedsgerichtwerken gebieden', models.Gebiedsgerichtwerken.objects.count())
 
     def process(self):
-        geo.process_shp(
-            self.shp_path, "GBD_gebiedsgerichtwerken.shp",
-            self.process_feature)
-
-    def process_feature(self, feat):
-        sdl = feat.get('STADSDEEL')
-        if sdl not in self.stadsdelen:
-            log.warning(
-                'Gebiedsgerichtwerken {} references non-existing stadsdeel {}; skipping'.format(sdl, sdl))
-            return
-
-        code = feat.get('CODE')
+        with geo.staged_shp(
+                self.shp_path, "GBD_gebiedsgerichtwerken.shp") as shp:
+            self.log_missing_stadsdelen(shp)
+
+            geo.insert_from_shp(
+                models.Gebiedsgerichtwerken,
+                "{} s JOIN bag_stadsdeel sd ON sd.code = s.stadsdeel".format(shp),
+                dict(
+                    id='s.code',
+                    naam='s.naam',
+                    code='s.code',
+                    stadsdeel='sd.id',
+                    geometrie=geo.multipoly_sql('s.geom'),
+                ))
+
+    def log_missing_stadsdelen(self, shp):
+        with connection.cursor() as c:
+            c.execute("""
+SELECT DISTINCT s.stadsdeel FROM {} s
+WHERE NOT EXISTS (SELECT 1 FROM bag_stadsdeel sd WHERE sd.code = s.stadsdeel)
+            """.format(shp))
 
-        models.Gebiedsgerichtwerken(
-            id=code,
-            naam=feat.get('NAAM'),
-            code=code,
-            stadsdeel_id=self.stadsdelen[sdl],
-            geometrie=geo.get_multipoly(feat.geom.wkt),
-        ).save()
+            for sdl, in c.fetchall():
+                log.warning(
+                    'Gebiedsgerichtwerken references non-existing stadsdeel %s; skipping', sdl)
 
 
 class ImportGebiedsgerichtwerkenPraktijkgebiedenTask(batch.BasicTask):
@@ -1759,6 +1753,7 @@ class ImportGebiedsgerichtwerkenPraktijkgebiedenTask(batch.BasicTask):
     """
 
     name = "Import GBD Gebiedsgerichtwerken praktijkgebieden"
+    depends_on = ()
 
     def __init__(self, shp_path):
         self.shp_path = shp_path
@@ -1771,22 +1766,17 @@ class ImportGebiedsgerichtwerkenPraktijkgebiedenTask(batch.BasicTask):
         """
         Validate geometry
         """
-        validate_geometry(models.GebiedsgerichtwerkenPraktijkgebieden)
+        geo.validate_geometry(models.GebiedsgerichtwerkenPraktijkgebieden)
         log.debug(
             '%d Gebiedsgerichtwerken praktijkgebieden', models.GebiedsgerichtwerkenPraktijkgebieden.objects.count())
 
     def process(self):
-        geo.process_shp(
-            self.shp_path, "GBD_gebiedsgerichtwerken_praktijk.shp",
-            self.process_feature)
-
-    def process_feature(self, feat):
-        naam = feat.get('NAAM')
-
-        models.GebiedsgerichtwerkenPraktijkgebieden(
-            naam=naam,
-            geometrie=geo.get_multipoly(feat.geom.wkt),
-        ).save()
+        with geo.staged_shp(
+                self.shp_path, "GBD_gebiedsgerichtwerken_praktijk.shp") as shp:
+            geo.insert_from_shp(
+                models.GebiedsgerichtwerkenPraktijkgebieden,
+                "{} s".format(shp),
+                dict(naam='s.naam', geometrie=geo.multipoly_sql('s.geom')))
 
 
 class ImportGrootstedelijkgebiedTask(batch.BasicTask):
@@ -1798,6 +1788,8 @@ class ImportGrootstedelijkgebiedTask(batch.BasicTask):
     """
 
     name = "Import GBD Grootstedelijkgebied"
+    depends_on = ()
+    clears = (models.Grootstedelijkgebied,)
 
     def __init__(self, shp_path):
         self.shp_path = shp_path
@@ -1809,7 +1801,7 @@ class ImportGrootstedelijkgebiedTask(batch.BasicTask):
         """
         Validate geometry
         """
-        validate_geometry(models.Grootstedelijkgebied)
+        geo.validate_geometry(models.Grootstedelijkgebied)
 
     def process(self):
         geo.process_shp(
@@ -1835,6 +1827,8 @@ class ImportUnescoTask(batch.BasicTask):
     """
 
     name = "Import GBD unesco"
+    depends_on = ()
+    clears = (models.Unesco,)
 
     def __init__(self, shp_path):
         self.shp_path = shp_path
@@ -1846,7 +1840,7 @@ class ImportUnescoTask(batch.BasicTask):
         """
         Validate geometry
         """
-        validate_geometry(models.Unesco)
+        geo.validate_geometry(models.Unesco)
 
     def process(self):
         geo.process_shp(self.shp_path, "GBD_unesco.shp", self.process_feature)
@@ -1862,6 +1856,7 @@ class ImportUnescoTask(batch.BasicTask):
 
 class DenormalizeIndicatieTask(batch.BasicTask):
     name = "Add indicatie to BAG vbo / standplaats / ligplaats data"
+    depends_on = ('ImportIndicatieAOTTask', 'DenormalizeDataTask')
 
     def before(self):
         pass
@@ -1899,6 +1894,7 @@ WHERE i.landelijk_id = vbo.landelijk_id
 
 class DenormalizeDataTask(batch.BasicTask):
     name = "Denormalize BAG vbo / standplaats / ligplaats data"
+    depends_on = ('SetHoofdAdres',)
 
     def before(self):
         pass
@@ -2016,6 +2012,14 @@ WHERE num.ligplaats_id = lig.id
             log.debug(update_geom_num_ligplaats_sql)
             c.execute(update_geom_num_ligplaats_sql)
 
+            # centroids for the search documents
+            for table in ('bag_verblijfsobject', 'bag_standplaats', 'bag_ligplaats'):
+                c.execute("""
+UPDATE {}
+SET _centroid_wgs84 = ST_Transform(ST_Centroid(geometrie), 4326)
+WHERE geometrie IS NOT NULL
+                """.format(table))
+
 
 class UpdateGebiedenAttributenTask(batch.BasicTask):
     """
@@ -2025,6 +2029,7 @@ class UpdateGebiedenAttributenTask(batch.BasicTask):
     """
 
     name = "Denormalize gebiedsgericht werken data"
+    depends_on = ('ImportGebiedsgerichtwerkenTask', 'DenormalizeIndicatieTask')
 
     def before(self):
         pass
@@ -2033,38 +2038,23 @@ class UpdateGebiedenAttributenTask(batch.BasicTask):
         pass
 
     def process(self):
-        for ggw in models.Gebiedsgerichtwerken.objects.all():
-
-            # add buurten to GGW
-            buurten = models.Buurt.objects.filter(
-                geometrie__within=ggw.geometrie)
-
-            for b in buurten:
-                ggw.buurten.add(b)
-
-            vbos = models.Verblijfsobject.objects.filter(
-                geometrie__within=ggw.geometrie)
-
-            log.debug('Update Gebiedsgerichtwerken %s key %s VBO',
-                      ggw.naam, vbos.count())
-
-            vbos.update(_gebiedsgerichtwerken=ggw.id)
-
-            standplaatsen = models.Standplaats.objects.filter(
-                geometrie__within=ggw.geometrie)
-
-            log.debug('Update Gebiedsgerichtwerken %s key %s Standplaats',
-                      ggw.naam, standplaatsen.count())
-
-            standplaatsen.update(_gebiedsgerichtwerken=ggw.id)
-
-            ligplaatsen = models.Ligplaats.objects.filter(
-                geometrie__within=ggw.geometrie)
+        # add buurten to GGW
+        with connection.cursor() as c:
+            c.execute("""
+UPDATE bag_buurt b
+SET gebiedsgerichtwerken_id = ggw.id
+FROM bag_gebiedsgerichtwerken ggw
+WHERE ST_Within(b.geometrie, ggw.geometrie)
+            """)
 
-            log.debug('Update Gebiedsgerichtwerken %s key %s Ligplaats',
-                      ggw.naam, ligplaatsen.count())
+            log.debug('%d buurten in Gebiedsgerichtwerken', c.rowcount)
 
-            ligplaatsen.update(_gebiedsgerichtwerken=ggw.id)
+        geo.assign_area(
+            models.Gebiedsgerichtwerken, '_gebiedsgerichtwerken', [
+                models.Verblijfsobject,
+                models.Standplaats,
+                models.Ligplaats,
+            ])
 
 
 class UpdateGrootstedelijkAttributenTask(batch.BasicTask):
@@ -2073,6 +2063,7 @@ class UpdateGrootstedelijkAttributenTask(batch.BasicTask):
     """
 
     name = "Denormalize grootstedelijke gebieden data"
+    depends_on = ('ImportGrootstedelijkgebiedTask', 'UpdateGebiedenAttributenTask')
 
     def before(self):
         pass
@@ -2081,30 +2072,12 @@ class UpdateGrootstedelijkAttributenTask(batch.BasicTask):
         pass
 
     def process(self):
-        for gsg in models.Grootstedelijkgebied.objects.all():
-            vbos = models.Verblijfsobject.objects.filter(
-                geometrie__within=gsg.geometrie)
-
-            log.debug('Update Grootstedelijk %s key %s VBO',
-                      gsg.naam, vbos.count())
-
-            vbos.update(_grootstedelijkgebied=gsg.id)
-
-            standplaatsen = models.Standplaats.objects.filter(
-                geometrie__within=gsg.geometrie)
-
-            log.debug('Update Grootstedelijk %s key %s Standplaats',
-                      gsg.naam, standplaatsen.count())
-
-            standplaatsen.update(_grootstedelijkgebied=gsg.id)
-
-            ligplaatsen = models.Ligplaats.objects.filter(
-                geometrie__within=gsg.geometrie)
-
-            log.debug('Update Grootstedelijk %s key %s Ligplaats',
-                      gsg.naam, ligplaatsen.count())
-
-            ligplaatsen.update(_grootstedelijkgebied=gsg.id)
+        geo.assign_area(
+            models.Grootstedelijkgebied, '_grootstedelijkgebied', [
+                models.Verblijfsobject,
+                models.Standplaats,
+                models.Ligplaats,
+            ])
 
 
 class ImportBagJob(object):
@@ -2189,13 +2162,51 @@ class ImportBagJob(object):
         ]
 
 
+class ImportBagDeltaJob(object):
+    """
+    Only write the verblijfsobjecten and nummeraanduidingen that changed
+    since the previous delta import, and the data derived from them.
+
+    Runs on top of a full import, the other tables are left as they are.
+    """
+    name = "Import BAG delta"
+
+    def __init__(self):
+        diva = settings.DIVA_DIR
+        if not os.path.exists(diva):
+            raise ValueError("DIVA_DIR not found: {}".format(diva))
+        self.bag_path = os.path.join(diva, 'bag')
+
+    def tasks(self):
+        # a delta load only writes the changes, nothing is cleared
+        vbo = ImportVboTask(self.bag_path)
+        vbo.delta = True
+        vbo.clears = ()
+
+        num = ImportNumTask(self.bag_path)
+        num.delta = True
+        num.clears = ()
+
+        # ligplaatsen and standplaatsen are left as they are
+        hoofdadres = SetHoofdAdres(self.bag_path)
+        hoofdadres.depends_on = ('ImportVboTask', 'ImportNumTask')
+
+        return [
+            vbo,
+            num,
+            hoofdadres,
+            DenormalizeDataTask(),
+        ]
+
+
 class IndexBagJob(object):
-    name = "Delete and Fill Nummeraanduiding search-index"
+    name = "Create, Fill and Swap in Nummeraanduiding search-index"
 
     def tasks(self):
         return [
-            DeleteNummerAanduidingIndexTask(),
+            CreateNummerAanduidingIndexTask(),
             IndexNummerAanduidingTask(),
+            SwapNummerAanduidingIndexTask(),
         ]
 
 
@@ -2209,22 +2220,35 @@ class BuildIndexBagJob(object):
 
 
 class DeleteIndexBagJob(object):
+    """
+    Start a new BAG index, the live index stays in use
+    """
+    name = "Create new BAG related indexes"
+
+    def tasks(self):
+        return [
+            CreateNummerAanduidingIndexTask(),
+        ]
+
 
-    name = "Delete BAG related indexes"
+class SwapIndexBagJob(object):
+
+    name = "Swap in BAG related indexes"
 
     def tasks(self):
         return [
-            DeleteNummerAanduidingIndexTask(),
+            SwapNummerAanduidingIndexTask(),
         ]
 
 
 class IndexPandJob(object):
-    name = "Delete and Fill Pand search-index"
+    name = "Create, Fill and Swap in Pand search-index"
 
     def tasks(self):
         return [
-            DeletePandTask(),
+            CreatePandIndexTask(),
             IndexPandTask(),
+            SwapPandIndexTask(),
         ]
 
 
@@ -2238,23 +2262,48 @@ class BuildIndexPandJob(object):
 
 
 class DeleteIndexPandJob(object):
+    """
+    Start a new Pand index, the live index stays in use
+    """
+    name = "Create new Pand related indexes"
 
-    name = "Delete Pand related indexes"
+    def tasks(self):
+        return [
+            CreatePandIndexTask(),
+        ]
+
+
+class SwapIndexPandJob(object):
+
+    name = "Swap in Pand related indexes"
 
     def tasks(self):
         return [
-            DeletePandTask(),
+            SwapPandIndexTask(),
         ]
 
 
 class DeleteIndexGebiedJob(object):
+    """
+    Start new gebied indexes, the live indexes stay in use
+    """
+    name = "Create new BAG_GEBIED index"
+
+    def tasks(self):
+        return [
+            CreateGebiedIndexTask(),
+            CreateBouwblokIndexTask(),
+        ]
 
-    name = "Delete BAG_GEBIED index"
+
+class SwapIndexGebiedJob(object):
+
+    name = "Swap in BAG_GEBIED index"
 
     def tasks(self):
         return [
-            DeleteGebiedIndexTask(),
-            DeleteBouwblokIndexTask(),
+            SwapGebiedIndexTask(),
+            SwapBouwblokIndexTask(),
         ]
 
 
@@ -2263,13 +2312,15 @@ class IndexNummerAanduidingJob(object):
 
     def tasks(self):
         return [
-            DeleteNummerAanduidingIndexTask(),
-            IndexNummerAanduidingTask()
+            CreateNummerAanduidingIndexTask(),
+            IndexNummerAanduidingTask(),
+            SwapNummerAanduidingIndexTask(),
         ]
 
 
 class IndexGebiedenJob(object):
-    """Important! This only adds to the bag index, but does not create it"""
+    """Important! This only adds to the newest gebied index, but does not
+    create it or swap it in"""
 
     name = "Create add gebieden to BAG index"
 
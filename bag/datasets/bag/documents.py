@@ -3,8 +3,13 @@
 
 import elasticsearch_dsl as es
 from django.conf import settings
+from django.contrib.gis.db.models import PointField
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db.models import Case, F, Q, When
+from django.db.models.functions import Coalesce
 
 from search import analyzers
+from search.index import bulk_action, lon_lat, row_centroid, wgs84_centroid
 from . import models
 
 
@@ -284,42 +289,6 @@ class Pand(es.DocType):
         name = settings.ELASTIC_INDICES['BAG_PAND']
 
 
-def get_centroid(geom, transform=None):
-    """
-    Finds the centroid of a geometrie object
-    An optional transform string can be given noting
-    the name of the system to translate to, i.e. 'wgs84'
-    """
-    if not geom:
-        return None
-
-    result = geom.centroid
-    if transform:
-        result.transform(transform)
-    return result.coords
-
-
-def add_verblijfsobject(doc, vo: models.Verblijfsobject):
-    if vo:
-        doc.centroid = get_centroid(vo.geometrie, 'wgs84')
-        doc.subtype_id = vo.id
-        doc.order = analyzers.orderings['adres']
-
-
-def add_standplaats(doc, sp: models.Standplaats):
-    if sp:
-        doc.centroid = get_centroid(sp.geometrie, 'wgs84')
-        doc.subtype_id = sp.id
-        doc.order = analyzers.orderings['adres']
-
-
-def add_ligplaats(doc, lp: models.Ligplaats):
-    if lp:
-        doc.centroid = get_centroid(lp.geometrie, 'wgs84')
-        doc.subtype_id = lp.id
-        doc.order = analyzers.orderings['adres']
-
-
 def from_bouwblok(n: models.Bouwblok):
     doc = Bouwblok(_id=n.id)
     doc.code = n.code
@@ -328,213 +297,241 @@ def from_bouwblok(n: models.Bouwblok):
     return doc
 
 
-def from_nummeraanduiding_ruimte(n: models.Nummeraanduiding):
-    doc = Nummeraanduiding(_id=n.id)
-    doc.adres = n.adres()
-    doc.comp_address = "{0} {1}".format(n.openbare_ruimte.naam,
-                                        n.toevoeging)
-    doc.comp_address_nen = "{0} {1}".format(n.openbare_ruimte.naam_nen,
-                                            n.toevoeging)
-    doc.comp_address_ptt = "{0} {1}".format(n.openbare_ruimte.naam_ptt,
-                                            n.toevoeging)
-    doc.comp_address_pcode = "{0} {1}".format(n.postcode, n.toevoeging)
-    doc.postcode = n.postcode
-    doc.straatnaam = n.openbare_ruimte.naam
-    doc.straatnaam_nen = n.openbare_ruimte.naam_nen
-    doc.straatnaam_ptt = n.openbare_ruimte.naam_ptt
-    doc.straatnaam_keyword = n.openbare_ruimte.naam
-    doc.straatnaam_nen_keyword = n.openbare_ruimte.naam_nen
-    doc.straatnaam_ptt_keyword = n.openbare_ruimte.naam_ptt
-    doc.huisnummer = n.huisnummer
-    doc.toevoeging = n.toevoeging
-
-    doc.bag_huisletter = n.huisletter
-    doc.bag_toevoeging = n.huisnummer_toevoeging
-    doc.woonplaats = n.woonplaats.naam
-
-    doc.hoofdadres = n.hoofdadres
-
-    if n.status:
-        doc.status.append({
-            'code': n.status.code,
-            'omschrijving': n.status.omschrijving
-        })
-
-    doc.landelijk_id = n.landelijk_id
-
-    # verblijfsobject status
-    if n.adresseerbaar_object:
-        if n.adresseerbaar_object.status:
-            doc.vbo_status.append({
-                'code': n.adresseerbaar_object.status.code,
-                'omschrijving': n.adresseerbaar_object.status.omschrijving
-            })
-        doc.adresseerbaar_object_id = n.adresseerbaar_object.landelijk_id
-
-    if n.bron:
-        doc.bron = n.bron.omschrijving
-
-    # if not doc.subtype:
-    #    return doc
-
-    doc.subtype = n.get_type_display().lower()
-
-    if doc.subtype == 'verblijfsobject':
-        add_verblijfsobject(doc, n.verblijfsobject)
-    elif doc.subtype == 'standplaats':
-        add_standplaats(doc, n.standplaats)
-    elif doc.subtype == 'ligplaats':
-        add_ligplaats(doc, n.ligplaats)
-    elif doc.subtype == 'overig gebouwd object':
-        pass
-    elif doc.subtype == 'overig terrein':
-        pass
-
-    doc._display = n.adres()
-
-    return doc
-
-
-def from_openbare_ruimte(o: models.OpenbareRuimte):
-    d = Gebied(_id='opr_{}'.format(o.id))
-    d.type = 'openbare_ruimte'
+# the object a nummeraanduiding of a type is the adres of
+SUBTYPE_OBJECTS = (
+    (models.Nummeraanduiding.OBJECT_TYPE_VERBLIJFSOBJECT, 'verblijfsobject'),
+    (models.Nummeraanduiding.OBJECT_TYPE_STANDPLAATS, 'standplaats'),
+    (models.Nummeraanduiding.OBJECT_TYPE_LIGPLAATS, 'ligplaats'),
+)
 
-    # weg, water, spoorbaan, terrein, kunstwerk (brug), landschap,..
-    d.subtype = o.get_type_display().lower()
-    d.subtype_id = o.id
+SUBTYPES = {
+    code: omschrijving.lower()
+    for code, omschrijving in models.Nummeraanduiding.OBJECT_TYPE_CHOICES
+}
 
-    d.naam = o.naam
-    d.naam_nen = o.naam_nen
-    d.naam_ptt = o.naam_ptt
+OPENBARE_RUIMTE_TYPES = {
+    code: omschrijving.lower()
+    for code, omschrijving in models.OpenbareRuimte.TYPE_CHOICES
+}
 
-    postcodes = set()
 
-    for a in o.adressen.all():
-        if a.postcode:
-            postcodes.add(a.postcode)
+def _adresseerbaar_object(field):
+    # ligplaats or standplaats or verblijfsobject
+    return Case(
+        When(ligplaats__isnull=False, then=F('ligplaats__' + field)),
+        When(standplaats__isnull=False, then=F('standplaats__' + field)),
+        default=F('verblijfsobject__' + field),
+    )
 
-    d.postcode = list(postcodes)
-    d.order = analyzers.orderings['openbare_ruimte']
-    d._display = d.naam
 
-    d.centroid = get_centroid(o.geometrie, 'wgs84')
+def _subtype_object(expression):
+    # `expression` of the object of the type of the nummeraanduiding
+    return Case(*[
+        When(type=code, then=expression(name))
+        for code, name in SUBTYPE_OBJECTS
+    ])
 
-    d.landelijk_id = o.landelijk_id
-
-    return d
 
+def _stored_centroid(name):
+    # the WGS84 centroid stored by the import, computed when it is missing
+    return Coalesce(
+        F(name + '___centroid_wgs84'),
+        wgs84_centroid(name + '__geometrie'),
+        output_field=PointField(srid=4326),
+    )
 
-def from_unesco(u: models.Unesco):
-    d = Gebied(_id='unseco{}'.format(u.id))
 
-    d.type = 'gebied'
+def nummeraanduiding_rows():
+    """
+    The rows `from_nummeraanduiding_ruimte` builds documents of,
+    related objects are joined in
+    """
+    return models.Nummeraanduiding.objects.values(
+        'id', 'landelijk_id', 'huisnummer', 'huisletter',
+        'huisnummer_toevoeging', 'postcode', 'type', 'hoofdadres',
+        '_openbare_ruimte_naam',
+        'openbare_ruimte__naam',
+        'openbare_ruimte__naam_nen',
+        'openbare_ruimte__naam_ptt',
+        'openbare_ruimte__woonplaats__naam',
+        'status__code', 'status__omschrijving',
+        'bron__omschrijving',
+        adresseerbaar_object_id=_adresseerbaar_object('landelijk_id'),
+        vbo_status_code=_adresseerbaar_object('status__code'),
+        vbo_status_omschrijving=_adresseerbaar_object('status__omschrijving'),
+        subtype_id=_subtype_object(lambda name: F(name + '_id')),
+        **lon_lat(_subtype_object(_stored_centroid))
+    )
 
-    d.subtype = 'unesco'
 
-    d._display = '{} ({})'.format(u.naam, d.subtype)
+def _code_omschrijving(code, omschrijving):
+    if code is None:
+        return []
+
+    return [{'code': code, 'omschrijving': omschrijving}]
+
+
+def from_nummeraanduiding_ruimte(row):
+    huisnummer = (
+        row['huisnummer'], row['huisletter'], row['huisnummer_toevoeging'])
+    toevoeging = models.split_toevoeging(*huisnummer)
+    adres = '%s %s' % (
+        row['_openbare_ruimte_naam'], models.display_toevoeging(*huisnummer))
+
+    naam = row['openbare_ruimte__naam']
+    naam_nen = row['openbare_ruimte__naam_nen']
+    naam_ptt = row['openbare_ruimte__naam_ptt']
+
+    doc = dict(
+        adres=adres,
+        comp_address="{0} {1}".format(naam, toevoeging),
+        comp_address_nen="{0} {1}".format(naam_nen, toevoeging),
+        comp_address_ptt="{0} {1}".format(naam_ptt, toevoeging),
+        comp_address_pcode="{0} {1}".format(row['postcode'], toevoeging),
+        postcode=row['postcode'],
+        straatnaam=naam,
+        straatnaam_nen=naam_nen,
+        straatnaam_ptt=naam_ptt,
+        straatnaam_keyword=naam,
+        straatnaam_nen_keyword=naam_nen,
+        straatnaam_ptt_keyword=naam_ptt,
+        huisnummer=row['huisnummer'],
+        toevoeging=toevoeging,
+        bag_huisletter=row['huisletter'],
+        bag_toevoeging=row['huisnummer_toevoeging'],
+        woonplaats=row['openbare_ruimte__woonplaats__naam'],
+        hoofdadres=row['hoofdadres'],
+        status=_code_omschrijving(
+            row['status__code'], row['status__omschrijving']),
+        landelijk_id=row['landelijk_id'],
+        # verblijfsobject status
+        vbo_status=_code_omschrijving(
+            row['vbo_status_code'], row['vbo_status_omschrijving']),
+        adresseerbaar_object_id=row['adresseerbaar_object_id'],
+        bron=row['bron__omschrijving'],
+        subtype=SUBTYPES.get(row['type'], row['type']),
+        _display=adres,
+    )
 
-    d.subtype_id = u.id
-    d.naam = u.naam
-    d.centroid = get_centroid(u.geometrie, 'wgs84')
-    d.order = 1
-    return d
+    if row['subtype_id'] is not None:
+        doc.update(
+            centroid=row_centroid(row),
+            subtype_id=row['subtype_id'],
+            order=analyzers.orderings['adres'],
+        )
 
+    return bulk_action(Nummeraanduiding, row['id'], doc)
 
-def from_buurt(b: models.Buurt):
-    d = Gebied(_id='buurt{}'.format(b.id))
-    d.subtype = 'buurt'
-    d.type = 'gebied'
 
-    d.subtype_id = b.id
-    d.naam = b.naam
-    d._display = '{} ({})'.format(b.naam, d.subtype)
-    d.g_code = b.code
-    d.centroid = get_centroid(b.geometrie, 'wgs84')
-    d.order = 6
-    return d
+def openbare_ruimte_rows():
+    """
+    The rows `from_openbare_ruimte` builds documents of,
+    with the postcodes of the adressen
+    """
+    return models.OpenbareRuimte.objects.values(
+        'id', 'type', 'naam', 'naam_nen', 'naam_ptt', 'landelijk_id',
+        **lon_lat(wgs84_centroid('geometrie'))
+    ).annotate(postcodes=ArrayAgg(
+        'adressen__postcode', distinct=True,
+        filter=Q(adressen__postcode__isnull=False)))
+
+
+def from_openbare_ruimte(row):
+    return bulk_action(Gebied, 'opr_{}'.format(row['id']), dict(
+        type='openbare_ruimte',
+        # weg, water, spoorbaan, terrein, kunstwerk (brug), landschap,..
+        subtype=OPENBARE_RUIMTE_TYPES.get(row['type'], row['type']),
+        subtype_id=row['id'],
+        naam=row['naam'],
+        naam_nen=row['naam_nen'],
+        naam_ptt=row['naam_ptt'],
+        postcode=row['postcodes'],
+        order=analyzers.orderings['openbare_ruimte'],
+        _display=row['naam'],
+        centroid=row_centroid(row),
+        landelijk_id=row['landelijk_id'],
+    ))
+
+
+def gebied_rows(model, *fields):
+    """
+    The id, `fields` and centroid of the gebieden of `model`
+    """
+    return model.objects.values(
+        'id', *fields, **lon_lat(wgs84_centroid('geometrie')))
 
 
-def from_buurtcombinatie(bc: models.Buurtcombinatie):
-    d = Gebied(_id='buurtcombinatie{}'.format(bc.id))
-    d.subtype = 'buurtcombinatie'
-    d.type = 'gebied'
+def _gebied(_id, subtype, row, display, order, **fields):
+    return bulk_action(Gebied, _id, dict(
+        type='gebied',
+        subtype=subtype,
+        subtype_id=row['id'],
+        naam=row['naam'],
+        _display='{} ({})'.format(row['naam'], display),
+        centroid=row_centroid(row),
+        order=order,
+        **fields
+    ))
 
-    d.subtype_id = bc.id
-    d.naam = bc.naam
-    d._display = '{} ({})'.format(bc.naam, 'wijk')
-    d.g_code = bc.code
-    d.order = 5
-    d.centroid = get_centroid(bc.geometrie, 'wgs84')
-    return d
 
+def from_unesco(row):
+    return _gebied(
+        'unseco{}'.format(row['id']), 'unesco', row, 'unesco', 1)
 
-def from_gebiedsgerichtwerken(gg: models.Gebiedsgerichtwerken):
-    d = Gebied(_id='gebiedsgericht{}'.format(gg.id))
-    d.subtype = 'gebiedsgerichtwerken'
-    d.type = 'gebied'
 
-    d.subtype_id = gg.id
-    d.naam = gg.naam
-    d._display = '{} ({})'.format(gg.naam, 'gebiedsgericht werken')
-    d.g_code = gg.code
-    d.centroid = get_centroid(gg.geometrie, 'wgs84')
-    d.order = 4
-    return d
+def from_buurt(row):
+    return _gebied(
+        'buurt{}'.format(row['id']), 'buurt', row, 'buurt', 6,
+        g_code=row['code'])
 
 
-def from_stadsdeel(sd: models.Stadsdeel):
-    d = Gebied(_id='stadsdeel{}'.format(sd.id))
-    d.subtype = 'stadsdeel'
-    d.type = 'gebied'
+def from_buurtcombinatie(row):
+    return _gebied(
+        'buurtcombinatie{}'.format(row['id']), 'buurtcombinatie', row,
+        'wijk', 5, g_code=row['code'])
 
-    d.subtype_id = sd.id
-    d.naam = sd.naam
-    d._display = '{} ({})'.format(sd.naam, d.subtype)
-    d.g_code = sd.code
-    d.order = 3
-    d.centroid = get_centroid(sd.geometrie, 'wgs84')
-    return d
 
+def from_gebiedsgerichtwerken(row):
+    return _gebied(
+        'gebiedsgericht{}'.format(row['id']), 'gebiedsgerichtwerken', row,
+        'gebiedsgericht werken', 4, g_code=row['code'])
 
-def from_grootstedelijk(gs: models.Grootstedelijkgebied):
-    d = Gebied(_id='stadsdeel{}'.format(gs.id))
-    d.subtype = 'grootstedelijk'
-    d.type = 'gebied'
 
-    d.subtype_id = gs.id
-    d.naam = gs.naam
-    d.gsg_type = gs.gsg_type
-    d._display = '{} ({})'.format(gs.naam, 'grootstedelijk gebied')
-    d.centroid = get_centroid(gs.geometrie, 'wgs84')
-    d.order = 2
-    return d
+def from_stadsdeel(row):
+    return _gebied(
+        'stadsdeel{}'.format(row['id']), 'stadsdeel', row, 'stadsdeel', 3,
+        g_code=row['code'])
 
 
-def from_gemeente(g: models.Gemeente):
-    d = Gebied(_id='gemeente{}'.format(g.id))
-    d.subtype = 'gemeente'
-    d.type = 'gebied'
+def from_grootstedelijk(row):
+    return _gebied(
+        'stadsdeel{}'.format(row['id']), 'grootstedelijk', row,
+        'grootstedelijk gebied', 2, gsg_type=row['gsg_type'])
 
-    d.subtype_id = g.naam.lower()
-    d.naam = g.naam
-    d._display = '{} ({})'.format(g.naam, d.subtype)
-    d.g_code = g.code
-    d.order = 1
-    return d
 
+def from_gemeente(row):
+    return bulk_action(Gebied, 'gemeente{}'.format(row['id']), dict(
+        type='gebied',
+        subtype='gemeente',
+        subtype_id=row['naam'].lower(),
+        naam=row['naam'],
+        _display='{} (gemeente)'.format(row['naam']),
+        g_code=row['code'],
+        order=1,
+    ))
 
-def from_woonplaats(w: models.Woonplaats):
-    d = Gebied(_id='woonplaats{}'.format(w.id))
-    d.subtype = 'woonplaats'
-    d.type = 'gebied'
 
-    d.subtype_id = w.id
-    d.naam = w.naam
-    d._display = '{} ({})'.format(w.naam, d.subtype)
-    d.landelijk_id = w.landelijk_id
-    d.g_code = w.landelijk_id
-    d.order = 2
-    return d
+def from_woonplaats(row):
+    return bulk_action(Gebied, 'woonplaats{}'.format(row['id']), dict(
+        type='gebied',
+        subtype='woonplaats',
+        subtype_id=row['id'],
+        naam=row['naam'],
+        _display='{} (woonplaats)'.format(row['naam']),
+        landelijk_id=row['landelijk_id'],
+        g_code=row['landelijk_id'],
+        order=2,
+    ))
 
 
 def from_pand(l):
@@ -0,0 +1,19 @@
+# Generated by Django 2.1.7 on 2026-10-18 11:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bag', '0007_grootstedelijkgebied_gsg_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pand',
+            name='_buurt',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='panden', to='bag.Buurt'),
+        ),
+    ]
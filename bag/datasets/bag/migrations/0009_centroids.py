@@ -0,0 +1,29 @@
+# Generated by Django 2.1.7 on 2026-10-18 11:37
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bag', '0008_pand__buurt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ligplaats',
+            name='_centroid_wgs84',
+            field=django.contrib.gis.db.models.fields.PointField(null=True, srid=4326),
+        ),
+        migrations.AddField(
+            model_name='standplaats',
+            name='_centroid_wgs84',
+            field=django.contrib.gis.db.models.fields.PointField(null=True, srid=4326),
+        ),
+        migrations.AddField(
+            model_name='verblijfsobject',
+            name='_centroid_wgs84',
+            field=django.contrib.gis.db.models.fields.PointField(null=True, srid=4326),
+        ),
+    ]
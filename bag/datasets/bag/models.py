@@ -440,6 +440,64 @@ class Grootstedelijkgebied(models.Model):
         return "{}".format(self.naam)
 
 
+def display_toevoeging(huisnummer, huisletter, huisnummer_toevoeging):
+    """
+    Huisnummer, huisletter and toevoeging as displayed in an adres: 12A-2
+    """
+    toevoegingen = []
+
+    if huisnummer:
+        toevoegingen.append(str(huisnummer))
+
+    if huisletter:
+        toevoegingen.append(str(huisletter))
+
+    if huisnummer_toevoeging:
+        toevoegingen.append('-%s' % huisnummer_toevoeging)
+    return "".join(toevoegingen)
+
+
+def split_toevoeging(huisnummer, huisletter, huisnummer_toevoeging):
+    """
+    Huisnummer, huisletter and toevoeging split in the parts
+    that are searched for: 12 A 2
+    """
+    toevoegingen = []
+
+    if huisnummer:
+        toevoegingen.append(str(huisnummer))
+
+    if huisletter:
+        toevoegingen.append(str(huisletter))
+
+    def addnumber(lastdigits, split_tv):
+        digits = "".join(lastdigits)
+        if digits:
+            split_tv.append(digits)
+
+    if huisnummer_toevoeging:
+        tv = str(huisnummer_toevoeging)
+        split_tv = []
+        lastdigits = []
+
+        for c in tv:
+            if c.isdigit():
+                lastdigits.append(c)
+                continue
+            else:
+                addnumber(lastdigits, split_tv)
+                lastdigits = []
+                split_tv.append(c)
+
+        # add left-over digits if any.
+        addnumber(lastdigits, split_tv)
+
+        # create the toevoeging
+        toevoegingen.extend(split_tv)
+
+    return ' '.join(toevoegingen)
+
+
 class Nummeraanduiding(mixins.GeldigheidMixin, mixins.MutatieGebruikerMixin,
                        mixins.DocumentStatusMixin, models.Model):
     """
@@ -553,20 +611,8 @@ class Nummeraanduiding(mixins.GeldigheidMixin, mixins.MutatieGebruikerMixin,
         return dct
 
     def _display_toevoeging(self):
-
-        toevoegingen = []
-
-        toevoeging = self.huisnummer_toevoeging
-
-        if self.huisnummer:
-            toevoegingen.append(str(self.huisnummer))
-
-        if self.huisletter:
-            toevoegingen.append(str(self.huisletter))
-
-        if toevoeging:
-            toevoegingen.append('-%s' % toevoeging)
-        return "".join(toevoegingen)
+        return display_toevoeging(
+            self.huisnummer, self.huisletter, self.huisnummer_toevoeging)
 
     @property
     def toevoeging(self):
@@ -575,44 +621,8 @@ class Nummeraanduiding(mixins.GeldigheidMixin, mixins.MutatieGebruikerMixin,
         Toevoeing represents the total added string to
         a street/openbareruimte name.
         """
-
-        toevoegingen = []
-
-        toevoeging = self.huisnummer_toevoeging
-
-        if self.huisnummer:
-            toevoegingen.append(str(self.huisnummer))
-
-        if self.huisletter:
-            toevoegingen.append(str(self.huisletter))
-
-        def addnumber(lastdigits, split_tv):
-            digits = "".join(lastdigits)
-            if digits:
-                split_tv.append(digits)
-
-        if toevoeging:
-            tv = str(toevoeging)
-            split_tv = []
-            lastdigits = []
-            prev = ""
-
-            for c in tv:
-                if c.isdigit():
-                    lastdigits.append(c)
-                    continue
-                else:
-                    addnumber(lastdigits, split_tv)
-                    lastdigits = []
-                    split_tv.append(c)
-
-            # add left-over digits if any.
-            addnumber(lastdigits, split_tv)
-
-            # create the toevoeging
-            toevoegingen.extend(split_tv)
-
-        return ' '.join(toevoegingen)
+        return split_toevoeging(
+            self.huisnummer, self.huisletter, self.huisnummer_toevoeging)
 
     @property
     def adresseerbaar_object(self):
@@ -731,6 +741,7 @@ class Ligplaats(mixins.GeldigheidMixin, mixins.MutatieGebruikerMixin,
     _huisnummer = models.IntegerField(null=True)
     _huisletter = models.CharField(max_length=1, null=True)
     _huisnummer_toevoeging = models.CharField(max_length=4, null=True)
+    _centroid_wgs84 = geo.PointField(null=True, srid=4326)
 
     objects = geo.Manager()
 
@@ -815,6 +826,7 @@ class Standplaats(mixins.GeldigheidMixin, mixins.MutatieGebruikerMixin,
     _huisnummer = models.IntegerField(null=True)
     _huisletter = models.CharField(max_length=1, null=True)
     _huisnummer_toevoeging = models.CharField(max_length=4, null=True)
+    _centroid_wgs84 = geo.PointField(null=True, srid=4326)
 
     objects = geo.Manager()
 
@@ -934,6 +946,7 @@ class Verblijfsobject(mixins.GeldigheidMixin, mixins.MutatieGebruikerMixin,
     _huisnummer = models.IntegerField(null=True, db_index=True)
     _huisletter = models.CharField(max_length=1, null=True)
     _huisnummer_toevoeging = models.CharField(max_length=4, null=True)
+    _centroid_wgs84 = geo.PointField(null=True, srid=4326)
 
     objects = geo.Manager()
 
@@ -1030,9 +1043,12 @@ class Pand(
 
     pandnaam = models.CharField(max_length=250, null=True)
 
-    objects = geo.Manager()
+    # buurt of the bouwblok, or else the buurt at the geometrie.
+    # set by the import
+    _buurt = models.ForeignKey(
+        Buurt, null=True, related_name='panden', on_delete=models.SET_NULL)
 
-    cached_buurt = None
+    objects = geo.Manager()
 
     class Meta:
         verbose_name = "Pand"
@@ -1041,24 +1057,6 @@ class Pand(
     def __str__(self):
         return "{}".format(self.landelijk_id)
 
-    @property
-    def _buurt(self):
-        if self.bouwblok:
-            buurt = self.bouwblok.buurt
-            if buurt:
-                return buurt
-
-        # saves about 10 queries.
-        if self.cached_buurt:
-            return self.cached_buurt
-
-        buurt = Buurt.objects.filter(
-            geometrie__dwithin=(self.geometrie, 0)).first()
-
-        self.cached_buurt = buurt
-
-        return buurt
-
     @property
     def _buurtcombinatie(self):
         return self._buurt.buurtcombinatie if self._buurt else None
@@ -233,6 +233,31 @@ class Numfilter(APITransactionTestCase):
         self.assertEquals(data,
             ['Locatie must be x: float, y: float, r: int'])
 
+    def test_location_filter_nearest(self):
+        url = '/bag/nummeraanduiding/?locatie=121849,487303&nearest=1'
+        response = self.client.get(url)
+
+        self.assertEquals(200, response.status_code)
+        data = response.json()
+        self.assertEquals(len(data['results']), 1)
+        self.assertEquals(
+            self.num.landelijk_id,
+            data['results'][0]['landelijk_id'])
+
+    def test_pand_location_filter_nearest_radius(self):
+        url = '/bag/pand/?locatie=100000,400000,10&nearest=5'
+        response = self.client.get(url)
+
+        self.assertEquals(200, response.status_code)
+        data = response.json()
+        self.assertEquals(data['results'], [])
+
+    def test_opr_location_filter_nearest_error(self):
+        url = '/bag/openbareruimte/?locatie=121850,487304&nearest=0'
+        response = self.client.get(url)
+
+        self.assertEquals(400, response.status_code)
+
     def test_detailed_view(self):
         url = '/bag/nummeraanduiding/?detailed=1'
         response = self.client.get(url)
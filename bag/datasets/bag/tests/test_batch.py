@@ -2,10 +2,13 @@ import datetime
 import logging
 
 from django.contrib.gis.geos import Point
+from django.test import TransactionTestCase
 
 from datasets.bag.tests import factories
 from .. import models, batch
 
+from batch.batch import execute
+from batch.models import ImportChange, RowHash
 from batch.test import TaskTestCase
 
 BAG = 'diva/bag'
@@ -184,6 +187,46 @@ class ImportGmeTest(TaskTestCase):
         self.assertIsNone(g.einde_geldigheid)
 
 
+class ResumeImportTest(TransactionTestCase):
+
+    class ResumeJob(object):
+        name = "resume-import"
+
+        def __init__(self, *tasks):
+            self._tasks = tasks
+
+        def tasks(self):
+            return self._tasks
+
+    class FailingTask(object):
+        name = "failing"
+
+        def __init__(self):
+            self.fail = True
+
+        def execute(self):
+            if self.fail:
+                raise Exception()
+
+    def test_resume_reruns_import(self):
+        gme = batch.ImportGmeTask(GEBIEDEN)
+        gme.resumable = False
+        failing = self.FailingTask()
+        job = self.ResumeJob(gme, failing)
+
+        with self.assertRaises(Exception):
+            execute(job, checkpoint=True)
+        models.Gemeente.objects.update(naam='Weesp')
+
+        # the gemeente import runs again on the rows of the first run
+        failing.fail = False
+        execute(job, resume=True)
+
+        g = models.Gemeente.objects.get()
+        self.assertEqual(g.id, '03630000000000')
+        self.assertEqual(g.naam, 'Amsterdam')
+
+
 class ImportSdlTest(TaskTestCase):
     def setUp(self):
         factories.GemeenteFactory.create(pk='03630000000000')
@@ -555,6 +598,70 @@ class ImportVboTest(TaskTestCase):
         self.assertEqual(v.mutatie_gebruiker, 'DBI')
 
 
+class ImportVboCopyTest(ImportVboTest):
+
+    def task(self):
+        task = batch.ImportVboTask(BAG)
+        task.use_copy = True
+        return task
+
+
+class ImportVboDeltaTest(ImportVboTest):
+
+    def task(self):
+        task = batch.ImportVboTask(BAG)
+        task.delta = True
+        return task
+
+    def test_unchanged_rows_are_skipped(self):
+        self.run_task()
+        # the first delta load is the baseline
+        self.assertEqual(ImportChange.objects.count(), 0)
+        self.assertEqual(
+            RowHash.objects.count(), models.Verblijfsobject.objects.count())
+
+        models.Verblijfsobject.objects.filter(pk='03630000648915').delete()
+        RowHash.objects.filter(key='03630000648915').delete()
+
+        self.run_task()
+        self.assertEqual(ImportChange.objects.count(), 1)
+        self.assertTrue(
+            models.Verblijfsobject.objects.filter(pk='03630000648915').exists())
+
+    def test_changed_rows_are_updated(self):
+        self.run_task()
+
+        models.Verblijfsobject.objects.filter(pk='03630000648915').update(oppervlakte=1)
+        RowHash.objects.filter(key='03630000648915').update(hash='changed')
+
+        self.run_task()
+
+        self.assertEqual(
+            models.Verblijfsobject.objects.get(pk='03630000648915').oppervlakte, 95)
+        self.assertEqual(
+            list(ImportChange.objects.values_list('key', 'action')),
+            [('03630000648915', ImportChange.UPDATED)])
+
+    def test_full_import_resets_hashes(self):
+        self.run_task()
+
+        models.Verblijfsobject.objects.all().delete()
+        batch.ImportVboTask(BAG).execute()
+
+        self.assertFalse(RowHash.objects.exists())
+
+    def test_baseline_after_full_import(self):
+        full = batch.ImportVboTask(BAG)
+        full.execute()
+        gone = factories.VerblijfsobjectFactory.create()
+
+        self.run_task()
+
+        self.assertEqual(ImportChange.objects.count(), 0)
+        self.assertFalse(
+            models.Verblijfsobject.objects.filter(pk=gone.pk).exists())
+
+
 class ImportNumTest(TaskTestCase):
 
     def setUp(self):
@@ -689,6 +796,7 @@ class ImportPandTest(TaskTestCase):
 
         p = models.Pand.objects.get(pk='03630012977654')
         self.assertEqual(p.bouwblok.id, '03630012102404')
+        self.assertEqual(p._buurt_id, p.bouwblok.buurt_id)
 
     def test_import_geo(self):
         self.run_task()
@@ -0,0 +1,53 @@
+from django.test import TestCase
+
+from datasets.bag import documents, models
+from datasets.bag.tests import factories
+
+
+class NummeraanduidingRowTest(TestCase):
+
+    def test_from_nummeraanduiding_ruimte(self):
+        n = factories.NummeraanduidingFactory.create(
+            huisnummer=12, huisletter='A', huisnummer_toevoeging='2h')
+
+        row = documents.nummeraanduiding_rows().get(id=n.id)
+        action = documents.from_nummeraanduiding_ruimte(row)
+        doc = action['_source']
+
+        self.assertEqual(action['_id'], n.id)
+        self.assertEqual(doc['toevoeging'], n.toevoeging)
+        self.assertEqual(doc['toevoeging'], '12 A 2 h')
+        self.assertEqual(doc['adres'], n.adres())
+        self.assertEqual(doc['straatnaam'], n.openbare_ruimte.naam)
+        self.assertEqual(doc['woonplaats'], n.woonplaats.naam)
+        self.assertEqual(doc['subtype'], 'verblijfsobject')
+        self.assertEqual(doc['subtype_id'], n.verblijfsobject.id)
+        self.assertEqual(doc['adresseerbaar_object_id'], n.verblijfsobject.landelijk_id)
+        self.assertEqual(doc['vbo_status'][0]['code'], n.verblijfsobject.status.code)
+        self.assertEqual(len(doc['centroid']), 2)
+        # empty values are left out
+        self.assertNotIn('bron', doc)
+
+    def test_without_adresseerbaar_object(self):
+        n = factories.NummeraanduidingFactory.create(
+            verblijfsobject=None, type=models.Nummeraanduiding.OBJECT_TYPE_OVERIG_TERREIN)
+
+        doc = documents.from_nummeraanduiding_ruimte(
+            documents.nummeraanduiding_rows().get(id=n.id))['_source']
+
+        self.assertEqual(doc['subtype'], 'overig terrein')
+        self.assertNotIn('centroid', doc)
+        self.assertNotIn('vbo_status', doc)
+
+
+class GebiedRowTest(TestCase):
+
+    def test_from_buurt(self):
+        b = factories.BuurtFactory.create()
+
+        row = documents.gebied_rows(models.Buurt, 'naam', 'code').get(id=b.id)
+        action = documents.from_buurt(row)
+
+        self.assertEqual(action['_id'], 'buurt{}'.format(b.id))
+        self.assertEqual(action['_source']['g_code'], b.code)
+        self.assertEqual(action['_source']['_display'], '{} (buurt)'.format(b.naam))
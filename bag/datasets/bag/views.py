@@ -1,9 +1,10 @@
 import logging
 
+from django.contrib.gis.db.models import GeometryField
 from django.contrib.gis.db.models.functions import Distance
 from django.contrib.gis.geos import Point
 from django.contrib.gis.measure import D
-from django.db.models import Prefetch
+from django.db.models import F, FloatField, Func, Prefetch, Value
 from django.shortcuts import get_object_or_404
 from django.views.generic import RedirectView
 from django_filters.rest_framework import FilterSet
@@ -18,13 +19,22 @@ from . import serializers, models
 
 LOG = logging.getLogger(__name__)
 
+# most objects a nearest neighbour search returns
+NEAREST_MAX = 1000
 
-def parse_xyr(value: str) -> (Point, int):
+
+def parse_xyr(value: str, radius_required=True) -> (Point, int):
     """
     Parse x, y, radius input.
+
+    Without `radius_required` the radius may be left out, it is None then.
     """
+    values = value.split(',')
+    if len(values) == 2 and not radius_required:
+        values.append(None)
+
     try:
-        x, y, radius = value.split(',')
+        x, y, radius = values
     except ValueError:
         raise validation.ValidationError(
             "Locatie must be rdx,rdy,radius or lat,long,radius"
@@ -34,7 +44,7 @@ def parse_xyr(value: str) -> (Point, int):
         # Converting , to . and then to float
         x = float(x)
         y = float(y)
-        radius = int(radius)
+        radius = int(radius) if radius is not None else None
     except ValueError:
         raise validation.ValidationError(
             "Locatie must be x: float, y: float, r: int"
@@ -49,6 +59,85 @@ def parse_xyr(value: str) -> (Point, int):
     return point, radius
 
 
+class KNNDistance(Func):
+    """
+    The PostGIS `<->` distance operator. Ordering by it walks the GIST
+    index of the geometry in distance order.
+    """
+    arg_joiner = ' <-> '
+    template = '%(expressions)s'
+    output_field = FloatField()
+
+
+class LocatieFilterSet(FilterSet):
+    """
+    FilterSet with a `locatie` filter on geometry field `locatie_field`.
+
+    locatie=x,y,r returns the objects within r meters of x,y, nearest
+    first.
+
+    With nearest=k only the k nearest objects are returned. They are
+    ordered with the `<->` operator, so the GIST index is scanned in
+    distance order and the scan stops after k objects. The radius is
+    optional then.
+    """
+    locatie_field = 'geometrie'
+
+    locatie = filters.CharFilter(method="locatie_filter", label='x,y,r')
+    nearest = filters.NumberFilter(
+        method="nearest_filter", label='nearest',
+        help_text='Only the nearest objects to locatie, at most {}'.format(NEAREST_MAX))
+
+    def nearest_count(self):
+        nearest = self.form.cleaned_data.get('nearest')
+
+        if nearest is None or not self.form.cleaned_data.get('locatie'):
+            return None
+
+        if nearest != int(nearest) or not 0 < nearest <= NEAREST_MAX:
+            raise validation.ValidationError(
+                "Nearest must be a number from 1 to {}".format(NEAREST_MAX))
+
+        return int(nearest)
+
+    def locatie_filter(self, queryset, _filter_name, value):
+        """
+        Filter based on the geolocation. This filter actually
+        expect 3 numerical values: x, y and radius
+        The value given is broken up by ',' and converterd
+        to the value tuple
+        """
+        nearest = self.nearest_count()
+        point, radius = parse_xyr(value, radius_required=nearest is None)
+
+        if radius is not None:
+            queryset = queryset.filter(**{
+                '{}__dwithin'.format(self.locatie_field): (point, D(m=radius))})
+
+        queryset = queryset.annotate(
+            afstand=Distance(self.locatie_field, point))
+
+        if nearest is None:
+            return queryset.order_by('afstand')
+
+        return queryset.order_by(KNNDistance(
+            F(self.locatie_field),
+            Value(point, output_field=GeometryField(srid=point.srid))))
+
+    def nearest_filter(self, queryset, _filter_name, value):
+        # applied by filter_queryset, after all other filters
+        return queryset
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        nearest = self.nearest_count()
+
+        if nearest is not None:
+            queryset = queryset[:nearest]
+
+        return queryset
+
+
 class ExpansionMetadata(SimpleMetadata):
     def determine_metadata(self, request, view):
         result = super().determine_metadata(request, view)
@@ -221,11 +310,13 @@ class VerblijfsobjectViewSet(rest.DatapuntViewSet):
         return obj
 
 
-class NummeraanduidingFilter(FilterSet):
+class NummeraanduidingFilter(LocatieFilterSet):
     """
     Filter nummeraanduidingkjes
     """
 
+    locatie_field = '_geom'
+
     verblijfsobject = filters.CharFilter(method="vbo_filter", label='vbo')
     ligplaats = filters.CharFilter(method="ligplaats_filter")
     standplaats = filters.CharFilter(method="standplaats_filter")
@@ -280,22 +371,6 @@ class NummeraanduidingFilter(FilterSet):
             return queryset.filter(openbare_ruimte_id=value)
         return queryset.filter(openbare_ruimte__naam__icontains=value)
 
-    def locatie_filter(self, queryset, _filter_name, value):
-        """
-        Filter based on the geolocation. This filter actually
-        expect 3 numerical values: x, y and radius
-        The value given is broken up by ',' and converterd
-        to the value tuple
-        """
-        point, radius = parse_xyr(value)
-
-        # Creating one big queryset
-        qs = queryset.filter(
-            _geom__dwithin=(point, D(m=radius))
-        ).annotate(afstand=Distance('_geom', point))
-
-        return qs.order_by('afstand')
-
     def pand_filter(self, queryset, _filter_name, value):
         """
         Filter using a pand landelijk id
@@ -410,7 +485,7 @@ class NummeraanduidingViewSet(rest.DatapuntViewSet):
         return obj
 
 
-class PandenFilter(FilterSet):
+class PandenFilter(LocatieFilterSet):
     """
     Filter panden met landelijke ids
     """
@@ -444,21 +519,6 @@ class PandenFilter(FilterSet):
 
         return queryset.filter(verblijfsobjecten__id=value)
 
-    def locatie_filter(self, queryset, _filter_name, value):
-        """
-        Filter based on the geolocation. This filter actually
-        expect 3 numerical values: x, y and radius
-        The value given is broken up by ',' and converterd
-        to the value tuple
-        """
-        point, radius = parse_xyr(value)
-
-        opr = queryset.filter(
-            geometrie__dwithin=(point, D(m=radius))
-        ).annotate(afstand=Distance('geometrie', point))
-
-        return opr.order_by('afstand')
-
     def dummy_filter(self, queryset, _filter_name, value):
         """Dummy filter to add detailed parameter to Swagger"""
         return queryset
@@ -501,9 +561,10 @@ class PandViewSet(rest.DatapuntViewSet):
         'status',
         'bouwblok',
         'bouwblok__buurt',
-        'bouwblok__buurt__stadsdeel',
-        'bouwblok__buurt__buurtcombinatie',
-        'bouwblok__buurt__stadsdeel__gemeente',
+        '_buurt',
+        '_buurt__stadsdeel',
+        '_buurt__buurtcombinatie',
+        '_buurt__stadsdeel__gemeente',
     ).prefetch_related(
         'verblijfsobjecten'
     )
@@ -532,7 +593,7 @@ class PandViewSet(rest.DatapuntViewSet):
         return super().list(request, *args, **kwargs)
 
 
-class OpenbareRuimteFilter(FilterSet):
+class OpenbareRuimteFilter(LocatieFilterSet):
     """
     Filter openbare ruimte
     """
@@ -554,21 +615,6 @@ class OpenbareRuimteFilter(FilterSet):
             'adressen__huisnummer_toevoeging',
         )
 
-    def locatie_filter(self, queryset, _filter_name, value):
-        """
-        Filter based on the geolocation. This filter actually
-        expect 3 numerical values: x, y and radius
-        The value given is broken up by ',' and converterd
-        to the value tuple
-        """
-        point, radius = parse_xyr(value)
-
-        opr = queryset.filter(
-            geometrie__dwithin=(point, D(m=radius))
-        ).annotate(afstand=Distance('geometrie', point))
-
-        return opr.order_by('afstand')
-
 
 class OpenbareRuimteViewSet(rest.DatapuntViewSet):
     """
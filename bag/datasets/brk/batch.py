@@ -7,6 +7,7 @@ import os
 from collections import Counter
 
 from django import db
+from django.db import connection, transaction
 from django.conf import settings
 from django.contrib.gis.geos import GEOSGeometry, Polygon, MultiPolygon, Point
 # Project
@@ -37,6 +38,7 @@ def _get_related(code, omschrijving, cache, model):
 
 class ImportGemeenteTask(batch.BasicTask):
     name = "Import Gemeente"
+    clears = (models.Gemeente,)
 
     def __init__(self, path):
         self.path = path
@@ -48,150 +50,115 @@ class ImportGemeenteTask(batch.BasicTask):
         assert models.Gemeente.objects.count() > 0
 
     def process(self):
-        geo.process_shp(self.path, 'BRK_GEMEENTE.shp', self.process_feature)
+        with geo.staged_shp(self.path, 'BRK_GEMEENTE.shp') as shp:
+            geo.insert_from_shp(models.Gemeente, '{} s'.format(shp), dict(
+                gemeente='s.gemeente',
+                geometrie=geo.multipoly_sql('s.geom'),
+            ))
 
-    def process_feature(self, feat):
-        models.Gemeente(
-            gemeente=feat.get('GEMEENTE'),
-            geometrie=geo.get_multipoly(feat.geom.wkt)
-        ).save()
 
-
-class ImportKadastraleGemeenteTaskLines(batch.BasicTask):
-    name = "Import Kadastrale Gemeente Lines"
-
-    def __init__(self, path, stash):
-        self.path = path
-        self.stash = stash
-        self.stash['KADGEM'] = {}
-
-    def before(self):
-        pass
-
-    def after(self):
-        pass
-
-    def process(self):
-        geo.process_shp(self.path, 'BRK_KAD_GEMEENTE_L.shp', self.process_feature)
-
-    def process_feature(self, feat):
-        pk = feat.get('KADGEMCODE')
-        self.stash['KADGEM'][pk] = geo.get_multiline(feat.geom.wkt)
+def _log_skipped(sql, message):
+    with connection.cursor() as c:
+        c.execute(sql)
+        for row in c.fetchall():
+            log.warning(message, *row)
 
 
 class ImportKadastraleGemeenteTask(batch.BasicTask):
     name = "Import Kadastrale Gemeente"
+    clears = (models.KadastraleGemeente,)
 
-    def __init__(self, path, stash):
-        self.path = path
-        self.stash = stash
-        self.gemeentes = set()
-
-    def before(self):
-        self.gemeentes = set(
-            models.Gemeente.objects.values_list('gemeente', flat=True))
-
-        assert self.gemeentes
-        assert self.stash['KADGEM']
-
-    def after(self):
-        self.gemeentes.clear()
-        self.stash['KADGEM'].clear()
-
-    def process(self):
-        geo.process_shp(self.path, 'BRK_KAD_GEMEENTE.shp', self.process_feature)
-
-    def process_feature(self, feat):
-        pk = feat.get('KADGEMCODE')
-        gemeente_id = feat.get('GEMEENTE')
-
-        if gemeente_id not in self.gemeentes:
-            log.warning("Kadastrale Gemeente {} references non-existing Gemeente {}; skipping".format(pk, gemeente_id))
-            return
-
-        geometrie_lines = self.stash['KADGEM'].get(pk, None)
-        if not geometrie_lines:
-            log.warning(f"Missing geometrie_lines for kadastrale gemeente {pk}")
-
-        models.KadastraleGemeente(
-            id=pk,
-            naam=feat.get('KADGEM'),
-            gemeente_id=gemeente_id,
-            geometrie=geo.get_multipoly(feat.geom.wkt),
-            geometrie_lines=geometrie_lines
-        ).save()
-
-
-class ImportKadastraleSectieTaskLines(batch.BasicTask):
-    name = "Import Kadastrale Sectie Lines"
-
-    def __init__(self, path, stash):
+    def __init__(self, path):
         self.path = path
-        self.stash = stash
-        self.stash['KADSECT'] = {}
 
     def before(self):
-        pass
+        assert models.Gemeente.objects.exists()
 
     def after(self):
         pass
 
     def process(self):
-        geo.process_shp(self.path, 'BRK_KAD_SECTIE_L.shp', self.process_feature)
-
-    def process_feature(self, feat):
-        kad_gem_id = feat.get('KADGEMCODE')
-        sectie = feat.get('SECTIE')
-        pk = "{}{}".format(kad_gem_id, sectie)
-        self.stash['KADSECT'][pk] = geo.get_multiline(feat.geom.wkt)
+        with geo.staged_shp(self.path, 'BRK_KAD_GEMEENTE.shp') as shp, \
+                geo.staged_shp(self.path, 'BRK_KAD_GEMEENTE_L.shp') as lines:
+
+            _log_skipped("""
+SELECT s.kadgemcode, s.gemeente FROM {} s
+WHERE NOT EXISTS (SELECT 1 FROM brk_gemeente g WHERE g.gemeente = s.gemeente)
+            """.format(shp), "Kadastrale Gemeente %s references non-existing Gemeente %s; skipping")
+
+            _log_skipped("""
+SELECT s.kadgemcode FROM {} s
+WHERE NOT EXISTS (SELECT 1 FROM {} l WHERE l.kadgemcode = s.kadgemcode)
+            """.format(shp, lines), "Missing geometrie_lines for kadastrale gemeente %s")
+
+            geo.insert_from_shp(models.KadastraleGemeente, """
+{shp} s
+JOIN brk_gemeente g ON g.gemeente = s.gemeente
+LEFT JOIN (
+  SELECT DISTINCT ON (kadgemcode) kadgemcode, geom FROM {lines}
+  ORDER BY kadgemcode, fid DESC
+) l ON l.kadgemcode = s.kadgemcode
+            """.format(shp=shp, lines=lines), dict(
+                id='s.kadgemcode',
+                naam='s.kadgem',
+                gemeente='g.gemeente',
+                geometrie=geo.multipoly_sql('s.geom'),
+                geometrie_lines=geo.multiline_sql('l.geom'),
+            ))
 
 
 class ImportKadastraleSectieTask(batch.BasicTask):
     name = "Import Kadastrale Sectie"
+    clears = (models.KadastraleSectie,)
 
-    def __init__(self, path, stash):
+    def __init__(self, path):
         self.path = path
-        self.stash = stash
-        self.gemeentes = set()
 
     def before(self):
-        self.gemeentes = set(
-            models.KadastraleGemeente.objects.values_list('pk', flat=True))
-        assert self.stash['KADSECT']
+        pass
 
     def after(self):
-        self.gemeentes.clear()
-        self.stash['KADSECT'].clear()
+        pass
 
     def process(self):
-        geo.process_shp(self.path, 'BRK_KAD_SECTIE.shp', self.process_feature)
-
-    def process_feature(self, feat):
-        kad_gem_id = feat.get('KADGEMCODE')
-        sectie = feat.get('SECTIE')
-        pk = "{}{}".format(kad_gem_id, sectie)
-
-        if kad_gem_id not in self.gemeentes:
-            log.warning(
-                "Kadastrale sectie %s references non-existing "
-                "Kadastrale Gemeente %s; skipping", pk, kad_gem_id)
-            return
-
-        geometrie_lines = self.stash['KADSECT'].get(pk, None)
-        if not geometrie_lines:
-            log.warning(f"Missing geometrie_lines for kadastrale sectie {pk}")
-
-        models.KadastraleSectie(
-            pk=pk,
-            sectie=sectie,
-            kadastrale_gemeente_id=kad_gem_id,
-            geometrie=geo.get_multipoly(feat.geom.wkt),
-            geometrie_lines=geometrie_lines
-        ).save()
-
-
-class ImportKadastraalSubjectTask(batch.BasicTask):
+        with geo.staged_shp(self.path, 'BRK_KAD_SECTIE.shp') as shp, \
+                geo.staged_shp(self.path, 'BRK_KAD_SECTIE_L.shp') as lines:
+
+            _log_skipped("""
+SELECT s.kadgemcode || s.sectie, s.kadgemcode FROM {} s
+WHERE NOT EXISTS (SELECT 1 FROM brk_kadastralegemeente g WHERE g.id = s.kadgemcode)
+            """.format(shp), "Kadastrale sectie %s references non-existing Kadastrale Gemeente %s; skipping")
+
+            _log_skipped("""
+SELECT s.kadgemcode || s.sectie FROM {} s
+WHERE NOT EXISTS (
+  SELECT 1 FROM {} l WHERE l.kadgemcode = s.kadgemcode AND l.sectie = s.sectie)
+            """.format(shp, lines), "Missing geometrie_lines for kadastrale sectie %s")
+
+            geo.insert_from_shp(models.KadastraleSectie, """
+{shp} s
+JOIN brk_kadastralegemeente g ON g.id = s.kadgemcode
+LEFT JOIN (
+  SELECT DISTINCT ON (kadgemcode, sectie) kadgemcode, sectie, geom FROM {lines}
+  ORDER BY kadgemcode, sectie, fid DESC
+) l ON l.kadgemcode = s.kadgemcode AND l.sectie = s.sectie
+            """.format(shp=shp, lines=lines), dict(
+                id='s.kadgemcode || s.sectie',
+                sectie='s.sectie',
+                kadastrale_gemeente='g.id',
+                geometrie=geo.multipoly_sql('s.geom'),
+                geometrie_lines=geo.multiline_sql('l.geom'),
+            ))
+
+
+class ImportKadastraalSubjectTask(batch.BasicTask, database.CopyLoadMixin):
     name = "Import Kadastraal Subject"
+    depends_on = ()
+    clears = (
+        models.KadastraalSubject, models.Adres, models.Geslacht,
+        models.Beschikkingsbevoegdheid, models.AanduidingNaam, models.Land,
+        models.Rechtsvorm,
+    )
 
     def __init__(self, path):
         self.path = path
@@ -199,7 +166,7 @@ class ImportKadastraalSubjectTask(batch.BasicTask):
         self.beschikkingsbevoegdheid = dict()
         self.aanduiding_naam = dict()
         self.land = dict()
-        # self.adressen = dict()
+        self.adressen = dict()
         self.rechtsvorm = dict()
 
     def before(self):
@@ -210,15 +177,21 @@ class ImportKadastraalSubjectTask(batch.BasicTask):
         self.beschikkingsbevoegdheid.clear()
         self.aanduiding_naam.clear()
         self.land.clear()
-        # self.adressen.clear()
+        self.adressen.clear()
         self.rechtsvorm.clear()
 
     def process(self):
         subjects = uva2.process_csv(
             self.path, 'BRK_kadastraal_subject', self.process_subject)
 
-        models.KadastraalSubject.objects.bulk_create(
-            subjects, batch_size=database.BATCH_SIZE)
+        # adressen are collected while the subjects are read. The foreign
+        # keys to brk_adres are deferred, so writing the unique adressen
+        # in one go at the end of the transaction is fine.
+        with transaction.atomic():
+            self.bulk_insert(models.KadastraalSubject, subjects)
+            self.bulk_insert(models.Adres, self.adressen.values())
+
+        log.info('%d unique adressen', len(self.adressen))
 
     def process_subject(self, row):
 
@@ -251,7 +224,8 @@ class ImportKadastraalSubjectTask(batch.BasicTask):
     def process_natuurlijk(self, row, woonadres_id, postadres_id):
         bron = models.KadastraalSubject.BRON_REGISTRATIE if row['SJT_NAAM'] else models.KadastraalSubject.BRON_KADASTER
 
-        return models.KadastraalSubject(
+        return self.new_row(
+                models.KadastraalSubject,
                 pk=row['BRK_SJT_ID'],
                 type=models.KadastraalSubject.SUBJECT_TYPE_NATUURLIJK,
                 beschikkingsbevoegdheid=self.get_beschikkingsbevoegdheid(row['SJT_BESCHIKKINGSBEVOEGDH_CODE'],
@@ -286,7 +260,8 @@ class ImportKadastraalSubjectTask(batch.BasicTask):
         bron = (models.KadastraalSubject.BRON_REGISTRATIE if row['SJT_NNP_STATUTAIRE_NAAM']
                 else models.KadastraalSubject.BRON_KADASTER)
 
-        return models.KadastraalSubject(
+        return self.new_row(
+                models.KadastraalSubject,
                 pk=row['BRK_SJT_ID'],
                 type=models.KadastraalSubject.SUBJECT_TYPE_NIET_NATUURLIJK,
 
@@ -338,12 +313,16 @@ class ImportKadastraalSubjectTask(batch.BasicTask):
 
         adres_id = m.hexdigest()
 
+        if adres_id in self.adressen:
+            return adres_id
+
         try:
             huisnummer_int = int(huisnummer) if huisnummer else None
         except ValueError:
             huisnummer_int = None
 
-        models.Adres(
+        self.adressen[adres_id] = self.new_row(
+            models.Adres,
             id=adres_id,
             openbareruimte_naam=openbareruimte_naam,
             huisnummer=huisnummer_int,
@@ -360,13 +339,18 @@ class ImportKadastraalSubjectTask(batch.BasicTask):
             buitenland_naam=buitenland_naam,
             buitenland_land=self.get_land(
                 buitenland_code, buitenland_omschrijving)
-        ).save()
+        )
 
         return adres_id
 
 
-class ImportKadastraalObjectTask(batch.BasicTask):
+class ImportKadastraalObjectTask(batch.BasicTask, database.CopyLoadMixin):
     name = "Import Kadastraal Object"
+    depends_on = ('ImportKadastraleSectieTask', 'ImportKadastraalSubjectTask')
+    clears = (
+        models.KadastraalObject, models.SoortGrootte,
+        models.CultuurCodeOnbebouwd, models.CultuurCodeBebouwd,
+    )
 
     def __init__(self, path):
         self.path = path
@@ -404,8 +388,7 @@ class ImportKadastraalObjectTask(batch.BasicTask):
         objects = uva2.process_csv(
             self.path, 'BRK_kadastraal_object', self.process_object)
 
-        models.KadastraalObject.objects.bulk_create(
-            objects, batch_size=database.BATCH_SIZE)
+        self.bulk_insert(models.KadastraalObject, objects)
 
     def process_object(self, row):
         kot_id = row['BRK_KOT_ID']
@@ -457,7 +440,8 @@ class ImportKadastraalObjectTask(batch.BasicTask):
 
         vrlpg = row['KOT_IND_VOORLOPIGE_KADGRENS'].lower() != 'definitieve grens'
 
-        return models.KadastraalObject(
+        return self.new_row(
+            models.KadastraalObject,
             id=kot_id,
             kadastrale_gemeente_id=kg_id,
             aanduiding=aanduiding,
@@ -506,8 +490,13 @@ class ImportKadastraalObjectTask(batch.BasicTask):
             models.CultuurCodeBebouwd)
 
 
-class ImportZakelijkRechtTask(batch.BasicTask, metadata.UpdateDatasetMixin):
+class ImportZakelijkRechtTask(batch.BasicTask, metadata.UpdateDatasetMixin, database.CopyLoadMixin):
     name = "Import Zakelijk Recht"
+    depends_on = ('ImportKadastraalSubjectTask', 'ImportKadastraalObjectTask')
+    clears = (
+        models.ZakelijkRecht, models.AardZakelijkRecht,
+        models.AppartementsrechtsSplitsType,
+    )
     dataset_id = 'BRK'
 
     def __init__(self, path):
@@ -539,8 +528,7 @@ class ImportZakelijkRechtTask(batch.BasicTask, metadata.UpdateDatasetMixin):
             uva2.process_csv(
                 self.path, 'BRK_zakelijk_recht', self.process_subject))
 
-        models.ZakelijkRecht.objects.bulk_create(
-            zrts.values(), batch_size=database.BATCH_SIZE)
+        self.bulk_insert(models.ZakelijkRecht, zrts.values())
 
     def process_subject(self, row):
         zrt_id = row['BRK_ZRT_ID']
@@ -579,7 +567,8 @@ class ImportZakelijkRechtTask(batch.BasicTask, metadata.UpdateDatasetMixin):
 
         teller = row['TNG_AANDEEL_TELLER']
         noemer = row['TNG_AANDEEL_NOEMER']
-        return pk, models.ZakelijkRecht(
+        return pk, self.new_row(
+            models.ZakelijkRecht,
             pk=pk,
             zrt_id=zrt_id,
             aard_zakelijk_recht=self.get_aardzakelijk_recht(row['ZRT_AARDZAKELIJKRECHT_CODE'],
@@ -605,8 +594,10 @@ class ImportZakelijkRechtTask(batch.BasicTask, metadata.UpdateDatasetMixin):
         return _get_related(code, omschrijving, self.splits_type, models.AppartementsrechtsSplitsType)
 
 
-class ImportAantekeningTask(batch.BasicTask):
+class ImportAantekeningTask(batch.BasicTask, database.CopyLoadMixin):
     name = "Import Aantekeningen"
+    depends_on = ('ImportKadastraalSubjectTask', 'ImportKadastraalObjectTask')
+    clears = (models.Aantekening, models.AardAantekening,)
 
     def __init__(self, path):
         self.path = path
@@ -629,7 +620,7 @@ class ImportAantekeningTask(batch.BasicTask):
 
     def process(self):
         atks = uva2.process_csv(self.path, 'BRK_aantekening', self.process_row)
-        models.Aantekening.objects.bulk_create(atks, batch_size=database.BATCH_SIZE)
+        self.bulk_insert(models.Aantekening, atks)
 
     def process_row(self, row):
         atk_id = row['BRK_ATG_ID']
@@ -652,7 +643,8 @@ class ImportAantekeningTask(batch.BasicTask):
             self.warnings["Aantekening references non-existing subject {}; skipping".format(kst_id)] += 1
             return
 
-        return models.Aantekening(
+        return self.new_row(
+            models.Aantekening,
             aantekening_id=atk_id,
             aard_aantekening=self.get_aard_aantekening(
                 row['ATG_AARDAANTEKENING_CODE'],
@@ -667,8 +659,10 @@ class ImportAantekeningTask(batch.BasicTask):
                             self.aard_aantekening, models.AardAantekening)
 
 
-class ImportKadastraalObjectVerblijfsobjectTask(batch.BasicTask):
+class ImportKadastraalObjectVerblijfsobjectTask(batch.BasicTask, database.CopyLoadMixin):
     name = "Import Kadaster - KOT-VBO"
+    depends_on = ('ImportKadastraalObjectTask',)
+    clears = (models.KadastraalObjectVerblijfsobjectRelatie,)
 
     def __init__(self, path):
         super().__init__()
@@ -695,8 +689,7 @@ class ImportKadastraalObjectVerblijfsobjectTask(batch.BasicTask):
 
     def process(self):
         rels = uva2.process_csv(self.path, "BRK_BRK_BAG", self.process_row)
-        models.KadastraalObjectVerblijfsobjectRelatie.objects.bulk_create(
-            rels, batch_size=database.BATCH_SIZE)
+        self.bulk_insert(models.KadastraalObjectVerblijfsobjectRelatie, rels)
 
     def process_row(self, row):
         kot_id = row['BRK_KOT_ID']
@@ -720,7 +713,8 @@ class ImportKadastraalObjectVerblijfsobjectTask(batch.BasicTask):
                 "verblijfsobject %s; skipping", vbo_id)
             return
 
-        return models.KadastraalObjectVerblijfsobjectRelatie(
+        return self.new_row(
+            models.KadastraalObjectVerblijfsobjectRelatie,
             verblijfsobject_id=vbo_id,
             kadastraal_object_id=kot_id,
         )
@@ -728,6 +722,8 @@ class ImportKadastraalObjectVerblijfsobjectTask(batch.BasicTask):
 
 class ImportKadastraalObjectRelatiesTask(batch.BasicTask):
     name = "Import Kadaster - KOT-KOT"
+    depends_on = ('ImportZakelijkRechtTask',)
+    clears = (models.APerceelGPerceelRelatie,)
 
     def before(self):
         pass
@@ -755,6 +751,8 @@ class ImportKadastraalObjectRelatiesTask(batch.BasicTask):
 
 class ImportZakelijkRechtVerblijfsobjectTask(batch.BasicTask):
     name = "Import Kadaster - ZRT-VBO"
+    depends_on = ('ImportZakelijkRechtTask', 'ImportKadastraalObjectVerblijfsobjectTask')
+    clears = (models.ZakelijkRechtVerblijfsobjectRelatie,)
 
     def before(self):
         pass
@@ -821,15 +819,12 @@ class ImportKadasterJob(object):
 
         self.brk = os.path.join(diva, 'brk')
         self.brk_shp = os.path.join(diva, 'brk_shp')
-        self.stash = {}
 
     def tasks(self):
         return [
             ImportGemeenteTask(self.brk_shp),
-            ImportKadastraleGemeenteTaskLines(self.brk_shp, self.stash),
-            ImportKadastraleGemeenteTask(self.brk_shp, self.stash),
-            ImportKadastraleSectieTaskLines(self.brk_shp, self.stash),
-            ImportKadastraleSectieTask(self.brk_shp, self.stash),
+            ImportKadastraleGemeenteTask(self.brk_shp),
+            ImportKadastraleSectieTask(self.brk_shp),
             ImportKadastraalSubjectTask(self.brk),
             ImportKadastraalObjectTask(self.brk),
             # needs Subject and Object
@@ -847,59 +842,71 @@ class ImportKadasterJob(object):
         ]
 
 
-class DeleteObjectIndexTask(index.DeleteIndexTask):
+class CreateObjectIndexTask(index.CreateIndexTask):
     index = settings.ELASTIC_INDICES['BRK_OBJECT']
     doc_types = [
         documents.KadastraalObject,
     ]
 
 
-class DeleteSubjectIndexTask(index.DeleteIndexTask):
+class CreateSubjectIndexTask(index.CreateIndexTask):
     index = settings.ELASTIC_INDICES['BRK_SUBJECT']
     doc_types = [
         documents.KadastraalSubject
     ]
 
 
-class IndexSubjectTask(index.ImportIndexTask):
+class SwapObjectIndexTask(index.SwapIndexTask):
+    index = settings.ELASTIC_INDICES['BRK_OBJECT']
+
+
+class SwapSubjectIndexTask(index.SwapIndexTask):
+    index = settings.ELASTIC_INDICES['BRK_SUBJECT']
+
+
+class IndexSubjectTask(index.ImportRowIndexTask):
 
     name = "index kadastraal subject"
-    queryset = models.KadastraalSubject.objects.all().order_by('id')
+    index = settings.ELASTIC_INDICES['BRK_SUBJECT']
+    queryset = documents.kadastraal_subject_rows()
     sequential = True
 
-    def convert(self, obj):
-        return documents.from_kadastraal_subject(obj)
+    def convert(self, row):
+        return documents.from_kadastraal_subject(row)
 
 
-class IndexObjectTask(index.ImportIndexTask):
+class IndexObjectTask(index.ImportRowIndexTask):
 
     name = "index kadastraal object"
+    index = settings.ELASTIC_INDICES['BRK_OBJECT']
     sequential = True
 
-    queryset = models.KadastraalObject.objects.all().order_by('id')
+    queryset = documents.kadastraal_object_rows()
 
-    def convert(self, obj):
-        return documents.from_kadastraal_object(obj)
+    def convert(self, row):
+        return documents.from_kadastraal_object(row)
 
 
 class IndexKadasterJob(object):
     """
-    Destroy and recreate elastic BKR index
+    Create, fill and swap in new elastic BRK indexes
     """
     name = "Update search-index BRK"
 
     def tasks(self):
         return [
-            DeleteSubjectIndexTask(),
-            DeleteObjectIndexTask(),
+            CreateSubjectIndexTask(),
+            CreateObjectIndexTask(),
             IndexSubjectTask(),
             IndexObjectTask(),
+            SwapSubjectIndexTask(),
+            SwapObjectIndexTask(),
         ]
 
 
 class BuildIndexKadasterJob(object):
     """
-    Destroy and recreate elastic BKR index
+    Fill the newest elastic BRK indexes
     """
     name = "Update search-index BRK"
 
@@ -911,11 +918,24 @@ class BuildIndexKadasterJob(object):
 
 
 class DeleteIndexKadasterJob(object):
+    """
+    Start new BRK indexes, the live indexes stay in use
+    """
+    name = "Create new search-index BRK"
+
+    def tasks(self):
+        return [
+            CreateObjectIndexTask(),
+            CreateSubjectIndexTask(),
+        ]
+
+
+class SwapIndexKadasterJob(object):
 
-    name = "Delete search-index BRK"
+    name = "Swap in search-index BRK"
 
     def tasks(self):
         return [
-            DeleteObjectIndexTask(),
-            DeleteSubjectIndexTask(),
+            SwapObjectIndexTask(),
+            SwapSubjectIndexTask(),
         ]
@@ -1,8 +1,14 @@
 import elasticsearch_dsl as es
+from django.contrib.gis.db.models import GeometryField
+from django.db.models.functions import Coalesce
 
 from search import analyzers
+from search.index import bulk_action, lon_lat, row_centroid, wgs84_centroid
 from django.conf import settings
 
+from datasets.generic import kadaster
+from . import models
+
 
 kad_text_fields = {
     'raw': es.Keyword(),
@@ -84,50 +90,62 @@ class KadastraalSubject(es.DocType):
         name = settings.ELASTIC_INDICES['BRK_SUBJECT']
 
 
-def from_kadastraal_subject(ks):
-    d = KadastraalSubject(_id=ks.pk)
-
-    if ks.is_natuurlijk_persoon():
-        d.natuurlijk_persoon = True
-
-        d.geslachtsnaam = ks.naam
-    else:
-        d.natuurlijk_persoon = False
-
-    d.naam = ks.volledige_naam()
-    d.order = analyzers.orderings['kadastraal_subject']
-    d.subtype = 'kadastraal_subject'
-    d._display = d.naam
+def kadastraal_subject_rows():
+    """
+    The rows `from_kadastraal_subject` builds documents of
+    """
+    return models.KadastraalSubject.objects.values(
+        'id', 'naam', 'voornamen', 'voorvoegsels', 'statutaire_naam')
 
-    return d
 
+def from_kadastraal_subject(row):
+    # see KadastraalSubject.is_natuurlijk_persoon and volledige_naam
+    natuurlijk_persoon = not row['statutaire_naam']
 
-def from_kadastraal_object(ko):
-    d = KadastraalObject(_id=ko.pk)
+    naam = row['statutaire_naam'] or " ".join([
+        part for part in (row['voornamen'], row['voorvoegsels'], row['naam'])
+        if part])
 
-    d.aanduiding = ko.get_aanduiding_spaties()
+    return bulk_action(KadastraalSubject, row['id'], dict(
+        natuurlijk_persoon=natuurlijk_persoon,
+        geslachtsnaam=row['naam'] if natuurlijk_persoon else None,
+        naam=naam,
+        order=analyzers.orderings['kadastraal_subject'],
+        subtype='kadastraal_subject',
+        _display=naam,
+    ))
 
-    d.gemeente = ko.kadastrale_gemeente.naam
-    d.gemeente_code = ko.kadastrale_gemeente.id.lower()
 
-    d.sectie = ko.sectie.sectie
-    d.objectnummer = ko.perceelnummer
-    d.indexletter = ko.indexletter
-    d.indexnummer = ko.indexnummer
+def kadastraal_object_rows():
+    """
+    The rows `from_kadastraal_object` builds documents of
+    """
+    geometrie = Coalesce(
+        'point_geom', 'poly_geom', output_field=GeometryField(srid=28992))
 
-    d.short_aanduiding = d.aanduiding[6:]
-
-    d.order = analyzers.orderings['kadastraal_object']
-
-    d.subtype = 'kadastraal_object'
-    # Finding the centeroid
-    geometrie = ko.point_geom or ko.poly_geom
-    if geometrie:
-        centroid = geometrie.centroid
-        centroid.transform('wgs84')
-
-        d.centroid = centroid.coords
+    return models.KadastraalObject.objects.values(
+        'id', 'kadastrale_gemeente_id', 'kadastrale_gemeente__naam',
+        'sectie__sectie', 'perceelnummer', 'indexletter', 'indexnummer',
+        **lon_lat(wgs84_centroid(geometrie))
+    )
 
-    d._display = d.aanduiding
 
-    return d
+def from_kadastraal_object(row):
+    aanduiding = kadaster.get_aanduiding_spaties(
+        row['kadastrale_gemeente_id'], row['sectie__sectie'],
+        row['perceelnummer'], row['indexletter'], row['indexnummer'])
+
+    return bulk_action(KadastraalObject, row['id'], dict(
+        aanduiding=aanduiding,
+        gemeente=row['kadastrale_gemeente__naam'],
+        gemeente_code=row['kadastrale_gemeente_id'].lower(),
+        sectie=row['sectie__sectie'],
+        objectnummer=row['perceelnummer'],
+        indexletter=row['indexletter'],
+        indexnummer=row['indexnummer'],
+        short_aanduiding=aanduiding[6:],
+        order=analyzers.orderings['kadastraal_object'],
+        subtype='kadastraal_object',
+        centroid=row_centroid(row),
+        _display=aanduiding,
+    ))
@@ -1,6 +1,11 @@
+import os
+import tempfile
+
 from batch.test import TaskTestCase
 from datasets.brk import batch, models
 
+SUBJECTS = 'BRK_kadastraal_subject_20151116.csv'
+
 
 class ImportKadastraalSubjectTaskTest(TaskTestCase):
 
@@ -70,3 +75,34 @@ class ImportKadastraalSubjectTaskTest(TaskTestCase):
         self.assertEquals(nnp.woonadres.postcode, "1382LX")
         self.assertEqual(nnp.woonadres.woonplaats, "WEESP")
 
+
+
+class ImportSharedAdresTest(TaskTestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = tmp.name
+
+        # a second subject with the woonadres of the first
+        with open(os.path.join('diva/brk', SUBJECTS), 'rb') as f:
+            header, *rows = f.read().splitlines()
+
+        row = next(r for r in rows if r.startswith(b'NL.KAD.Persoon.171335763;'))
+        copy = row.replace(b'NL.KAD.Persoon.171335763', b'NL.KAD.Persoon.171335764', 1)
+
+        with open(os.path.join(self.path, SUBJECTS), 'wb') as f:
+            f.write(b'\n'.join([header, row, copy]) + b'\n')
+
+    def task(self):
+        return batch.ImportKadastraalSubjectTask(self.path)
+
+    def test_adres_is_stored_once(self):
+        self.run_task()
+
+        first, second = models.KadastraalSubject.objects.order_by('pk')
+
+        self.assertEqual(models.Adres.objects.count(), 1)
+        self.assertIsNotNone(first.woonadres_id)
+        self.assertEqual(first.woonadres_id, second.woonadres_id)
+        self.assertEqual(first.woonadres.postcode, '1109AH')
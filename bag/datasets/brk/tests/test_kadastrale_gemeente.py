@@ -8,13 +8,9 @@ class ImportKadastraleGemeenteTaskTest(TaskTestCase):
     def setUp(self):
         super().setUp()
         factories.GemeenteFactory.create(gemeente="Amsterdam")
-        self.stash = {}
 
     def task(self):
-        return [
-            batch.ImportKadastraleGemeenteTaskLines("diva/brk_shp", self.stash),
-            batch.ImportKadastraleGemeenteTask("diva/brk_shp", self.stash)
-        ]
+        return batch.ImportKadastraleGemeenteTask("diva/brk_shp")
 
     def test_import(self):
         self.run_task()
@@ -8,13 +8,9 @@ class ImportKadastraleSectieTaskTest(TaskTestCase):
     def setUp(self):
         super().setUp()
         factories.KadastraleGemeenteFactory.create(pk="ASD15")
-        self.stash = {}
 
     def task(self):
-        return [
-            batch.ImportKadastraleSectieTaskLines("diva/brk_shp", self.stash),
-            batch.ImportKadastraleSectieTask("diva/brk_shp", self.stash)
-        ]
+        return batch.ImportKadastraleSectieTask("diva/brk_shp")
 
     def test_import(self):
         self.run_task()
@@ -1,2 +1,406 @@
+import hashlib
+import logging
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.gis.db.models import GeometryField
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from batch.models import ImportChange, RowHash
+
+log = logging.getLogger(__name__)
 
 BATCH_SIZE = 50000
+
+_copy_fields = {}
+
+
+def chunked(rows, size):
+    """
+    Yields lists of at most `size` rows from the iterable `rows`
+    """
+    rows = iter(rows)
+
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def bulk_create_chunked(model, rows, chunk_size=BATCH_SIZE):
+    """
+    bulk_create `rows` without materialising the whole iterable.
+
+    bulk_create turns a generator into a list first; here at most
+    `chunk_size` model instances are kept in memory at once.
+
+    :return: number of rows created
+    """
+    count = 0
+
+    for chunk in chunked(rows, chunk_size):
+        model.objects.bulk_create(chunk, batch_size=chunk_size)
+        count += len(chunk)
+
+    return count
+
+
+def bulk_create_last_wins(model, rows, chunk_size=BATCH_SIZE):
+    """
+    `bulk_create_chunked` for sources that can repeat a primary key.
+
+    Like a dict of the rows by key, the last row of a key is stored: the
+    first row is inserted with its chunk, later rows with the same key
+    are saved over it afterwards.
+
+    :return: number of rows created
+    """
+    seen = set()
+    duplicates = {}
+
+    def first_rows():
+        for row in rows:
+            if row.pk in seen:
+                duplicates[row.pk] = row
+                continue
+
+            seen.add(row.pk)
+            yield row
+
+    count = bulk_create_chunked(model, first_rows(), chunk_size)
+
+    if duplicates:
+        log.warning('%s: %d keys occur more than once; keeping the last row',
+                    model._meta.db_table, len(duplicates))
+
+        for row in duplicates.values():
+            row.save(force_update=True)
+
+    return count
+
+
+def copy_fields(model):
+    """
+    Returns the fields loaded by COPY for `model`, in column order.
+
+    Auto incrementing primary keys are left to the database.
+    """
+    if model not in _copy_fields:
+        _copy_fields[model] = [
+            f for f in model._meta.concrete_fields
+            if not isinstance(f, models.AutoField)
+        ]
+    return _copy_fields[model]
+
+
+def copy_row(model, values):
+    """
+    Build a COPY row (tuple) for `model` from model constructor arguments,
+    without creating a model instance.
+    """
+    pk_name = model._meta.pk.name
+    if 'pk' in values:
+        values[pk_name] = values.pop('pk')
+
+    row = []
+
+    for f in copy_fields(model):
+        if f.attname in values:
+            value = values[f.attname]
+        elif f.name in values:
+            value = values[f.name]
+            if isinstance(value, models.Model):
+                value = value.pk
+        elif getattr(f, 'auto_now', False) or getattr(f, 'auto_now_add', False):
+            value = timezone.now()
+        else:
+            value = f.get_default()
+
+        if isinstance(f, GeometryField):
+            value = f.get_prep_value(value)
+        else:
+            value = f.get_db_prep_save(value, connection)
+
+        row.append(value)
+
+    return tuple(row)
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+
+    if hasattr(value, 'hexewkb'):
+        # PostGIS accepts hex encoded EWKB as geometry text input
+        return value.hexewkb.decode()
+
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
+
+
+class _CopyStream(object):
+    """
+    File like object feeding COPY text lines to psycopg2 `copy_expert`
+    """
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.buffer = ''
+        self.count = 0
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            try:
+                row = next(self.rows)
+            except StopIteration:
+                break
+            self.buffer += '\t'.join(_copy_value(v) for v in row) + '\n'
+            self.count += 1
+
+        if size < 0:
+            size = len(self.buffer)
+
+        chunk, self.buffer = self.buffer[:size], self.buffer[size:]
+        return chunk
+
+    readline = read
+
+
+def copy_to_table(table, columns, rows):
+    """
+    Stream `rows` (tuples) into `columns` of `table` with COPY FROM STDIN.
+
+    :return: number of rows loaded
+    """
+    qn = connection.ops.quote_name
+
+    stream = _CopyStream(rows)
+
+    with connection.cursor() as c:
+        c.copy_expert('COPY {} ({}) FROM STDIN'.format(
+            qn(table), ', '.join(qn(column) for column in columns)), stream)
+
+    log.debug('COPY %d rows into %s', stream.count, table)
+
+    return stream.count
+
+
+def copy_insert(model, rows):
+    """
+    Stream `rows` (tuples made by `copy_row`) into the table of `model`.
+
+    :return: number of rows loaded
+    """
+    return copy_to_table(
+        model._meta.db_table, [f.column for f in copy_fields(model)], rows)
+
+
+def _delete_rows(model, keys):
+    """
+    Delete rows of `model` by primary key.
+
+    Nullable references to the rows are cleared instead of cascading
+    the delete, the tasks after a delta import fill them in again.
+    """
+    for chunk in chunked(keys, BATCH_SIZE):
+        for rel in model._meta.related_objects:
+            field = rel.field
+            if rel.many_to_many or not field.null:
+                continue
+            rel.related_model.objects.filter(
+                **{'{}__in'.format(field.name): chunk}).update(**{field.name: None})
+
+        model.objects.filter(pk__in=chunk).delete()
+
+
+def delta_load(model, rows, update_fields):
+    """
+    Load `rows` (tuples made by `copy_row`) into the table of `model`,
+    writing only the rows that changed since the previous delta load.
+
+    Rows are compared by a hash per primary key, stored in RowHash. Rows
+    missing from `rows` are deleted. Changed rows update the columns in
+    `update_fields` (attnames, read after `rows` is consumed) and the
+    auto_now columns, new rows are inserted. Every change is recorded in
+    ImportChange.
+
+    The first delta load of a table, after a full import, establishes the
+    baseline: all rows are written and rows missing from `rows` deleted,
+    but no changes are recorded.
+
+    :return: number of changed rows
+    """
+    qn = connection.ops.quote_name
+    table = model._meta.db_table
+    fields = copy_fields(model)
+    pk = model._meta.pk
+
+    if pk not in fields:
+        raise ValueError("Delta import needs a natural key: {}".format(table))
+
+    pk_index = fields.index(pk)
+    auto_now = {
+        f.attname for f in fields
+        if getattr(f, 'auto_now', False) or getattr(f, 'auto_now_add', False)}
+    hashed = [i for i, f in enumerate(fields) if f.attname not in auto_now]
+
+    previous = dict(
+        RowHash.objects.filter(table=table).values_list('key', 'hash'))
+    baseline = not previous
+    hashes = {}
+    changes = []
+
+    def changed_rows():
+        for row in rows:
+            key = str(row[pk_index])
+            text = '\t'.join(_copy_value(row[i]) for i in hashed)
+            hashes[key] = hashlib.md5(text.encode()).hexdigest()
+
+            if previous.get(key) == hashes[key]:
+                continue
+
+            changes.append((key, (
+                ImportChange.UPDATED if key in previous
+                else ImportChange.INSERTED)))
+            yield row
+
+    staging = '{}_delta'.format(table)
+    columns = ', '.join(qn(f.column) for f in fields)
+
+    with transaction.atomic():
+        with connection.cursor() as c:
+            c.execute('CREATE TEMPORARY TABLE {} (LIKE {})'.format(
+                qn(staging), qn(table)))
+
+            copy_to_table(staging, [f.column for f in fields], changed_rows())
+
+            # `update_fields` is filled while `rows` is consumed
+            updates = ', '.join(
+                '{0} = s.{0}'.format(qn(f.column)) for f in fields
+                if f is not pk and (
+                    f.attname in update_fields or f.attname in auto_now))
+
+            if updates:
+                c.execute('UPDATE {} t SET {} FROM {} s WHERE t.{pk} = s.{pk}'.format(
+                    qn(table), updates, qn(staging), pk=qn(pk.column)))
+
+            c.execute(
+                'INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging} s '
+                'WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE t.{pk} = s.{pk})'.format(
+                    table=qn(table), columns=columns, staging=qn(staging),
+                    pk=qn(pk.column)))
+
+            c.execute('DROP TABLE {}'.format(qn(staging)))
+
+        if baseline:
+            # the rows of the full import have no hashes to compare with
+            existing = (
+                str(key) for key in model.objects.values_list('pk', flat=True))
+            deleted = [key for key in existing if key not in hashes]
+        else:
+            deleted = [key for key in previous if key not in hashes]
+
+        _delete_rows(model, deleted)
+
+        if baseline:
+            changes = []
+        else:
+            changes.extend((key, ImportChange.DELETED) for key in deleted)
+
+        RowHash.objects.filter(table=table).delete()
+        copy_to_table(
+            RowHash._meta.db_table, ['table', 'key', 'hash'],
+            ((table, key, h) for key, h in hashes.items()))
+
+        now = timezone.now()
+        copy_to_table(
+            ImportChange._meta.db_table, ['table', 'key', 'action', 'created'],
+            ((table, key, action, now) for key, action in changes))
+
+    if baseline:
+        log.info(
+            'Delta %s: baseline of %d rows, %d deleted, no changes recorded',
+            table, len(hashes), len(deleted))
+    else:
+        log.info(
+            'Delta %s: %d rows, %d changed, %d deleted',
+            table, len(hashes), len(changes) - len(deleted), len(deleted))
+
+    return len(changes)
+
+
+class CopyLoadMixin(object):
+    """
+    Mixin for import tasks that can load rows with COPY instead of
+    bulk_create.
+
+    usage:
+
+    - build rows with self.new_row(Model, **fields) instead of Model(**fields)
+    - insert them with self.bulk_insert(Model, rows)
+
+    When `use_copy` is set new_row returns plain tuples and no model
+    instances are created. Otherwise rows are inserted in chunks of
+    `chunk_size`, which bounds the number of model instances in memory.
+
+    When `delta` is set only the rows that changed since the previous
+    delta import are written, see `delta_load`.
+    """
+    use_copy = settings.IMPORT_USE_COPY
+    chunk_size = BATCH_SIZE
+    delta = False
+
+    _delta_fields = None
+
+    @property
+    def parse_workers(self):
+        """
+        Processes to parse the source file with, see uva2.process_uva2
+        """
+        # new_row records the fields of a delta import in this process
+        return 1 if self.delta else settings.IMPORT_PARSE_WORKERS
+
+    def _update_fields(self, model):
+        if self._delta_fields is None:
+            self._delta_fields = {}
+
+        return self._delta_fields.setdefault(model, set())
+
+    def new_row(self, model, **values):
+        if self.delta:
+            fields = self._update_fields(model)
+
+            if not fields:
+                # the fields set by this task, the others keep their value
+                names = set(values) | {model._meta.pk.name}
+                fields.update(
+                    f.attname for f in copy_fields(model)
+                    if f.attname in names or f.name in names)
+
+        if self.use_copy or self.delta:
+            return copy_row(model, values)
+
+        return model(**values)
+
+    def bulk_insert(self, model, rows):
+        if self.delta:
+            return delta_load(model, rows, self._update_fields(model))
+
+        # the hashes of an earlier delta load no longer match the table,
+        # the next delta load is a baseline again
+        RowHash.objects.filter(table=model._meta.db_table).delete()
+
+        if self.use_copy:
+            return copy_insert(model, rows)
+
+        return bulk_create_chunked(model, rows, self.chunk_size)
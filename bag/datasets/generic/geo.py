@@ -1,14 +1,34 @@
 import csv
+import logging
 import os.path
+from contextlib import contextmanager
 
 import sys
-from django.contrib.gis.gdal import DataSource
+from django.contrib.gis.gdal import DataSource, GDALException
+from django.db import DatabaseError, connection, transaction
 
 from django.contrib.gis.geos import GEOSGeometry, Polygon, MultiPolygon, Point, MultiLineString, LineString
 
+from batch import stats
+from datasets.generic import database
+
+log = logging.getLogger(__name__)
+
 # sommige WKT-velden zijn best wel groot
 csv.field_size_limit(sys.maxsize)
 
+# vertices per piece of a subdivided area polygon
+SUBDIVIDE_VERTICES = 64
+
+# column types of OGR fields, other fields are staged as text
+OGR_COLUMN_TYPES = {
+    'OFTInteger': 'integer',
+    'OFTInteger64': 'bigint',
+    'OFTReal': 'double precision',
+    'OFTDate': 'date',
+    'OFTDateTime': 'timestamp',
+}
+
 
 def process_wkt(path, filename, callback):
     """
@@ -19,12 +39,191 @@ def process_wkt(path, filename, callback):
     :param callback: function taking an id and a geometry; called for every row
     """
     source = os.path.join(path, filename)
+    stats.count_file(source)
+
     with open(source) as f:
         rows = csv.reader(f, delimiter='|')
         for row in rows:
+            stats.count('rows')
             callback(row[0], GEOSGeometry(row[1]))
 
 
+def copy_wkt(path, filename, model, field_name='geometrie'):
+    """
+    Sets the geometries of a WKT file on the existing rows of `model`.
+
+    The file is copied as is into a staging table, PostGIS parses the
+    WKT and joins it on the primary key. The ids in the WKT files lack
+    the leading '0' of the UVA2 keys. Polygons for a multipolygon field
+    are converted, points are left out, like `get_multipoly`.
+
+    :param path: directory containing the file
+    :param filename: name of the file
+    :param model: model with the rows to update
+    :param field_name: geometry field to set
+    :return: number of rows updated
+    """
+    source = os.path.join(path, filename)
+    stats.count_file(source)
+
+    qn = connection.ops.quote_name
+    field = model._meta.get_field(field_name)
+    table = model._meta.db_table
+
+    geometrie = 's.geom'
+    if field.geom_type == 'MULTIPOLYGON':
+        geometrie = "CASE WHEN GeometryType(s.geom) = 'POINT' THEN NULL ELSE ST_Multi(s.geom) END"
+
+    with transaction.atomic(), connection.cursor() as c:
+        c.execute('CREATE TEMPORARY TABLE wkt_staging (id varchar, wkt text)')
+
+        with open(source, 'rb') as f:
+            c.copy_expert(
+                "COPY wkt_staging (id, wkt) FROM STDIN WITH (FORMAT csv, DELIMITER '|')", f)
+
+        stats.count('rows', c.rowcount)
+
+        c.execute("""
+UPDATE {table} t
+SET {column} = {geometrie}
+FROM (SELECT '0' || id AS id, ST_GeomFromText(wkt, {srid}) AS geom FROM wkt_staging) s
+WHERE t.{pk} = s.id
+        """.format(
+            table=qn(table), column=qn(field.column), geometrie=geometrie,
+            srid=field.srid, pk=qn(model._meta.pk.column)))
+
+        updated = c.rowcount
+
+        c.execute("""
+SELECT count(*) FROM wkt_staging s
+WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE t.{pk} = '0' || s.id)
+        """.format(table=qn(table), pk=qn(model._meta.pk.column)))
+
+        missing = c.fetchone()[0]
+
+        c.execute('DROP TABLE wkt_staging')
+
+    if missing:
+        log.warning('%s: %d geometries reference non-existing %s; skipping',
+                    filename, missing, model._meta.verbose_name)
+
+    return updated
+
+
+def _assign_area_sql(area_model, target_model, field_name):
+    qn = connection.ops.quote_name
+    area = qn(area_model._meta.db_table)
+    geometrie = target_model._meta.get_field('geometrie')
+
+    if geometrie.geom_type == 'POINT':
+        # small pieces keep the point in polygon test index friendly, the
+        # test against the whole area leaves out points on its border
+        source = (
+            '(SELECT id, geometrie, ST_Subdivide(geometrie, {}) AS piece '
+            'FROM {}) a'.format(SUBDIVIDE_VERTICES, area))
+        match = (
+            'ST_Intersects(t.geometrie, a.piece) '
+            'AND ST_Within(t.geometrie, a.geometrie)')
+    else:
+        source = '{} a'.format(area)
+        match = 'ST_Within(t.geometrie, a.geometrie)'
+
+    return 'UPDATE {} t SET {} = a.id FROM {} WHERE {}'.format(
+        qn(target_model._meta.db_table),
+        qn(target_model._meta.get_field(field_name).column),
+        source, match)
+
+
+def assign_area(area_model, field_name, target_models):
+    """
+    Set foreign key `field_name` of every row of `target_models` to the
+    `area_model` containing its geometrie.
+
+    One UPDATE per target table, in the transaction of the caller.
+    Geometries have to be within the area, so a point on the border of
+    an area gets none. Points are first matched against subdivided area
+    polygons to find the area to test.
+    """
+    with connection.cursor() as c:
+        for model in target_models:
+            c.execute(_assign_area_sql(area_model, model, field_name))
+            log.debug('%s: %d %s assigned', area_model._meta.verbose_name,
+                      c.rowcount, model._meta.verbose_name_plural)
+
+
+def _repair_sql(geom_type, column):
+    fixed = 'ST_MakeValid({})'.format(column)
+
+    if geom_type == 'MULTIPOLYGON':
+        return 'ST_Multi(ST_CollectionExtract({}, 3))'.format(fixed)
+
+    if geom_type == 'POLYGON':
+        # only a repair that is still one polygon fits the column
+        return (
+            'CASE WHEN ST_NumGeometries(ST_CollectionExtract({0}, 3)) = 1 '
+            'THEN ST_GeometryN(ST_CollectionExtract({0}, 3), 1) END'.format(fixed))
+
+    return fixed
+
+
+def validate_geometry(model, field_name='geometrie', samples=10):
+    """
+    Repair the invalid geometries of `model` with ST_MakeValid.
+
+    Finds, repairs and counts the invalid geometries in one statement,
+    so one scan of the table. Crashes when a geometry can not be
+    repaired.
+
+    :return: dict with the number of invalid and repaired geometries,
+        the reasons and some of the invalid ids
+    """
+    qn = connection.ops.quote_name
+    table = model._meta.db_table
+    field = model._meta.get_field(field_name)
+    column = qn(field.column)
+
+    sql = """
+WITH invalid AS (
+  SELECT {pk} AS id, reason(ST_IsValidDetail({column})) AS reason, {repair} AS repaired
+  FROM {table}
+  WHERE NOT ST_IsValid({column})
+), updated AS (
+  UPDATE {table} t SET {column} = i.repaired
+  FROM invalid i
+  WHERE t.{pk} = i.id
+    AND i.repaired IS NOT NULL AND NOT ST_IsEmpty(i.repaired) AND ST_IsValid(i.repaired)
+  RETURNING t.{pk}
+)
+SELECT
+  (SELECT count(*) FROM invalid),
+  (SELECT count(*) FROM updated),
+  (SELECT array_agg(DISTINCT reason) FROM invalid),
+  (SELECT array_agg(id) FROM (SELECT id FROM invalid ORDER BY id LIMIT %s) s)
+    """.format(
+        table=qn(table), column=column, pk=qn(model._meta.pk.column),
+        repair=_repair_sql(field.geom_type, column))
+
+    with connection.cursor() as c:
+        c.execute(sql, [samples])
+        invalid, repaired, reasons, ids = c.fetchone()
+
+    summary = dict(
+        table=table,
+        invalid=invalid,
+        repaired=repaired,
+        reasons=reasons or [],
+        sample_ids=ids or [],
+    )
+
+    if invalid:
+        log.warning('Invalid geometries: %s', summary)
+
+    # crash if any errors are left.
+    assert invalid == repaired, 'Unrepairable geometry in {}'.format(table)
+
+    return summary
+
+
 def process_shp(path, filename, callback):
     """
     Processes a shape file
@@ -35,11 +234,242 @@ def process_shp(path, filename, callback):
     :return:
     """
     source = os.path.join(path, filename)
+    stats.count_file(source)
+
     ds = DataSource(source, encoding='ISO-8859-1')
     lyr = ds[0]
     for feature in lyr:
+        stats.count('rows')
         callback(feature)
 
+
+@contextmanager
+def staged_shp(path, filename, srid=28992):
+    """
+    Copies a whole shape file layer into a temporary staging table.
+
+    The features are streamed in with COPY, the geometry as WKB, so the
+    attribute mapping can be done in SQL with one statement per layer.
+    The table has a column per attribute (lowercase name), the feature
+    id `fid` and the geometry `geom`. Features without a geometry are
+    skipped. The table is dropped when the context is left, also on
+    errors.
+
+    usage:
+
+        with geo.staged_shp(path, 'GBD_Buurt.shp') as shp:
+            geo.insert_from_shp(model, '{} s'.format(shp), values)
+
+    :param path: directory containing the file
+    :param filename: name of the file
+    :param srid: spatial reference of the geometries
+    :return: name of the staging table
+    """
+    source = os.path.join(path, filename)
+    stats.count_file(source)
+
+    qn = connection.ops.quote_name
+    ds = DataSource(source, encoding='ISO-8859-1')
+    lyr = ds[0]
+    fields = lyr.fields
+    table = 'shp_{}'.format(os.path.splitext(filename)[0].lower())
+
+    columns = ['fid', 'geom'] + [name.lower() for name in fields]
+    types = ['integer', 'geometry'] + [
+        OGR_COLUMN_TYPES.get(t.__name__, 'text') for t in lyr.field_types]
+
+    skipped = 0
+
+    def rows():
+        nonlocal skipped
+        for feature in lyr:
+            geom = _feature_geom(feature)
+            if geom is None:
+                skipped += 1
+                continue
+
+            yield (feature.fid, geom.wkb.hex()) + tuple(
+                feature.get(name) for name in fields)
+
+    aborted = False
+
+    try:
+        with connection.cursor() as c:
+            c.execute('CREATE TEMPORARY TABLE {} ({})'.format(qn(table), ', '.join(
+                '{} {}'.format(qn(column), t) for column, t in zip(columns, types))))
+
+            stats.count('rows', database.copy_to_table(table, columns, rows()))
+
+            if skipped:
+                log.warning('%s: %d features without geometry; skipping',
+                            filename, skipped)
+
+            c.execute(
+                'ALTER TABLE {0} ALTER COLUMN geom TYPE geometry(Geometry, {1}) '
+                'USING ST_SetSRID(geom, {1})'.format(qn(table), srid))
+            c.execute('ANALYZE {}'.format(qn(table)))
+
+        yield table
+    except DatabaseError:
+        aborted = True
+        raise
+    finally:
+        # a failed statement aborts the transaction of the caller, its
+        # rollback removes the table
+        in_transaction = not connection.get_autocommit()
+        if not (in_transaction and (aborted or connection.needs_rollback)):
+            with connection.cursor() as c:
+                c.execute('DROP TABLE IF EXISTS {}'.format(qn(table)))
+
+
+def _feature_geom(feature):
+    # GDAL raises on a feature with a null geometry
+    try:
+        return feature.geom
+    except GDALException:
+        return None
+
+
+def multipoly_sql(column):
+    """
+    SQL for the multipolygon of `column`, like `get_multipoly`
+    """
+    return (
+        "CASE WHEN GeometryType({0}) IN ('POLYGON', 'MULTIPOLYGON') "
+        "THEN ST_Multi({0}) END".format(column))
+
+
+def multiline_sql(column):
+    """
+    SQL for the multilinestring of `column`, like `get_multiline`
+    """
+    return (
+        "CASE WHEN GeometryType({0}) IN ('LINESTRING', 'MULTILINESTRING') "
+        "THEN ST_Multi({0}) END".format(column))
+
+
+def _geometry_sql(field, column):
+    if field.geom_type == 'MULTIPOLYGON':
+        return multipoly_sql(column)
+
+    if field.geom_type == 'MULTILINESTRING':
+        return multiline_sql(column)
+
+    return column
+
+
+def _auto_now_columns(model, fields):
+    return {
+        f.column: 'now()' for f in model._meta.concrete_fields
+        if getattr(f, 'auto_now', False) and f not in fields}
+
+
+def insert_from_shp(model, source, values):
+    """
+    Inserts rows of `model` from a staged shape file in one statement.
+
+    Features with the same primary key are loaded once, the last one
+    wins. Existing rows are updated, like saving a model does.
+
+    :param model: model to insert rows of
+    :param source: FROM clause over the staging table, aliased `s`
+    :param values: dict of field name to SQL expression
+    :return: number of rows inserted or updated
+    """
+    qn = connection.ops.quote_name
+    pk = model._meta.pk
+    fields = [model._meta.get_field(name) for name in values]
+
+    columns = dict(_auto_now_columns(model, fields))
+    columns.update(
+        (f.column, values[name]) for name, f in zip(values, fields))
+
+    select = ', '.join(
+        '{} AS {}'.format(expression, qn(column))
+        for column, expression in columns.items())
+    names = ', '.join(qn(column) for column in columns)
+
+    if pk in fields:
+        key = values[pk.name]
+        sql = """
+INSERT INTO {table} ({names})
+SELECT DISTINCT ON ({key}) {select}
+FROM {source}
+ORDER BY {key}, s.fid DESC
+ON CONFLICT ({pk}) DO UPDATE SET {updates}
+        """.format(
+            table=qn(model._meta.db_table), names=names, key=key,
+            select=select, source=source, pk=qn(pk.column),
+            updates=', '.join(
+                '{0} = EXCLUDED.{0}'.format(qn(column))
+                for column in columns if column != pk.column))
+    else:
+        sql = 'INSERT INTO {} ({}) SELECT {} FROM {} ORDER BY s.fid'.format(
+            qn(model._meta.db_table), names, select, source)
+
+    with connection.cursor() as c:
+        c.execute(sql)
+        return c.rowcount
+
+
+def update_from_shp(staging, model, key, shp_key, field_name='geometrie', **values):
+    """
+    Sets the geometries of a staged shape file on the existing rows of
+    `model` in one statement.
+
+    Rows are matched on field `key` by the SQL expression `shp_key` over
+    the staging table. The last feature with a key wins.
+
+    :param staging: name of the staging table
+    :param model: model with the rows to update
+    :param key: field to match the features on
+    :param shp_key: SQL expression for the key of a feature
+    :param field_name: geometry field to set
+    :param values: other fields to set, as SQL expressions
+    :return: number of rows updated
+    """
+    qn = connection.ops.quote_name
+    table = model._meta.db_table
+    field = model._meta.get_field(field_name)
+
+    columns = dict(_auto_now_columns(model, [field]))
+    columns[field.column] = _geometry_sql(field, 'geom')
+    columns.update(
+        (model._meta.get_field(name).column, expression)
+        for name, expression in values.items())
+
+    sql = """
+UPDATE {table} t
+SET {updates}
+FROM (
+  SELECT DISTINCT ON ({shp_key}) {shp_key} AS shp_key, {select}
+  FROM {staging}
+  ORDER BY {shp_key}, fid DESC
+) s
+WHERE t.{key} = s.shp_key
+    """.format(
+        table=qn(table), shp_key=shp_key, staging=qn(staging),
+        key=qn(model._meta.get_field(key).column),
+        select=', '.join(
+            '{} AS {}'.format(expression, qn(column))
+            for column, expression in columns.items()),
+        updates=', '.join(
+            '{0} = s.{0}'.format(qn(column)) for column in columns))
+
+    with connection.cursor() as c:
+        c.execute(sql)
+        updated = c.rowcount
+
+        c.execute('SELECT count(DISTINCT {}) FROM {}'.format(shp_key, qn(staging)))
+        features = c.fetchone()[0]
+
+    if features > updated:
+        log.warning('%s: %d features reference non-existing %s; skipping',
+                    staging, features - updated, model._meta.verbose_name)
+
+    return updated
+
+
 def get_multipoly(wkt):
     if not wkt:
         return None
@@ -0,0 +1,43 @@
+from django.test import SimpleTestCase, TestCase
+
+from datasets.bag import models
+from .. import database
+
+
+class DatabaseHelperTest(SimpleTestCase):
+
+    def test_chunked(self):
+        rows = (i for i in range(7))
+
+        chunks = list(database.chunked(rows, 3))
+        self.assertEqual(chunks, [[0, 1, 2], [3, 4, 5], [6]])
+
+    def test_chunked_empty(self):
+        self.assertEqual(list(database.chunked([], 3)), [])
+
+    def test_copy_stream(self):
+        stream = database._CopyStream([
+            ('a', None, True),
+            ('tab\there', 1, False),
+        ])
+
+        self.assertEqual(stream.read(), 'a\t\\N\tt\ntab\\there\t1\tf\n')
+        self.assertEqual(stream.read(), '')
+        self.assertEqual(stream.count, 2)
+
+
+class BulkCreateLastWinsTest(TestCase):
+
+    def test_last_row_of_a_key_wins(self):
+        rows = (models.Bron(code=code, omschrijving=omschrijving) for code, omschrijving in [
+            ('1', 'eerste'),
+            ('2', 'twee'),
+            ('3', 'drie'),
+            ('1', 'laatste'),
+        ])
+
+        count = database.bulk_create_last_wins(models.Bron, rows, chunk_size=2)
+
+        self.assertEqual(count, 3)
+        self.assertEqual(models.Bron.objects.count(), 3)
+        self.assertEqual(models.Bron.objects.get(code='1').omschrijving, 'laatste')
@@ -0,0 +1,108 @@
+import datetime
+
+from django.contrib.gis.geos import MultiPolygon, Point, Polygon
+from django.db import ProgrammingError, connection, transaction
+from django.test import TestCase, TransactionTestCase
+
+from datasets.bag import models
+from datasets.bag.tests import factories
+from .. import geo
+
+
+class StagedShpTest(TransactionTestCase):
+
+    def test_staged_shp(self):
+        with geo.staged_shp('diva/gebieden_shp', 'GBD_Buurt.shp') as shp:
+            with connection.cursor() as c:
+                c.execute("""
+SELECT count(*), min(ST_SRID(geom)), min(pg_typeof(id)::text),
+       min(pg_typeof(ingsdatum)::text), min(ingsdatum)
+FROM {}
+                """.format(shp))
+                count, srid, id_type, date_type, date = c.fetchone()
+
+        self.assertEqual(count, 47)
+        self.assertEqual(srid, 28992)
+        self.assertEqual(id_type, 'double precision')
+        self.assertEqual(date_type, 'date')
+        self.assertIsInstance(date, datetime.date)
+
+        with connection.cursor() as c:
+            c.execute('SELECT to_regclass(%s)', [shp])
+            self.assertIsNone(c.fetchone()[0])
+
+    def test_staged_shp_dropped_on_error(self):
+        with self.assertRaises(ValueError):
+            with geo.staged_shp('diva/gebieden_shp', 'GBD_Buurt.shp') as shp:
+                raise ValueError()
+
+        with connection.cursor() as c:
+            c.execute('SELECT to_regclass(%s)', [shp])
+            self.assertIsNone(c.fetchone()[0])
+
+    def test_staged_shp_keeps_database_error(self):
+        with self.assertRaises(ProgrammingError):
+            with transaction.atomic():
+                with geo.staged_shp('diva/gebieden_shp', 'GBD_Buurt.shp') as shp:
+                    with connection.cursor() as c:
+                        c.execute('SELECT no_such_column FROM {}'.format(shp))
+
+        with connection.cursor() as c:
+            c.execute('SELECT to_regclass(%s)', [shp])
+            self.assertIsNone(c.fetchone()[0])
+
+
+class AssignAreaTest(TestCase):
+
+    def test_assign_area(self):
+        gsg = factories.GrootstedelijkGebiedFactory.create(geometrie=MultiPolygon(
+            Polygon.from_bbox((0, 0, 100, 100)), srid=28992))
+        inside, border, outside = [
+            factories.VerblijfsobjectFactory.create(geometrie=Point(x, 50, srid=28992))
+            for x in (50, 100, 150)]
+
+        # sees the rows of the transaction it runs in
+        geo.assign_area(
+            models.Grootstedelijkgebied, '_grootstedelijkgebied',
+            [models.Verblijfsobject])
+
+        assigned = dict(models.Verblijfsobject.objects.values_list(
+            'id', '_grootstedelijkgebied_id'))
+        self.assertEqual(assigned[inside.id], gsg.id)
+        self.assertIsNone(assigned[border.id])
+        self.assertIsNone(assigned[outside.id])
+
+
+class ValidateGeometryTest(TestCase):
+
+    BOWTIE = 'POLYGON((0 0, 10 10, 10 0, 0 10, 0 0))'
+
+    def set_geometrie(self, model, pk, wkt):
+        with connection.cursor() as c:
+            c.execute(
+                'UPDATE {} SET geometrie = ST_GeomFromText(%s, 28992) WHERE id = %s'.format(
+                    model._meta.db_table), [wkt, pk])
+
+    def test_repairs_self_intersection(self):
+        gsg = factories.GrootstedelijkGebiedFactory.create()
+        self.set_geometrie(
+            models.Grootstedelijkgebied, gsg.id,
+            'MULTIPOLYGON(((0 0, 10 10, 10 0, 0 10, 0 0)))')
+
+        summary = geo.validate_geometry(models.Grootstedelijkgebied)
+
+        self.assertEqual(summary['invalid'], 1)
+        self.assertEqual(summary['repaired'], summary['invalid'])
+        self.assertEqual(summary['sample_ids'], [gsg.id])
+
+        gsg.refresh_from_db()
+        self.assertTrue(gsg.geometrie.valid)
+        self.assertEqual(gsg.geometrie.area, 50)
+
+    def test_unrepairable_geometry_raises(self):
+        # the repair of a bowtie is two polygons, which a polygon column can not hold
+        pand = factories.PandFactory.create()
+        self.set_geometrie(models.Pand, pand.id, self.BOWTIE)
+
+        with self.assertRaises(AssertionError):
+            geo.validate_geometry(models.Pand)
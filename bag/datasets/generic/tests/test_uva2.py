@@ -1,4 +1,6 @@
 import datetime
+from unittest import mock
+
 from django.test import TestCase
 from .. import uva2
 
@@ -22,3 +24,62 @@ class UvaHelperTest(TestCase):
         self.assertFalse(uva2.uva_geldig("19000101", "19801101"))
         self.assertFalse(uva2.uva_geldig("20301113", "20311113"))
 
+    def test_uva_datum_is_memoized(self):
+        self.assertIs(uva2.uva_datum("19770724"), uva2.uva_datum("19770724"))
+
+    def test_geldige_relatie(self):
+        row = {
+            'VBOSTS/TijdvakRelatie/begindatumRelatie': '19000101',
+            'VBOSTS/TijdvakRelatie/einddatumRelatie': '19801101',
+        }
+        self.assertFalse(uva2.geldige_relatie(row, 'VBOSTS'))
+
+        typo = {
+            'VBOSTS/TijdvakRelatie/begindatumRelatie': '19000101',
+            'VBOSTS/TijdvakRelatie/eindatumRelatie': '',
+        }
+        self.assertTrue(uva2.geldige_relatie(typo, 'VBOSTS'))
+
+    def test_row(self):
+        row = uva2.Row(['1', '19000101', ''], uva2.getters(['id', 'begin', 'eind']))
+
+        self.assertEqual(row['begin'], '19000101')
+        self.assertIn('eind', row)
+        self.assertNotIn('naam', row)
+        self.assertIsNone(row.get('naam'))
+        self.assertEqual(row.items(), [('id', '1'), ('begin', '19000101'), ('eind', '')])
+        with self.assertRaises(KeyError):
+            row['naam']
+
+    def test_short_row(self):
+        row = uva2.Row(['1'], uva2.getters(['id', 'begin']))
+
+        self.assertNotIn('begin', row)
+        self.assertEqual(row.get('begin', ''), '')
+        self.assertEqual(row.items(), [('id', '1')])
+        with self.assertRaises(KeyError):
+            row['begin']
+
+    def test_logging_callback_reraises_on_short_row(self):
+        row = uva2.Row(['1'], uva2.getters(['id', 'begin']))
+
+        def callback(r):
+            raise ValueError(r['id'])
+
+        with self.assertRaises(ValueError):
+            uva2.logging_callback('test.uva2', callback)(row)
+
+
+class ParallelParseTest(TestCase):
+
+    def test_workers_yield_same_rows(self):
+        def callback(r):
+            return r['sleutelverzendend']
+
+        serial = list(uva2.process_uva2('diva/bag', 'VBO', callback))
+
+        with mock.patch.object(uva2, 'PARTITION_SIZE', 4096):
+            parallel = list(uva2.process_uva2(
+                'diva/bag', 'VBO', callback, workers=3))
+
+        self.assertEqual(serial, parallel)
@@ -1,9 +1,15 @@
 import csv
 import datetime
+import io
 import logging
+import multiprocessing
 import os
 import re
 from contextlib import contextmanager
+from functools import lru_cache
+from operator import itemgetter
+
+from batch import stats
 
 log = logging.getLogger(__name__)
 
@@ -11,6 +17,8 @@ uva2_date_re = re.compile(r'^.*/[a-zA-Z]+_(\d{8})_N_\d{8}_\d{8}\.uva2$', re.IGNO
 one_date_re = re.compile(r'^.*?_(\d{8})\.[a-z]{3}$', re.IGNORECASE)
 
 
+# the number of distinct dates is small, strptime is not
+@lru_cache(maxsize=None)
 def uva_datum(s):
     if not s:
         return None
@@ -25,24 +33,89 @@ def uva_nummer(s):
     return int(s, 10)
 
 
+_indicaties = {'j': True, 'n': False}
+
+
 def uva_indicatie(s):
     """
     Translates an indicatie (J/N) to True/False
     """
-    return {'j': True, 'n': False}.get(s.lower(), None)
+    return _indicaties.get(s.lower(), None)
+
+
+# reference date for uva_geldig, refreshed for every file that is read
+_today = datetime.date.today()
 
 
 def uva_geldig(start, eind):
+    return _uva_geldig(start, eind, _today)
+
+
+@lru_cache(maxsize=65536)
+def _uva_geldig(start, eind, now):
     s = uva_datum(start)
     e = uva_datum(eind)
 
-    now = datetime.date.today()
-
     return e is None or s is None or (s <= now < e)
 
 
-def _wrap_row(r, headers):
-    return dict(zip(headers, r))
+_missing = object()
+
+
+class Row(object):
+    """
+    A row of a file with a header, read by column name like a dict.
+
+    The values stay in the list the csv reader made; a column is read with
+    the item getter of its header, made once per file by `getters`.
+    Columns past the end of a short row are missing, as in a dict of the
+    header and the row.
+    """
+    __slots__ = ('values', 'getters')
+
+    def __init__(self, values, getters):
+        self.values = values
+        self.getters = getters
+
+    def __getitem__(self, key):
+        try:
+            return self.getters[key](self.values)
+        except IndexError:
+            raise KeyError(key) from None
+
+    def __contains__(self, key):
+        return self.get(key, _missing) is not _missing
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [key for key, _ in self.items()]
+
+    def items(self):
+        result = []
+        for key, getter in self.getters.items():
+            try:
+                result.append((key, getter(self.values)))
+            except IndexError:
+                pass
+        return result
+
+
+def getters(headers):
+    """
+    Item getters of the columns in `headers`, by name. Of duplicate
+    names the last column is read.
+    """
+    return {header: itemgetter(i) for i, header in enumerate(headers)}
+
+
+def _wrap_rows(rows, headers):
+    columns = getters(headers)
+    return (Row(r, columns) for r in rows)
 
 
 @contextmanager
@@ -53,6 +126,11 @@ def _context_reader(
     if not os.path.exists(source):
         raise ValueError("File not found: {}".format(source))
 
+    global _today
+    _today = datetime.date.today()
+
+    stats.count_file(source)
+
     with open(source, encoding='cp1252') as f:
         rows = csv.reader(f, delimiter=';', quotechar=quotechar, quoting=quoting)
 
@@ -61,7 +139,7 @@ def _context_reader(
 
         if with_header:
             headers = next(rows)
-            yield (_wrap_row(r, headers) for r in rows)
+            yield _wrap_rows(rows, headers)
         else:
             yield (r for r in rows)
 
@@ -84,13 +162,20 @@ def geldig_tijdvak(r):
                       r['TijdvakGeldigheid/einddatumTijdvakGeldigheid'])
 
 
+@lru_cache(maxsize=None)
+def _relatie_keys(relatie):
+    return (
+        '{}/TijdvakRelatie/begindatumRelatie'.format(relatie),
+        '{}/TijdvakRelatie/einddatumRelatie'.format(relatie),
+        '{}/TijdvakRelatie/eindatumRelatie'.format(relatie),  # sic!
+    )
+
+
 def geldige_relatie(row, relatie):
-    begin = row['{}/TijdvakRelatie/begindatumRelatie'.format(relatie)]
+    begin_key, end_key, typo_key = _relatie_keys(relatie)
 
-    try:
-        end = row['{}/TijdvakRelatie/einddatumRelatie'.format(relatie)]
-    except KeyError:
-        end = row['{}/TijdvakRelatie/eindatumRelatie'.format(relatie)]  # sic!
+    begin = row[begin_key]
+    end = row[end_key] if end_key in row else row[typo_key]
 
     return uva_geldig(begin, end)
 
@@ -150,13 +235,115 @@ def get_filedate(path, file_code):
         return uva_datum(m.groups()[0])
 
 
-def process_uva2(path, file_code, process_row_callback):
+# bytes parsed by a worker in one go
+PARTITION_SIZE = 8 * 1024 * 1024
+
+# (source, headers, callback, csv options) of the partitioned file,
+# inherited by the forked workers
+_partition_job = None
+
+
+def _partitions(source, start, size):
+    """
+    Split `source` from byte `start` into line aligned byte ranges of
+    about `size` bytes
+    """
+    end = os.path.getsize(source)
+    bounds = [start]
+
+    with open(source, 'rb') as f:
+        while bounds[-1] + size < end:
+            f.seek(bounds[-1] + size)
+            f.readline()
+            bounds.append(f.tell())
+
+    if bounds[-1] < end:
+        bounds.append(end)
+
+    return list(zip(bounds, bounds[1:]))
+
+
+def _process_partition(bounds):
+    source, headers, callback, options = _partition_job
+    start, end = bounds
+
+    with open(source, 'rb') as f:
+        f.seek(start)
+        # cp1252 is single byte, every line boundary is a character boundary
+        data = f.read(end - start).decode('cp1252')
+
+    rows = csv.reader(io.StringIO(data, newline=''), delimiter=';', **options)
+
+    if headers is not None:
+        rows = _wrap_rows(rows, headers)
+
+    return [result for result in map(callback, rows) if result]
+
+
+def _process_parallel(
+        source, callback, workers, ordered=True, skip=3, with_header=True,
+        **options):
+    """
+    Parse `source` in `workers` forked processes.
+
+    The file is split into line aligned byte ranges; every worker decodes,
+    parses and converts (with `callback`) whole ranges. Results are
+    yielded in file order, or as they are done when not `ordered`.
+
+    Side effects of `callback` on its task stay in the worker, so only
+    use this for callbacks that just convert rows. Rows may not contain
+    quoted newlines.
+    """
+    global _partition_job, _today
+
+    if not os.path.exists(source):
+        raise ValueError("File not found: {}".format(source))
+
+    _today = datetime.date.today()
+    stats.count_file(source)
+
+    headers = None
+
+    with open(source, 'rb') as f:
+        for i in range(skip):
+            f.readline()
+
+        if with_header:
+            header_line = f.readline().decode('cp1252')
+            headers = next(csv.reader([header_line], delimiter=';', **options))
+
+        start = f.tell()
+
+    _partition_job = source, headers, callback, options
+
+    context = multiprocessing.get_context('fork')
+
+    try:
+        with context.Pool(workers) as pool:
+            partitions = _partitions(source, start, PARTITION_SIZE)
+            imap = pool.imap if ordered else pool.imap_unordered
+
+            for results in imap(_process_partition, partitions):
+                stats.count('rows', len(results))
+                yield from results
+    finally:
+        _partition_job = None
+
+
+def _can_fork():
+    # daemonic processes, like the workers of a parallel job, can not fork
+    return not multiprocessing.current_process().daemon
+
+
+def process_uva2(path, file_code, process_row_callback, workers=1, ordered=True):
     """
     Process a UVA2 file
 
     :param path: path containing the UVA2 file
     :param file_code: three-letter code identifying the file
     :param process_row_callback: function taking one parameter that is called on every row
+    :param workers: number of processes parsing the file, see _process_parallel
+    :param ordered: yield the results in file order when using workers
     :return: an iterable over the results of process_row_callback
     """
 
@@ -164,22 +351,35 @@ def process_uva2(path, file_code, process_row_callback):
 
     cb = logging_callback(source, process_row_callback)
 
+    if workers > 1 and _can_fork():
+        yield from _process_parallel(
+            source, cb, workers, ordered, quotechar=None, quoting=csv.QUOTE_NONE)
+        return
+
     with _context_reader(source) as rows:
         for row in rows:
             result = cb(row)
             if result:
+                stats.count('rows')
                 yield result
 
 
 def process_csv(
         path, file_code, process_row_callback,
-        with_header=True, quotechar='"', source=None):
+        with_header=True, quotechar='"', source=None,
+        workers=1, ordered=True):
 
     if not source:
         source = resolve_file(path, file_code, extension='csv')
 
     cb = logging_callback(source, process_row_callback)
 
+    if workers > 1 and _can_fork():
+        yield from _process_parallel(
+            source, cb, workers, ordered, skip=0, with_header=with_header,
+            quotechar=quotechar, quoting=csv.QUOTE_MINIMAL)
+        return
+
     with _context_reader(
             source, skip=0, quotechar=quotechar,
             quoting=csv.QUOTE_MINIMAL, with_header=with_header) as rows:
@@ -187,12 +387,13 @@ def process_csv(
         for row in rows:
             result = cb(row)
             if result:
-
+                stats.count('rows')
                 yield result
 
 
 def read_landelijk_id_mapping(path, file_code):
     source = resolve_file(path, file_code, extension='dat')
+    stats.count_file(source)
     result = dict()
     with open(source) as f:
         reader = csv.reader(f, delimiter=';')
@@ -220,6 +421,8 @@ def read_gebruiksdoelen(path):
         file_code = 'VBO_gebruiksdoelen'
         filename = resolve_file(path, file_code, extension='csv')
 
+    stats.count_file(filename)
+
     out = []
     with open(filename, encoding='cp1252') as f:
         rows = csv.reader(f, delimiter=';')
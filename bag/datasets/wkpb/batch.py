@@ -8,7 +8,7 @@ from django import db
 from django.conf import settings
 
 import datasets.brk.models as brk
-from batch import batch
+from batch import batch, stats
 from datasets.generic import kadaster, database, metadata
 from . import models
 
@@ -17,6 +17,7 @@ log = logging.getLogger(__name__)
 
 class ImportBeperkingcodeTask(batch.BasicTask):
     name = "Import Beperkingcode"
+    clears = (models.Beperkingcode,)
 
     def __init__(self, source_path):
         super().__init__()
@@ -29,6 +30,8 @@ class ImportBeperkingcodeTask(batch.BasicTask):
         pass
 
     def process(self):
+        stats.count_file(self.source)
+
         with open(self.source) as f:
             rows = csv.reader(f, delimiter=';')
             objects = [self.process_row(row) for row in rows]
@@ -60,6 +63,8 @@ class ImportWkpbBroncodeTask(batch.BasicTask):
         pass
 
     def process(self):
+        stats.count_file(self.source)
+
         with open(self.source) as f:
             rows = csv.reader(f, delimiter=';')
             objects = [self.process_row(r) for r in rows]
@@ -76,6 +81,7 @@ class ImportWkpbBroncodeTask(batch.BasicTask):
 
 class ImportBeperkingTask(batch.BasicTask):
     name = "Import Beperking"
+    clears = (models.Beperking,)
 
     def __init__(self, source_path):
         super().__init__()
@@ -89,6 +95,8 @@ class ImportBeperkingTask(batch.BasicTask):
         self.codes.clear()
 
     def process(self):
+        stats.count_file(self.source)
+
         with open(self.source) as f:
             rows = csv.reader(f, delimiter=';')
             objects = [obj for obj in (self.process_row(r) for r in rows) if obj]
@@ -120,6 +128,7 @@ class ImportBeperkingTask(batch.BasicTask):
 
 class ImportWkpbBrondocumentTask(batch.BasicTask):
     name = "Import Wkpb Brondocument"
+    clears = (models.Brondocument,)
 
     def __init__(self, source_path):
         super().__init__()
@@ -141,6 +150,8 @@ class ImportWkpbBrondocumentTask(batch.BasicTask):
 
 
     def process(self):
+        stats.count_file(self.source)
+
         with open(self.source) as f:
             rows = csv.reader(f, delimiter=';')
             objects = (self.process_row(r) for r in rows)
@@ -171,8 +182,9 @@ class ImportWkpbBrondocumentTask(batch.BasicTask):
         )
 
 
-class ImportWkpbBepKadTask(batch.BasicTask, metadata.UpdateDatasetMixin):
+class ImportWkpbBepKadTask(batch.BasicTask, metadata.UpdateDatasetMixin, database.CopyLoadMixin):
     name = "import Beperking-Percelen"
+    clears = (models.BeperkingKadastraalObject,)
     dataset_id = 'Wkpb'
 
     def __init__(self, source_path):
@@ -202,11 +214,13 @@ class ImportWkpbBepKadTask(batch.BasicTask, metadata.UpdateDatasetMixin):
         )
 
     def process(self):
+        stats.count_file(self.source)
+
         with open(self.source) as f:
             rows = csv.reader(f, delimiter=';')
-            objects = [o for o in (self.process_row(r) for r in rows) if o]
+            objects = (o for o in (self.process_row(r) for r in rows) if o)
 
-        models.BeperkingKadastraalObject.objects.bulk_create(objects, batch_size=database.BATCH_SIZE)
+            self.bulk_insert(models.BeperkingKadastraalObject, objects)
 
     def process_row(self, r):
         aanduiding = kadaster.get_aanduiding(r[0], r[1], r[2], r[3], r[4])
@@ -224,7 +238,8 @@ class ImportWkpbBepKadTask(batch.BasicTask, metadata.UpdateDatasetMixin):
 
         uid = '{0}_{1}'.format(beperking_id, aanduiding)
 
-        return models.BeperkingKadastraalObject(
+        return self.new_row(
+            models.BeperkingKadastraalObject,
             pk=uid,
             beperking_id=beperking_id,
             kadastraal_object_id=self.kot[aanduiding],
@@ -233,6 +248,7 @@ class ImportWkpbBepKadTask(batch.BasicTask, metadata.UpdateDatasetMixin):
 
 class ImportBeperkingVerblijfsobjectTask(object):
     name = "Import WKPB - Beperking-VBO"
+    clears = (models.BeperkingVerblijfsobject,)
 
     def before(self):
         pass
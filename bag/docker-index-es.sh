@@ -8,31 +8,12 @@ trap "kill 0" EXIT
 
 source docker-wait.sh
 
-# clear elasticindices and creates empty ones
+# create new empty indices, the live ones stay searchable
 python manage.py elastic_indices --delete
 
 python manage.py elastic_indices gebieden wkpb pand --build
 
-python manage.py elastic_indices bag brk --partial=1/3 --build &
-python manage.py elastic_indices bag brk --partial=2/3 --build &
-python manage.py elastic_indices bag brk --partial=3/3 --build &
+python manage.py elastic_indices bag brk --workers=3 --build
 
-
-FAIL=0
-
-for job in `jobs -p`
-do
-	echo $job
-	wait $job || let "FAIL+=1"
-done
-
-echo $FAIL
-
-if [ "$FAIL" == "0" ];
-then
-    echo "YAY!"
-else
-    echo "FAIL! ($FAIL)"
-    echo 'Elastic Import Error. 1 or more workers failed'
-    exit 1
-fi
+# point the aliases to the new indices
+python manage.py elastic_indices --swap
@@ -36,7 +36,9 @@ class ManageView(Operation):
         return history[-1]
 
     def database_forwards(self, app_label, schema_editor, from_state, to_state):
-        self._drop_view_and_materialized_things(schema_editor, self.view_name)
+        # the materialized view in use is replaced at the end of
+        # _create_geo_indices, once the new one is built
+        self._drop_view(schema_editor, self.view_name)
         self._create_geo_indices(schema_editor, self.view_name, self.sql)
 
     def database_backwards(self, app_label, schema_editor, from_state,
@@ -55,67 +57,83 @@ class ManageView(Operation):
         return f"Create normal and materialized view {self.view_name}"
 
     def _drop_view_and_materialized_things(self, se, relname):
+        self._drop_view(se, relname)
+        self._drop_materialized(se, relname)
+
+    def _drop_view(self, se, relname):
         self.logger.info(f'Cleaning up: {relname}.')
+        self._drop_relation(se, relname, self.logger)
+
+    def _drop_materialized(self, se, relname):
+        self._drop_relation(se, f'{relname}_mat', self.logger)
+
+    @staticmethod
+    def _drop_relation(se, relname, logger):
+        """
+        Drop the view, table or materialized view `relname`
+        """
+        statements = (
+            ('v', 'DROP VIEW IF EXISTS {}', 'View {} dropped.'),
+            ('m', 'DROP MATERIALIZED VIEW IF EXISTS {}',
+             'Materialised View {} dropped.'),
+            ('r', 'DROP TABLE IF EXISTS {}', 'Table {} dropped.'),
+        )
+
         with connection.cursor() as cursor:
             base_stmt = "SELECT count(relname) FROM pg_class " \
                         "WHERE relkind = %s AND relname = %s"
 
-            cursor.execute(base_stmt, ['v', relname])
-            if cursor.fetchall()[0][0] > 0:
-                se.execute(
-                    'DROP VIEW IF EXISTS {}'.format(se.quote_name(relname))
-                )
-                self.logger.info(f'View {relname} dropped.')
-
-            cursor.execute(base_stmt, ['r', relname])
-            if cursor.fetchall()[0][0] > 0:
-                se.execute(
-                    'DROP TABLE IF EXISTS {}'.format(se.quote_name(relname))
-                )
-                self.logger.info(f'Table {relname} dropped.')
-
-            cursor.execute(base_stmt, ['v', f'{relname}_mat'])
-            if cursor.fetchall()[0][0] > 0:
-                se.execute(
-                    'DROP MATERIALIZED VIEW IF EXISTS {}'.format(
-                        se.quote_name(f"{relname}_mat")
-                    )
-                )
-                self.logger.info(f'Materialised View {relname}_mat dropped.')
-
-            cursor.execute(base_stmt, ['r', f'{relname}_mat'])
-            if cursor.fetchall()[0][0] > 0:
-                se.execute(
-                    'DROP TABLE IF EXISTS {}'.format(
-                        se.quote_name(f"{relname}_mat")
-                    )
-                )
-                self.logger.info(f'Table {relname}_mat dropped.')
+            for relkind, drop, message in statements:
+                cursor.execute(base_stmt, [relkind, relname])
+                if cursor.fetchall()[0][0] > 0:
+                    se.execute(drop.format(se.quote_name(relname)))
+                    logger.info(message.format(relname))
 
     @staticmethod
     def _create_geo_indices(se, viewname, schema, prefix='geo_'):
+        """
+        Create the view and its materialized view.
+
+        The materialized view is built and indexed under a new name and
+        then swapped in, so the one in use is only locked for the swap.
+        """
+        logger = logging.getLogger('datapunt.bag.ManageView')
+        mat = f"{viewname}_mat"
+        shadow = f"{viewname}_mat_new"
+
         se.execute(
             'CREATE VIEW {} AS {}'.format(
                 se.quote_name(viewname), schema
             )
         )
 
-        # Todo: Bugfix in progress. Fails without this next line.
+        ManageView._drop_relation(se, shadow, logger)
         se.execute(
-            'DROP MATERIALIZED VIEW IF EXISTS {}'.format(
-                se.quote_name(f"{viewname}_mat")
+            'CREATE MATERIALIZED VIEW {} AS {}'.format(
+                se.quote_name(shadow), schema
             )
         )
+
+        indexed = not prefix or viewname.startswith(prefix)
+        if indexed:
+            se.execute(
+                'CREATE INDEX {} ON {} USING  GIST (geometrie)'.format(
+                    se.quote_name(f"{shadow}_idx"),
+                    se.quote_name(shadow)
+                )
+            )
+
+        ManageView._drop_relation(se, mat, logger)
         se.execute(
-            'CREATE MATERIALIZED VIEW {} AS {}'.format(
-                se.quote_name(f"{viewname}_mat"), schema
+            'ALTER MATERIALIZED VIEW {} RENAME TO {}'.format(
+                se.quote_name(shadow), se.quote_name(mat)
             )
         )
 
-        if not prefix or viewname.startswith(prefix):
+        if indexed:
             se.execute(
-                'CREATE INDEX {} ON {} USING  GIST (geometrie)'.format(
-                    se.quote_name(f"{viewname}_mat_idx"),
-                    se.quote_name(f"{viewname}_mat")
+                'ALTER INDEX {} RENAME TO {}'.format(
+                    se.quote_name(f"{shadow}_idx"),
+                    se.quote_name(f"{mat}_idx")
                 )
             )
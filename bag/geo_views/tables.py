@@ -0,0 +1,192 @@
+"""
+Zero downtime rebuild of the geo_*_mat tables
+
+Every table is built as a shadow table next to the one in use, indexed,
+clustered and analyzed, and then swapped in by renaming both in one
+short transaction. Readers see the old table until the swap commits.
+
+The area layers also get simplified variants of their table, one per
+level of detail, built and swapped together with the full table.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, transaction
+
+log = logging.getLogger(__name__)
+
+PREFIX = 'geo_'
+
+# simplification tolerances in meters of the levels of detail
+LEVELS_OF_DETAIL = (1, 4, 16, 64)
+
+# views whose table gets a simplified variant per level of detail
+SIMPLIFIED_VIEWS = {
+    'geo_bag_bouwblok',
+    'geo_bag_buurt',
+    'geo_bag_buurtcombinatie',
+    'geo_bag_gebiedsgerichtwerken',
+    'geo_bag_grootstedelijkgebied',
+    'geo_bag_pand',
+    'geo_bag_stadsdeel',
+    'geo_lki_kadastraalobject',
+}
+
+
+def table_name(view_name):
+    return '{}_mat'.format(view_name)
+
+
+def index_name(view_name):
+    return '{}_idx'.format(view_name)
+
+
+def lod_table_name(view_name, tolerance):
+    """
+    Table of `view_name` simplified with `tolerance` meters
+    """
+    return '{}_mat_lod{}'.format(view_name, tolerance)
+
+
+def _tables(view_name):
+    """
+    The tables built for `view_name`: (name of the table in use, name of
+    its GIST index, tolerance or None for the full table)
+    """
+    yield table_name(view_name), index_name(view_name), None
+
+    if view_name in SIMPLIFIED_VIEWS:
+        for tolerance in LEVELS_OF_DETAIL:
+            table = lod_table_name(view_name, tolerance)
+            yield table, '{}_idx'.format(table), tolerance
+
+
+def _new(name):
+    return '{}_new'.format(name)
+
+
+def geo_views():
+    """
+    Names of the geo_ views a table is built for
+    """
+    with connection.cursor() as c:
+        return sorted(
+            table.name for table in connection.introspection.get_table_list(c)
+            if table.type == 'v' and table.name.startswith(PREFIX))
+
+
+def _relkind(cursor, name):
+    cursor.execute(
+        "SELECT relkind FROM pg_class "
+        "WHERE relname = %s AND relnamespace = 'public'::regnamespace", [name])
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _drop(cursor, name):
+    qn = connection.ops.quote_name
+    kind = _relkind(cursor, name)
+
+    if kind == 'm':
+        cursor.execute('DROP MATERIALIZED VIEW {}'.format(qn(name)))
+    elif kind == 'r':
+        cursor.execute('DROP TABLE {}'.format(qn(name)))
+
+
+def _build_table(cursor, name, index, select):
+    qn = connection.ops.quote_name
+
+    # left behind by a failed build
+    _drop(cursor, _new(name))
+
+    cursor.execute('CREATE TABLE {} AS {}'.format(qn(_new(name)), select))
+    cursor.execute('CREATE INDEX {} ON {} USING GIST(geometrie)'.format(
+        qn(_new(index)), qn(_new(name))))
+    cursor.execute('CLUSTER {} USING {}'.format(qn(_new(name)), qn(_new(index))))
+    cursor.execute('VACUUM ANALYZE {}'.format(qn(_new(name))))
+
+
+def _simplified_sql(table, tolerance):
+    """
+    SELECT for a level of detail of `table`: geometries simplified with
+    `tolerance`, leaving out areas smaller than a square of that size
+    """
+    qn = connection.ops.quote_name
+
+    with connection.cursor() as c:
+        c.execute("""
+SELECT attname FROM pg_attribute
+WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped
+ORDER BY attnum
+        """, [table])
+        columns = [
+            'ST_SimplifyPreserveTopology(geometrie, {}) AS geometrie'.format(tolerance)
+            if column == 'geometrie' else qn(column)
+            for column, in c.fetchall()]
+
+    return """
+SELECT {columns} FROM {table}
+WHERE ST_Dimension(geometrie) < 2 OR ST_Area(geometrie) >= {area}
+    """.format(columns=', '.join(columns), table=qn(table), area=tolerance ** 2)
+
+
+def build_shadow(view_name):
+    """
+    Build the shadow tables of `view_name`, each with its GIST index,
+    clustered and analyzed. Runs in autocommit mode, on the connection
+    of the calling thread.
+    """
+    qn = connection.ops.quote_name
+    full = _new(table_name(view_name))
+
+    with connection.cursor() as c:
+        for name, index, tolerance in _tables(view_name):
+            if tolerance is None:
+                select = 'SELECT * FROM {}'.format(qn(view_name))
+            else:
+                select = _simplified_sql(full, tolerance)
+
+            _build_table(c, name, index, select)
+
+    log.info('Built %s', full)
+
+
+def swap(view_name):
+    """
+    Replace the tables of `view_name` by their shadow tables in one
+    transaction. Only the renames hold a lock on the tables in use.
+    """
+    qn = connection.ops.quote_name
+
+    with transaction.atomic(), connection.cursor() as c:
+        for name, index, _ in _tables(view_name):
+            _drop(c, name)
+            c.execute('ALTER TABLE {} RENAME TO {}'.format(
+                qn(_new(name)), qn(name)))
+            c.execute('ALTER INDEX {} RENAME TO {}'.format(
+                qn(_new(index)), qn(index)))
+
+    log.info('Swapped in %s', table_name(view_name))
+
+
+def _build(view_name):
+    # runs in its own thread, with its own database connection
+    try:
+        build_shadow(view_name)
+    finally:
+        connection.close()
+
+
+def refresh(view_names, workers=4):
+    """
+    Rebuild the tables of `view_names`. The shadow tables are built at
+    the same time on `workers` connections; a table is swapped in as
+    soon as it is ready.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [(name, pool.submit(_build, name)) for name in view_names]
+
+        for name, future in futures:
+            # re-raises a failed build
+            future.result()
+            swap(name)
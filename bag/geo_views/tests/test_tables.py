@@ -0,0 +1,45 @@
+from django.db import connection
+from django.test import TransactionTestCase
+
+from datasets.brk.tests import factories as brk_factories
+from geo_views import tables
+
+
+class RefreshTablesTest(TransactionTestCase):
+
+    def relation(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT relkind FROM pg_class WHERE relname = %s", [name])
+            row = cursor.fetchone()
+
+        return row[0] if row else None
+
+    def test_refresh(self):
+        brk_factories.GemeenteFactory.create(gemeente='Amsterdam')
+
+        # twice: the second build replaces the table of the first one
+        tables.refresh(['geo_lki_gemeente'], workers=2)
+        tables.refresh(['geo_lki_gemeente'], workers=2)
+
+        self.assertEqual(self.relation('geo_lki_gemeente_mat'), 'r')
+        self.assertEqual(self.relation('geo_lki_gemeente_idx'), 'i')
+        self.assertIsNone(self.relation('geo_lki_gemeente_mat_new'))
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT id FROM geo_lki_gemeente_mat')
+            self.assertEqual(cursor.fetchall(), [('Amsterdam',)])
+
+    def test_refresh_levels_of_detail(self):
+        tables.refresh(['geo_bag_stadsdeel'])
+
+        for tolerance in tables.LEVELS_OF_DETAIL:
+            name = tables.lod_table_name('geo_bag_stadsdeel', tolerance)
+            self.assertEqual(self.relation(name), 'r')
+            self.assertEqual(self.relation('{}_idx'.format(name)), 'i')
+
+    def test_geo_views(self):
+        views = tables.geo_views()
+
+        self.assertIn('geo_lki_gemeente', views)
+        self.assertTrue(all(v.startswith('geo_') for v in views))
@@ -0,0 +1,57 @@
+from django.db import connection
+from django.test import TestCase
+
+from datasets.brk.tests import factories as brk_factories
+from geo_views import tiles
+
+
+class TilesTest(TestCase):
+
+    def test_tile_bounds(self):
+        extent = tiles.MERCATOR_EXTENT
+
+        self.assertEqual(
+            tiles.tile_bounds(0, 0, 0), (-extent, -extent, extent, extent))
+        self.assertEqual(
+            tiles.tile_bounds(1, 1, 0), (0, 0, extent, extent))
+
+    def test_valid_tile(self):
+        self.assertTrue(tiles.valid_tile(1, 1, 1))
+        self.assertFalse(tiles.valid_tile(1, 2, 0))
+        self.assertFalse(tiles.valid_tile(tiles.MAX_ZOOM + 1, 0, 0))
+
+    def test_tables_for_zoom(self):
+        self.assertEqual(
+            tiles.tables_for_zoom('bag_pand', 17), ['geo_bag_pand_mat'])
+        self.assertEqual(
+            tiles.tables_for_zoom('bag_pand', 14),
+            ['geo_bag_pand_mat_lod4', 'geo_bag_pand_mat_lod1', 'geo_bag_pand_mat'])
+        self.assertEqual(
+            tiles.tables_for_zoom('lki_gemeente', 10), ['geo_lki_gemeente_mat'])
+
+    def test_tile(self):
+        brk_factories.GemeenteFactory.create(gemeente='Amsterdam')
+
+        with connection.cursor() as c:
+            c.execute('REFRESH MATERIALIZED VIEW geo_lki_gemeente_mat')
+
+        response = self.client.get('/bag/tiles/lki_gemeente/0/0/0.pbf')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response['Content-Type'], 'application/vnd.mapbox-vector-tile')
+        self.assertIn(b'Amsterdam', response.content)
+
+    def test_below_min_zoom(self):
+        response = self.client.get('/bag/tiles/bag_pand/10/525/336.pbf')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'')
+
+    def test_unknown_layer(self):
+        response = self.client.get('/bag/tiles/no_such_layer/0/0/0.pbf')
+        self.assertEqual(response.status_code, 404)
+
+    def test_invalid_tile(self):
+        response = self.client.get('/bag/tiles/lki_gemeente/1/2/0.pbf')
+        self.assertEqual(response.status_code, 404)
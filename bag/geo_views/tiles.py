@@ -0,0 +1,199 @@
+"""
+Mapbox vector tiles of the geo_*_mat tables
+
+A tile is made by PostGIS with ST_AsMVT. Tiles are cached per process,
+keyed by layer, tile and the import generation of the table, so a
+rebuilt table never serves stale tiles.
+
+Layers with simplified variants (see `tables.LEVELS_OF_DETAIL`) are
+served from the coarsest variant that is still finer than a pixel of
+the tile.
+
+The large layers are not served below `MIN_ZOOM`; their tiles would
+hold most of the city.
+"""
+from functools import lru_cache
+import math
+
+from django.conf import settings
+from django.db import connection
+
+from geo_views import tables
+
+# half the width of the web mercator projection, in meters
+MERCATOR_EXTENT = 20037508.342789244
+
+# tile size in MVT units and the margin around it
+EXTENT = 4096
+BUFFER = 64
+
+MAX_ZOOM = 22
+
+# lowest zoom level served per layer, for layers too large to fit a tile
+# of the whole city
+MIN_ZOOM = {
+    'bag_pand': 11,
+    'lki_kadastraalobject': 11,
+}
+
+# tile pixels per side
+PIXELS = 256
+
+# latitude of Amsterdam, for the scale of web mercator
+LATITUDE = 52.37
+
+
+def view_name(layer):
+    return 'geo_{}'.format(layer)
+
+
+def table_name(layer):
+    return tables.table_name(view_name(layer))
+
+
+def pixel_size(z):
+    """
+    Size of a tile pixel at zoom level `z` on the ground in Amsterdam,
+    in meters
+    """
+    return (
+        2 * MERCATOR_EXTENT / 2 ** z / PIXELS
+        * math.cos(math.radians(LATITUDE)))
+
+
+def tables_for_zoom(layer, z):
+    """
+    The tables that can serve `layer` at zoom level `z`, best first: the
+    coarsest simplified variant finer than a pixel, falling back to
+    finer variants and the full table
+    """
+    names = []
+
+    if view_name(layer) in tables.SIMPLIFIED_VIEWS:
+        names = [
+            tables.lod_table_name(view_name(layer), tolerance)
+            for tolerance in sorted(tables.LEVELS_OF_DETAIL, reverse=True)
+            if tolerance <= pixel_size(z)]
+
+    return names + [table_name(layer)]
+
+
+def tile_bounds(z, x, y):
+    """
+    Web mercator (EPSG:3857) bounds of tile `z`/`x`/`y`
+    """
+    size = 2 * MERCATOR_EXTENT / 2 ** z
+
+    return (
+        -MERCATOR_EXTENT + x * size,
+        MERCATOR_EXTENT - (y + 1) * size,
+        -MERCATOR_EXTENT + (x + 1) * size,
+        MERCATOR_EXTENT - y * size,
+    )
+
+
+def valid_tile(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def generation(table):
+    """
+    Identifies the current contents of `table`: its oid, which changes
+    every time the table is built again.
+
+    :return: the oid, or None when there is no such table
+    """
+    with connection.cursor() as c:
+        c.execute("""
+SELECT c.oid FROM pg_class c
+JOIN pg_attribute a ON a.attrelid = c.oid AND a.attname = 'geometrie'
+WHERE c.relname = %s AND c.relkind IN ('r', 'm')
+  AND c.relnamespace = 'public'::regnamespace
+        """, [table])
+        row = c.fetchone()
+
+    return row[0] if row else None
+
+
+@lru_cache(maxsize=256)
+def _properties(oid):
+    # all columns but the geometry become feature properties
+    with connection.cursor() as c:
+        c.execute("""
+SELECT attname FROM pg_attribute
+WHERE attrelid = %s AND attnum > 0 AND NOT attisdropped AND attname <> 'geometrie'
+ORDER BY attnum
+        """, [oid])
+        return [row[0] for row in c.fetchall()]
+
+
+@lru_cache(maxsize=256)
+def _srid(table, oid):
+    # the srid of the geometries, so the tile bounds can be transformed
+    # once and the GIST index on geometrie used
+    qn = connection.ops.quote_name
+    with connection.cursor() as c:
+        c.execute('SELECT ST_SRID(geometrie) FROM {} WHERE geometrie IS NOT NULL LIMIT 1'.format(qn(table)))
+        row = c.fetchone()
+
+    return row[0] if row else None
+
+
+def _render(layer, table, oid, z, x, y):
+    srid = _srid(table, oid)
+
+    if srid is None:
+        # an empty table has an empty tile
+        return b''
+
+    qn = connection.ops.quote_name
+    xmin, ymin, xmax, ymax = tile_bounds(z, x, y)
+
+    sql = """
+SELECT ST_AsMVT(features, %s, %s, 'geom') FROM (
+  SELECT {properties},
+    ST_AsMVTGeom(ST_Transform(t.geometrie, 3857), ST_MakeEnvelope(%s, %s, %s, %s, 3857), %s, %s, true) AS geom
+  FROM {table} t
+  WHERE t.geometrie && ST_Transform(ST_MakeEnvelope(%s, %s, %s, %s, 3857), {srid})
+) features
+WHERE geom IS NOT NULL
+    """.format(
+        properties=', '.join('t.{}'.format(qn(p)) for p in _properties(oid)),
+        table=qn(table),
+        srid=int(srid))
+
+    margin = (xmax - xmin) * BUFFER / EXTENT
+
+    with connection.cursor() as c:
+        c.execute(sql, [
+            layer, EXTENT,
+            xmin, ymin, xmax, ymax, EXTENT, BUFFER,
+            xmin - margin, ymin - margin, xmax + margin, ymax + margin])
+        return bytes(c.fetchone()[0] or b'')
+
+
+@lru_cache(maxsize=settings.TILE_CACHE_SIZE)
+def _cached_tile(layer, table, oid, z, x, y):
+    return _render(layer, table, oid, z, x, y)
+
+
+def get_tile(layer, z, x, y):
+    """
+    The vector tile `z`/`x`/`y` of `layer`, from the simplified table
+    for zoom level `z` when it has been built. Below the `MIN_ZOOM` of
+    the layer the tile is empty.
+
+    :return: the tile as bytes, or None when the layer does not exist
+    """
+    for table in tables_for_zoom(layer, z):
+        oid = generation(table)
+
+        if oid is None:
+            continue
+
+        if z < MIN_ZOOM.get(layer, 0):
+            return b''
+
+        return _cached_tile(layer, table, oid, z, x, y)
+
+    return None
@@ -0,0 +1,8 @@
+from django.conf.urls import url
+
+from geo_views import views
+
+urlpatterns = [
+    url(r'^(?P<layer>[a-z_]+)/(?P<z>\d+)/(?P<x>\d+)/(?P<y>\d+)\.pbf$',
+        views.tile, name='tile'),
+]
@@ -0,0 +1,21 @@
+from django.http import Http404, HttpResponse
+
+from geo_views import tiles
+
+
+def tile(request, layer, z, x, y):
+    """
+    Mapbox vector tile of the geo_<layer>_mat table
+    """
+    z, x, y = int(z), int(x), int(y)
+
+    if not tiles.valid_tile(z, x, y):
+        raise Http404("Tile {}/{}/{} does not exist".format(z, x, y))
+
+    content = tiles.get_tile(layer, z, x, y)
+
+    if content is None:
+        raise Http404("Layer {} does not exist".format(layer))
+
+    return HttpResponse(
+        content, content_type='application/vnd.mapbox-vector-tile')
@@ -1,30 +1,186 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
 import logging
+import multiprocessing
+import re
 
+from django import db
 from django.conf import settings
+from django.db import connection
+from django.db.models import prefetch_related_objects
 from django.db.models.query import RawQuerySet
 from elasticsearch import helpers
 import elasticsearch
 import elasticsearch_dsl as es
 
+from django.contrib.gis.db.models.functions import Centroid, Transform
 from django.db.models.functions import Cast
-from django.db.models import F
-from django.db.models import BigIntegerField
+from django.db.models import F, Func
+from django.db.models import BigIntegerField, FloatField
 
 from elasticsearch.client import IndicesClient
 
-from elasticsearch.exceptions import NotFoundError
-
 from elasticsearch_dsl.connections import connections
 
 import time
 
+from batch import stats
+from datasets.generic.database import chunked
+
 log = logging.getLogger(__name__)
 
+# failed documents kept per part for the report
+ERROR_SAMPLES = 10
+
+
+def _init_worker():
+    # every worker process opens its own database connection
+    db.connections.close_all()
+
+
+class PointX(Func):
+    function = 'ST_X'
+    output_field = FloatField()
+
+
+class PointY(Func):
+    function = 'ST_Y'
+    output_field = FloatField()
+
+
+def wgs84_centroid(expression):
+    """
+    The centroid of geometry `expression` in WGS84, computed by the database
+    """
+    return Transform(Centroid(expression), 4326)
+
+
+def lon_lat(point):
+    """
+    values() expressions for the coordinates of the WGS84 `point`,
+    see `row_centroid`
+    """
+    return dict(lon=PointX(point), lat=PointY(point))
+
+
+def row_centroid(row):
+    """
+    The GeoPoint of a row with `lon_lat` values
+    """
+    if row['lon'] is None:
+        return None
+
+    return [row['lon'], row['lat']]
+
+
+def bulk_action(doc_type, _id, source):
+    """
+    Bulk index action for a document of `doc_type`. Empty values are
+    left out of the document, like DocType.to_dict does.
+    """
+    return {
+        '_index': doc_type._default_index(),
+        '_type': doc_type._doc_type.name,
+        '_id': _id,
+        '_source': {
+            key: value for key, value in source.items()
+            if value not in ([], {}, None)
+        },
+    }
+
+
+def _client():
+    return elasticsearch.Elasticsearch(
+        hosts=settings.ELASTIC_SEARCH_HOSTS,
+        retry_on_timeout=True,
+    )
+
+
+@contextmanager
+def bulk_load(index):
+    """
+    Switch `index` to the settings of ELASTIC_BULK_SETTINGS (no refreshes,
+    no replicas) while loading documents inside this context.
+
+    Afterwards the production settings of ELASTIC_INDEX_SETTINGS are put
+    back, the index is refreshed once and, with ELASTIC_FORCEMERGE, merged
+    into one segment.
+    """
+    es_index = IndicesClient(_client())
+
+    es_index.put_settings(
+        index=index, body={'index': settings.ELASTIC_BULK_SETTINGS})
+    log.info('Bulk load settings for %s', index)
+
+    try:
+        yield
+    finally:
+        es_index.put_settings(
+            index=index, body={'index': settings.ELASTIC_INDEX_SETTINGS})
+        es_index.refresh(index=index)
+        log.info('Restored settings of %s', index)
+
+    if settings.ELASTIC_FORCEMERGE:
+        es_index.forcemerge(index=index, max_num_segments=1)
+
+
+def new_generation(alias):
+    """
+    Name of a new physical index for `alias`: the alias with a timestamp.
+    """
+    return '{}_{}'.format(alias, datetime.now().strftime('%Y%m%d%H%M%S%f'))
+
+
+def generations(client, alias):
+    """
+    The physical indices of `alias`, oldest first.
+    """
+    pattern = re.compile(r'^{}_\d{{20}}$'.format(re.escape(alias)))
+    indices = client.indices.get(index='{}_*'.format(alias), ignore=404)
+
+    return sorted(name for name in indices if pattern.match(name))
 
-class DeleteIndexTask(object):
+
+def live_indices(client, alias):
+    """
+    The physical indices `alias` points to
+    """
+    if not client.indices.exists_alias(name=alias):
+        return []
+
+    return sorted(client.indices.get_alias(name=alias))
+
+
+def rollback_alias(alias):
+    """
+    The alias of the generations `alias` pointed to before a swap, kept
+    to roll back to
+    """
+    return '{}_rollback'.format(alias)
+
+
+def build_index(alias):
+    """
+    The physical index a build of `alias` writes into: the newest
+    generation. Without generations the build writes into `alias`.
+    """
+    found = generations(_client(), alias)
+
+    return found[-1] if found else alias
+
+
+class CreateIndexTask(object):
+    """
+    Create a new, empty generation of `index` to build into.
+
+    The alias `index` keeps pointing to the live generation until the
+    build is swapped in with SwapIndexTask. A new alias points to the
+    new generation immediately.
+    """
     index = ''
     doc_types = []
-    name = 'remove index'
+    name = 'create index'
 
     def __init__(self):
 
@@ -41,27 +197,104 @@ class DeleteIndexTask(object):
         )
 
     def execute(self):
+        client = _client()
+        name = new_generation(self.index)
 
-        idx = es.Index(self.index)
-
-        try:
-            idx.delete(ignore=404)
-            log.info("Deleted index %s", self.index)
-        except AttributeError:
-            log.warning("Could not delete index '%s', ignoring", self.index)
-        except NotFoundError:
-            log.warning("Could not delete index '%s', ignoring", self.index)
+        idx = es.Index(name)
 
         for dt in self.doc_types:
             idx.doc_type(dt)
 
         idx.create()
+        log.info("Created index %s for %s", name, self.index)
+
+        if not client.indices.exists(index=self.index):
+            client.indices.put_alias(index=name, name=self.index)
+
+
+class SwapIndexTask(object):
+    """
+    Point the alias `index` to its newest generation, in one atomic
+    alias update.
+
+    The new generation needs at least ELASTIC_SWAP_MIN_RATIO of the
+    documents of the live generation. The generations that were live
+    before get the `rollback_alias`; of those the newest
+    ELASTIC_KEEP_GENERATIONS are kept to roll back to. All other older
+    generations, such as those of failed builds that were never live,
+    are deleted.
+    """
+    index = ''
+    name = 'swap index'
+
+    def __init__(self):
+
+        if not self.index:
+            raise ValueError("No index specified")
+
+    def validate(self, client, new, live):
+        client.indices.refresh(index=new)
+        count = client.count(index=new)['count']
+        live_count = sum(client.count(index=i)['count'] for i in live)
+
+        log.info('%s: %d documents, live %d', new, count, live_count)
+
+        if count < live_count * settings.ELASTIC_SWAP_MIN_RATIO:
+            raise ValueError(
+                "Index {} has {} documents, live index {} has {}".format(
+                    new, count, self.index, live_count))
+
+    def execute(self):
+        client = _client()
+
+        found = generations(client, self.index)
+
+        if not found:
+            raise ValueError("No index to swap in for {}".format(self.index))
+
+        new = found[-1]
+        live = live_indices(client, self.index)
+        rollback = live_indices(client, rollback_alias(self.index))
+
+        if live != [new]:
+            self.validate(client, new, live)
+
+            if not live and client.indices.exists(index=self.index):
+                # a plain index from before the aliases
+                log.warning("Deleting index %s to replace it by an alias",
+                            self.index)
+                client.indices.delete(index=self.index)
+
+            actions = [
+                {'remove': {'index': i, 'alias': self.index}} for i in live
+            ] + [
+                {'add': {'index': new, 'alias': self.index}}
+            ] + [
+                {'add': {'index': i, 'alias': rollback_alias(self.index)}}
+                for i in live
+            ]
+            client.indices.update_aliases(body={'actions': actions})
+            log.info("Alias %s points to %s", self.index, new)
+
+            rollback = sorted(set(rollback) | set(live))
+
+        rollback = [i for i in rollback if i != new]
+        keep = settings.ELASTIC_KEEP_GENERATIONS
+        kept = rollback[max(len(rollback) - keep, 0):]
+
+        for name in found[:-1]:
+            if name not in kept:
+                client.indices.delete(index=name, ignore=404)
+                log.info("Deleted index %s", name)
 
 
 class ImportIndexTask(object):
     queryset = None
     sequential = False  # Non integer PK
     last_id = None
+    # alias of the index the documents are loaded into, see `build_index`
+    index = None
+    target = None
 
     def get_queryset(self):
         return self.queryset.order_by('id')
@@ -70,77 +303,192 @@ class ImportIndexTask(object):
     def convert(self, obj):
         raise NotImplementedError()
 
-    def batch_qs(self):
+    def to_action(self, obj):
+        """
+        Bulk index action for `obj`
         """
-        Returns a (queryset, progress) tuple
-        for each batch in the given queryset.
-        by filtering out records by
+        return self.convert(obj).to_dict(include_meta=True)
 
-            id % modulo = modulo_value
+    def batch_qs(self, modulo, modulo_value):
+        """
+        Returns a list of objects for each batch of
+        part `modulo_value` of the queryset, see `return_qs_parts`.
 
         now it's easy to devide the work acros a few workers
-
-        Usage:
-            # Make sure to order your querset!
-            article_qs = Article.objects.order_by('id')
-            for qs progress in batch_qs(article_qs):
-                do_someting_with_batch(qs)
-
         """
         qs = self.get_queryset()
 
-        log.info('ITEMS %d', qs.count())
+        log.info("PART: %s OF %s" % (modulo_value+1, modulo))
+
+        return self.return_qs_parts(qs, modulo, modulo_value)
+
+    def parts(self):
+        """
+        Returns (modulo, [modulo_value, ..]): the parts of the queryset
+        this process indexes.
 
+        The part selected with --partial is split once more, in a part
+        per worker.
+        """
         numerator = settings.PARTIAL_IMPORT['numerator']
         denominator = settings.PARTIAL_IMPORT['denominator']
+        workers = settings.PARTIAL_IMPORT.get('workers', 1)
 
-        log.info("PART: %s OF %s" % (numerator+1, denominator))
-
-        return self.return_qs_parts(qs, denominator, numerator)
+        return denominator * workers, [
+            numerator * workers + i for i in range(workers)]
 
     def convert_model_to_dict(self, qs):
         """
-        Convert django models to elasticsearch documents
+        Convert the objects of a batch to bulk index actions
         """
 
         batch = list()
 
         for obj in qs:
-            batch.append(self.convert(obj).to_dict(include_meta=True))
+            doc = self.to_action(obj)
+            if self.target:
+                doc['_index'] = self.target
+            batch.append(doc)
             # store last id
-            self.last_id = obj.id
+            self.last_id = doc['_id']
 
         return batch
 
-    def execute(self):
+    def index_part(self, modulo, modulo_value):
         """
-        Index data of specified queryset
+        Index one part of the queryset.
+
+        Failed documents do not stop the part, they are counted and
+        a few of them are kept for the report.
+
+        :return: statistics of the part
         """
-        client = elasticsearch.Elasticsearch(
-            hosts=settings.ELASTIC_SEARCH_HOSTS,
-            retry_on_timeout=True,
-            refresh=True
-        )
+        client = _client()
 
-        for qs in self.batch_qs():
+        start = time.perf_counter()
+        result = dict(part=modulo_value, documents=0, errors=0, failed=[])
 
-            helpers.bulk(
+        for qs in self.batch_qs(modulo, modulo_value):
+
+            success, failed = helpers.bulk(
                 client,
                 self.convert_model_to_dict(qs),
-                raise_on_error=True,
-                refresh=True
+                raise_on_error=False,
             )
 
-        # When testing put all docs in one shard to make sure we have
-        # correct scores/doc counts and test will succeed
-        # because relavancy score will make more sense
-        if settings.TESTING:
-            es_index = IndicesClient(client)
-            es_index.forcemerge('*test', max_num_segments=1)
+            result['documents'] += success
+            result['errors'] += len(failed)
+            result['failed'].extend(
+                failed[:ERROR_SAMPLES - len(result['failed'])])
+
+        result['seconds'] = round(time.perf_counter() - start, 3)
+
+        log.info('%s part %d/%d: %d documents, %d errors',
+                 self.name, modulo_value + 1, modulo,
+                 result['documents'], result['errors'])
+
+        return result
+
+    def report(self, results):
+        """
+        Merge the statistics of the parts. Crashes on failed documents.
+        """
+        documents = sum(r['documents'] for r in results)
+        errors = sum(r['errors'] for r in results)
+
+        stats.count('rows', documents)
+        stats.count('index_errors', errors)
+
+        log.info('%s: %d documents in %d parts, %d errors',
+                 self.name, documents, len(results), errors)
+
+        if errors:
+            failed = [f for r in results for f in r['failed']]
+            raise helpers.BulkIndexError(
+                '{} document(s) failed to index.'.format(errors), failed)
+
+    def execute(self):
+        """
+        Index data of specified queryset
+
+        With more than one worker (--workers) every worker process
+        indexes its own part of the queryset.
+
+        The documents are written into the newest generation of the
+        index, they become searchable when it is swapped in. The index is
+        not refreshed per batch.
+        """
+        if self.index:
+            self.target = build_index(self.index)
+            log.info('%s into %s', self.name, self.target)
+
+            with bulk_load(self.target):
+                results = self.index_parts()
+        else:
+            results = self.index_parts()
+            IndicesClient(_client()).refresh()
+
+        self.report(results)
+
+    def index_parts(self):
+        """
+        Index the parts of this process, see `parts`
+
+        :return: statistics of the parts
+        """
+        modulo, parts = self.parts()
+
+        if len(parts) == 1:
+            return [self.index_part(modulo, parts[0])]
+
+        # never hand an open connection to a forked worker
+        db.connections.close_all()
+
+        with ProcessPoolExecutor(
+                max_workers=len(parts),
+                mp_context=multiprocessing.get_context('fork'),
+                initializer=_init_worker) as pool:
+            return list(pool.map(
+                self.index_part, [modulo] * len(parts), parts))
+
+    def sequential_part(self, qs, modulo, modulo_value):
+        """
+        Part `modulo_value` of `qs` split in `modulo` consecutive id
+        ranges of about the same size.
+
+        The first ids of all ranges come from one ntile query, instead
+        of a count and OFFSET scans.
+        """
+        sql, params = qs.values('id').query.sql_with_params()
+
+        with connection.cursor() as c:
+            c.execute("""
+SELECT min(id) FROM (
+  SELECT id, ntile(%s) OVER (ORDER BY id) AS part FROM ({}) q
+) s
+GROUP BY part
+ORDER BY part
+            """.format(sql), [modulo] + list(params))
+            start_ids = [row[0] for row in c.fetchall()]
+
+        if modulo_value >= len(start_ids):
+            return qs.none()
+
+        start_id = start_ids[modulo_value]
+        qs_s = qs.filter(id__gte=start_id)
+
+        if modulo_value + 1 < len(start_ids):
+            end_id = start_ids[modulo_value + 1]
+            qs_s = qs_s.filter(id__lt=end_id)
+            log.info('PART %d/%d start_id : %s end_id : %s', modulo_value + 1, modulo, start_id, end_id)
+        else:
+            log.info('PART %d/%d start_id : %s ', modulo_value + 1, modulo, start_id)
+
+        return qs_s
 
     def return_qs_parts(self, qs, modulo, modulo_value):
         """
-        Build qs
+        Yields lists of objects
 
         modulo and modulo_value determin which chuncks
         are teturned.
@@ -153,25 +501,15 @@ class ImportIndexTask(object):
         Sometimes the ID field is a string with a number.
         In that case the Indexer can define a substring
         which will extract the number part of the ID field
+
+        The part is read in id order over one server side cursor, in
+        fetches of batch_size rows. The prefetches of the queryset are
+        done per batch.
         """
 
         if modulo != 1:
             if self.sequential:
-                total = qs.count()
-                chunk_size = int(total / modulo)
-                start = chunk_size * modulo_value
-                all_ids = qs.all().values('id')
-                start_id = all_ids[start]['id']
-                qs_s = qs.filter(id__gte=start_id)
-
-                if modulo > modulo_value + 1:
-                    end = chunk_size * (modulo_value + 1)
-                    end_id = all_ids[end]['id']
-                    qs_s = qs_s.filter(id__lt=end_id)
-                    log.info('PART %d/%d start_id : %s end_id : %s', modulo_value + 1, modulo, start_id, end_id)
-                else:
-                    log.info('PART %d/%d start_id : %s ', modulo_value + 1, modulo, start_id)
-
+                qs_s = self.sequential_part(qs, modulo, modulo_value)
             else:
                 qs_s = (
                     qs.annotate(idmod=Cast('id', BigIntegerField()))
@@ -181,28 +519,18 @@ class ImportIndexTask(object):
         else:
             qs_s = qs
 
-        qs_count = qs_s.count()
-
-        log.debug('PART %d/%d Count: %d', modulo_value, modulo, qs_count)
-
-        if not qs_count:
-            return
-
         batch_size = settings.BATCH_SETTINGS['batch_size']
-
-        loopidx = 0
+        lookups = qs_s._prefetch_related_lookups
 
         # gets updates when we save object in es
         self.last_id = None
 
-        while True:
+        rows = qs_s.prefetch_related(None).iterator(chunk_size=batch_size)
 
-            loopidx += 1
+        for loopidx, batch in enumerate(chunked(rows, batch_size), 1):
 
-            if not self.last_id:
-                qs_ss = qs_s[:batch_size]
-            else:
-                qs_ss = qs_s.filter(id__gt=self.last_id)[:batch_size]
+            if lookups:
+                prefetch_related_objects(batch, *lookups)
 
             log.debug(
                 'Batch %4d %4d %s  %s',
@@ -210,9 +538,17 @@ class ImportIndexTask(object):
                 self.last_id
             )
 
-            yield qs_ss
+            yield batch
+
+
+class ImportRowIndexTask(ImportIndexTask):
+    """
+    Index task that builds the documents from the rows of a values()
+    queryset.
 
-            if qs_ss.count() < batch_size:
-                # no more data
-                break
+    `convert` returns the bulk action of a row (see `bulk_action`), no
+    model instances or DocType objects are created.
+    """
 
+    def to_action(self, row):
+        return self.convert(row)
@@ -126,6 +126,7 @@ def load_docs(cls):
 
     batch.execute(datasets.bag.batch.IndexBagJob())
     batch.execute(datasets.bag.batch.IndexGebiedenJob())
+    batch.execute(datasets.bag.batch.SwapIndexGebiedJob())
     batch.execute(datasets.bag.batch.IndexPandJob())
     batch.execute(datasets.brk.batch.IndexKadasterJob())
 
@@ -38,6 +38,7 @@ class GebiedSearchTest(APITransactionTestCase):
 
         batch.execute(datasets.bag.batch.DeleteIndexGebiedJob())
         batch.execute(datasets.bag.batch.IndexGebiedenJob())
+        batch.execute(datasets.bag.batch.SwapIndexGebiedJob())
 
     def find(self, naam, tussenhaakjes=None):
 
@@ -0,0 +1,185 @@
+from unittest import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase
+
+from datasets.bag import models
+from datasets.bag.tests import factories
+from search import index
+
+
+class ImportIndexTaskTest(SimpleTestCase):
+
+    def test_parts(self):
+        task = index.ImportIndexTask()
+
+        with mock.patch.dict(settings.PARTIAL_IMPORT, numerator=0, denominator=1, workers=1):
+            self.assertEqual(task.parts(), (1, [0]))
+
+        with mock.patch.dict(settings.PARTIAL_IMPORT, numerator=0, denominator=1, workers=3):
+            self.assertEqual(task.parts(), (3, [0, 1, 2]))
+
+        # part 2/3 split over 2 workers
+        with mock.patch.dict(settings.PARTIAL_IMPORT, numerator=1, denominator=3, workers=2):
+            self.assertEqual(task.parts(), (6, [2, 3]))
+
+    def test_report(self):
+        task = index.ImportIndexTask()
+        task.name = 'test'
+
+        task.report([
+            dict(part=0, documents=3, errors=0, failed=[]),
+            dict(part=1, documents=2, errors=0, failed=[]),
+        ])
+
+        with self.assertRaises(index.helpers.BulkIndexError):
+            task.report([
+                dict(part=0, documents=3, errors=1, failed=[{'index': {}}]),
+            ])
+
+
+class BulkLoadTest(SimpleTestCase):
+
+    @mock.patch.object(index, 'IndicesClient')
+    def test_restores_settings(self, indices_client):
+        es_index = indices_client.return_value
+
+        with mock.patch.object(settings, 'ELASTIC_FORCEMERGE', False):
+            with index.bulk_load('nummeraanduiding'):
+                es_index.put_settings.assert_called_once_with(
+                    index='nummeraanduiding',
+                    body={'index': settings.ELASTIC_BULK_SETTINGS})
+                es_index.refresh.assert_not_called()
+
+        es_index.put_settings.assert_called_with(
+            index='nummeraanduiding',
+            body={'index': settings.ELASTIC_INDEX_SETTINGS})
+        es_index.refresh.assert_called_once_with(index='nummeraanduiding')
+        es_index.forcemerge.assert_not_called()
+
+    @mock.patch.object(index, 'IndicesClient')
+    def test_restores_settings_on_error(self, indices_client):
+        es_index = indices_client.return_value
+
+        with self.assertRaises(ValueError):
+            with index.bulk_load('nummeraanduiding'):
+                raise ValueError()
+
+        self.assertEqual(es_index.put_settings.call_count, 2)
+        es_index.refresh.assert_called_once_with(index='nummeraanduiding')
+
+
+class SwapIndexTaskTest(SimpleTestCase):
+
+    def setUp(self):
+        self.task = index.SwapIndexTask()
+        self.task.index = 'pand'
+
+        self.client = mock.Mock()
+        self.client.indices.get.return_value = {
+            'pand_20260101000000000000': {},
+            'pand_20260201000000000000': {},
+            'pand_20260301000000000000': {},
+            'pand_backup': {},
+        }
+        self.aliases = {
+            'pand': {'pand_20260201000000000000': {}},
+        }
+        self.client.indices.exists_alias.side_effect = (
+            lambda name: name in self.aliases)
+        self.client.indices.get_alias.side_effect = (
+            lambda name: self.aliases[name])
+
+        patcher = mock.patch.object(index, '_client', return_value=self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_generations(self):
+        self.assertEqual(index.generations(self.client, 'pand'), [
+            'pand_20260101000000000000',
+            'pand_20260201000000000000',
+            'pand_20260301000000000000',
+        ])
+        self.assertEqual(index.build_index('pand'), 'pand_20260301000000000000')
+
+    @mock.patch.multiple(settings, ELASTIC_SWAP_MIN_RATIO=0.9, ELASTIC_KEEP_GENERATIONS=1)
+    def test_swap(self):
+        self.client.count.side_effect = [{'count': 95}, {'count': 100}]
+
+        self.task.execute()
+
+        self.client.indices.update_aliases.assert_called_once_with(body={'actions': [
+            {'remove': {'index': 'pand_20260201000000000000', 'alias': 'pand'}},
+            {'add': {'index': 'pand_20260301000000000000', 'alias': 'pand'}},
+            {'add': {'index': 'pand_20260201000000000000', 'alias': 'pand_rollback'}},
+        ]})
+        # never live, so not kept to roll back to
+        self.client.indices.delete.assert_called_once_with(
+            index='pand_20260101000000000000', ignore=404)
+
+    @mock.patch.multiple(settings, ELASTIC_SWAP_MIN_RATIO=0.9, ELASTIC_KEEP_GENERATIONS=1)
+    def test_swap_deletes_failed_build(self):
+        # 0101 is live, the build of 0201 failed and 0301 is swapped in
+        self.aliases['pand'] = {'pand_20260101000000000000': {}}
+        self.client.count.side_effect = [{'count': 95}, {'count': 100}]
+
+        self.task.execute()
+
+        self.client.indices.delete.assert_called_once_with(
+            index='pand_20260201000000000000', ignore=404)
+
+    @mock.patch.multiple(settings, ELASTIC_SWAP_MIN_RATIO=0.9, ELASTIC_KEEP_GENERATIONS=1)
+    def test_swap_keeps_newest_rollback(self):
+        self.aliases['pand_rollback'] = {'pand_20260101000000000000': {}}
+        self.client.count.side_effect = [{'count': 95}, {'count': 100}]
+
+        self.task.execute()
+
+        self.client.indices.delete.assert_called_once_with(
+            index='pand_20260101000000000000', ignore=404)
+
+    @mock.patch.multiple(settings, ELASTIC_SWAP_MIN_RATIO=0.9, ELASTIC_KEEP_GENERATIONS=1)
+    def test_swap_too_few_documents(self):
+        self.client.count.side_effect = [{'count': 50}, {'count': 100}]
+
+        with self.assertRaises(ValueError):
+            self.task.execute()
+
+        self.client.indices.update_aliases.assert_not_called()
+        self.client.indices.delete.assert_not_called()
+
+
+class ReturnQsPartsTest(TestCase):
+
+    def setUp(self):
+        for i in range(10, 17):
+            factories.PandFactory.create(id=str(i))
+
+        self.task = index.ImportIndexTask()
+        self.task.name = 'test'
+        self.qs = models.Pand.objects.order_by('id')
+
+    def ids(self, modulo, modulo_value):
+        return [
+            obj.id for batch in self.task.return_qs_parts(self.qs, modulo, modulo_value)
+            for obj in batch]
+
+    def test_batches(self):
+        with mock.patch.dict(settings.BATCH_SETTINGS, batch_size=3):
+            batches = list(self.task.return_qs_parts(self.qs, 1, 0))
+
+        self.assertEqual([len(b) for b in batches], [3, 3, 1])
+
+    def test_sequential_parts(self):
+        self.task.sequential = True
+
+        parts = [self.ids(3, i) for i in range(3)]
+
+        self.assertEqual(sum(parts, []), [str(i) for i in range(10, 17)])
+        self.assertTrue(all(parts))
+
+    def test_modulo_parts(self):
+        parts = [self.ids(2, i) for i in range(2)]
+
+        self.assertEqual(parts[0], ['10', '12', '14', '16'])
+        self.assertEqual(parts[1], ['11', '13', '15'])
@@ -25,6 +25,7 @@ class OPRTest(APITransactionTestCase):
 
         batch.execute(datasets.bag.batch.DeleteIndexGebiedJob())
         batch.execute(datasets.bag.batch.IndexGebiedenJob())
+        batch.execute(datasets.bag.batch.SwapIndexGebiedJob())
 
     def test_matching_query(self):
         response = self.client.get(